@@ -9,7 +9,14 @@ import json
 import redis
 
 from db.db import DatabaseManager, InteractionRepository, CustomerRepository, PromotionRepository, PromotionOfferRepository, create_er_database_safe
-from llama import llama_processing_layer, _load_model
+from llama import (
+    llama_processing_layer,
+    _load_model,
+    generation_stats,
+    start_generation_engine,
+    stop_generation_engine,
+)
+from chunk_transport import CHUNK_TRANSPORT, make_transport
 
 # Configuration
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
@@ -20,8 +27,13 @@ DB_PASS = os.getenv("DB_PASS", "password123")
 
 SUMMARY_INTERVAL = float(os.getenv("SUMMARY_INTERVAL", "30.0"))
 LOCK_TTL = 30
+# How long GET /summary waits for the transcriber's end-of-call re-transcription
+RETRANSCRIBE_WAIT = float(os.getenv("RETRANSCRIBE_WAIT", "60"))
 
 USE_MOCK = os.getenv("USE_MOCK_LLM", "false").lower() == "true"
+# Calls summarized at once; their generate calls are batched together by the
+# engine in generation.py, so keep this at least GENERATION_BATCH_SIZE
+SUMMARIZER_WORKERS = int(os.getenv("SUMMARIZER_WORKERS", "8"))
 
 # Initialize database schema
 print("[App] Initializing database schema...")
@@ -47,6 +59,9 @@ promo_offer_repo = PromotionOfferRepository(db)
 # Redis connection
 redis_client = redis.Redis(host=REDIS_HOST, port=6379, decode_responses=True)
 
+# Where chunks are read from and how work is claimed (lists or streams)
+transport = make_transport(redis_client)
+
 # Clean and reseed on startup
 CLEAN_ON_START = os.getenv("CLEAN_ON_START", "true").lower() == "true"
 
@@ -81,32 +96,32 @@ def get_promo_catalog() -> list:
 
 class SummarizerWorker(threading.Thread):
     """
-    Background worker that waits for call IDs pushed into
-    the 'summarize_queue' Redis list and processes them.
+    Background worker that waits for call IDs queued by the transcriber
+    (the 'summarize_queue' list, or the 'summarize_stream' consumer group
+    with CHUNK_TRANSPORT=streams) and processes them.
     """
 
-    QUEUE_NAME = "summarize_queue"
-    PENDING_SET = "pending_calls"
-
     def __init__(self, r_client, worker_id=1):
         super().__init__()
         self.r = r_client
         self.worker_id = worker_id
+        self.consumer = f"{os.getenv('HOSTNAME', 'summarizer')}-{worker_id}"
         self.running = True
         self.daemon = True
 
     def run(self):
-        print(f"[SummarizerWorker {self.worker_id}] Started")
+        print(f"[SummarizerWorker {self.worker_id}] Started ({CHUNK_TRANSPORT})")
 
         while self.running:
             try:
                 # Block until a call_id is available (timeout allows clean shutdown)
-                result = self.r.blpop(self.QUEUE_NAME, timeout=5)
-
-                if result:
-                    _, call_id = result
-                    self.r.srem(self.PENDING_SET, call_id)
-                    self.process_call(call_id)
+                for call_id, token in transport.claim(self.consumer, timeout=5):
+                    status = self.process_call(call_id)
+                    if status == "done":
+                        transport.ack(call_id, token)
+                    elif status == "deferred":
+                        self.r.set(f"call:{call_id}:last_summary_ts", time.time(), nx=True)
+                        transport.defer(call_id, token)
 
             except redis.ConnectionError as e:
                 print(f"[SummarizerWorker] Redis connection error: {e}")
@@ -118,9 +133,7 @@ class SummarizerWorker(threading.Thread):
         Push call_id to queue only if not already pending.
         """
         self.r.set(f"call:{call_id}:last_summary_ts", time.time(), nx=True)
-
-        if self.r.sadd(self.PENDING_SET, call_id):
-            self.r.rpush(self.QUEUE_NAME, call_id)
+        transport.enqueue(call_id)
 
     def acquire_lock(self, call_id):
         key = f"lock:call:{call_id}"
@@ -130,41 +143,38 @@ class SummarizerWorker(threading.Thread):
         self.r.delete(f"lock:call:{call_id}")
 
     def process_call(self, call_id):
+        """
+        Returns "done", "deferred" (not due yet, retry later) or "busy"
+        (someone else holds the call's lock and will pick up its chunks).
+        """
         if not self.acquire_lock(call_id):
-            return
+            return "busy"
 
         try:
             now = time.time()
 
             last_ts = float(self.r.get(f"call:{call_id}:last_summary_ts") or now)
-            last_idx = int(self.r.get(f"call:{call_id}:processed_index") or 0)
-            total_chunks = self.r.llen(f"call:{call_id}:chunks")
 
-            if total_chunks == last_idx:
-                return
+            if not transport.has_new(call_id):
+                return "done"
 
             if now - last_ts < SUMMARY_INTERVAL:
-                # Re-enqueue so it runs later
-                time.sleep(1)
-                self.enqueue_call(call_id)
-                return
+                return "deferred"
 
             self._do_summarize(call_id)
+            return "done"
         finally:
             self.release_lock(call_id)
 
     def _do_summarize(self, call_id):
         now = time.time()
 
-        last_idx = int(self.r.get(f"call:{call_id}:processed_index") or 0)
-        total_chunks = self.r.llen(f"call:{call_id}:chunks")
+        new_chunks, cursor = transport.read_new(call_id)
 
-        if total_chunks == last_idx:
+        if not new_chunks:
             return None
 
-        new_chunks = self.r.lrange(f"call:{call_id}:chunks", last_idx, -1)
         new_transcript = " ".join(new_chunks)
-        actual_processed_count = last_idx + len(new_chunks)
 
         customer_id = self.r.get(f"call:{call_id}:customer_id") or call_id
         current_history = self.r.get(f"call:{call_id}:history") or ""
@@ -197,14 +207,14 @@ class SummarizerWorker(threading.Thread):
             f"call:{call_id}:promotions",
             json.dumps(result["promotion_recommendations"]),
         )
-        pipe.set(f"call:{call_id}:processed_index", actual_processed_count)
+        transport.set_processed(pipe, call_id, cursor, len(new_chunks))
         pipe.set(f"call:{call_id}:last_summary_ts", now)
         pipe.execute()
 
         print(
             f"[SummarizerWorker {self.worker_id}] "
             f"Summarized {call_id} "
-            f"({total_chunks - last_idx} chunks)"
+            f"({len(new_chunks)} chunks)"
         )
 
         return result
@@ -213,19 +223,18 @@ class SummarizerWorker(threading.Thread):
         self.running = False
 
 
-# Global worker instance
-worker = None
+# Global worker instances
+workers = []
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Start/stop background worker on app startup/shutdown."""
-    global worker
-
+    """Start/stop background workers on app startup/shutdown."""
     if not USE_MOCK:
         print("[App] Loading Llama model at startup...")
         try:
             _load_model()
+            start_generation_engine()
             print("[App] Llama model loaded successfully.")
         except Exception as e:
             print(f"[App] Model failed to load: {e}")
@@ -269,13 +278,20 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             print(f"[App] Cleanup warning: {e}")
 
-    worker = SummarizerWorker(redis_client)
-    worker.start()
-    print("[App] Summarizer worker started")
+    transport.setup()
+    for worker_id in range(1, SUMMARIZER_WORKERS + 1):
+        worker = SummarizerWorker(redis_client, worker_id=worker_id)
+        worker.start()
+        workers.append(worker)
+    print(f"[App] {len(workers)} summarizer worker(s) started")
     yield
-    worker.stop()
-    worker.join(timeout=2)
-    print("[App] Summarizer worker stopped")
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.join(timeout=2)
+    if not USE_MOCK:
+        stop_generation_engine()
+    print("[App] Summarizer workers stopped")
 
 
 app = FastAPI(title="Summarizer Service", lifespan=lifespan)
@@ -362,19 +378,25 @@ def get_summary(call_id: str):
     GET summary for a call.
     1. Polls Redis to see if the background worker finishes the job.
     2. If no one is working on it and chunks remain, processes them immediately.
+    If the transcriber is re-transcribing the call, waits (up to
+    RETRANSCRIBE_WAIT) for the final chunks first.
     """
     try:
-        total_chunks = redis_client.llen(f"call:{call_id}:chunks")
+        retranscribe_deadline = time.time() + RETRANSCRIBE_WAIT
+        while (
+            redis_client.get(f"call:{call_id}:retranscribe") == "pending"
+            and time.time() < retranscribe_deadline
+        ):
+            time.sleep(1)
+
         lock_key = f"lock:call:{call_id}"
 
         max_wait = 90
         start_wait = time.time()
 
         while time.time() - start_wait < max_wait:
-            last_idx = int(redis_client.get(f"call:{call_id}:processed_index") or 0)
-
             # Case 1: All chunks are already processed
-            if last_idx >= total_chunks:
+            if not transport.has_new(call_id):
                 break
 
             # Case 2: Check if a worker is currently holding the lock
@@ -387,11 +409,10 @@ def get_summary(call_id: str):
             # Case 3: No one is processing, API takes over
             if redis_client.set(lock_key, "api", nx=True, ex=LOCK_TTL):
                 try:
-                    # Re-check index inside the lock to prevent double-processing
-                    current_idx = int(redis_client.get(f"call:{call_id}:processed_index") or 0)
-                    if current_idx < total_chunks:
+                    # Re-read inside the lock to prevent double-processing
+                    new_chunks, cursor = transport.read_new(call_id)
+                    if new_chunks:
                         # --- Process Remaining Chunks ---
-                        new_chunks = redis_client.lrange(f"call:{call_id}:chunks", current_idx, -1)
                         new_transcript = " ".join(new_chunks)
 
                         customer_id = redis_client.get(f"call:{call_id}:customer_id") or call_id
@@ -412,7 +433,7 @@ def get_summary(call_id: str):
                         pipe.set(f"call:{call_id}:summary", json.dumps(result["call_rolling_summary"]))
                         pipe.set(f"call:{call_id}:history", result["client_history_summary"].get("history_summary", ""))
                         pipe.set(f"call:{call_id}:promotions", json.dumps(result["promotion_recommendations"]))
-                        pipe.set(f"call:{call_id}:processed_index", total_chunks)
+                        transport.set_processed(pipe, call_id, cursor, len(new_chunks))
                         pipe.execute()
                     break # Work is done
                 finally:
@@ -486,13 +507,14 @@ def save_summary(payload: SaveSummaryRequest):
         pipe = redis_client.pipeline()
 
         keys_to_del = [
-            f"call:{payload.call_id}:chunks",
+            *transport.cleanup_keys(payload.call_id),
             f"call:{payload.call_id}:summary",
             f"call:{payload.call_id}:history",
             f"call:{payload.call_id}:promotions",
             f"call:{payload.call_id}:processed_index",
             f"call:{payload.call_id}:last_summary_ts",
             f"call:{payload.call_id}:customer_id",
+            f"call:{payload.call_id}:retranscribe",
             f"lock:call:{payload.call_id}"
         ]
         for k in keys_to_del: pipe.delete(k)
@@ -516,4 +538,10 @@ def save_summary(payload: SaveSummaryRequest):
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "worker_running": worker.is_alive() if worker else False}
+    alive = sum(w.is_alive() for w in workers)
+    return {
+        "status": "healthy",
+        "worker_running": alive > 0,
+        "workers_running": alive,
+        "generation": generation_stats() if not USE_MOCK else None,
+    }
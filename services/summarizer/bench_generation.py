@@ -0,0 +1,110 @@
+"""
+Throughput and latency of summary generation, one prompt at a time versus
+the continuous batching engine.
+
+    python bench_generation.py --requests 32 --concurrency 8
+    python bench_generation.py --transcripts calls.txt --max-tokens 256
+
+Runs the same prompts through llama_generate_single (the pre-engine path,
+one model.generate at a time) and through the engine with --concurrency
+callers, and reports summaries per second, generated tokens per second and
+per-request latency for both.
+"""
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llama import _get_engine, _load_model, build_json_prompt, llama_generate_batched, llama_generate_single
+
+PHRASES = [
+    "I'd like to dispute a charge on my credit card from last week",
+    "the agent verified the customer's identity and reviewed the account",
+    "the customer asked about increasing the limit on their line of credit",
+    "a replacement card will be mailed within five business days",
+    "the customer wants to set up a recurring transfer to their savings account",
+    "the agent explained the annual fee and the rewards program",
+    "the mortgage renewal is coming up in three months",
+    "the customer was transferred to the fraud department",
+]
+
+
+def synthetic_transcripts(count: int, seed: int = 0) -> list:
+    """Call-centre-like transcripts of varying length, so replies finish at different times."""
+    rng = random.Random(seed)
+    return [". ".join(rng.choice(PHRASES) for _ in range(rng.randint(4, 40))) + "." for _ in range(count)]
+
+
+def run(generate, prompts: list, concurrency: int, max_tokens: int, temperature: float) -> dict:
+    tokenizer, _ = _load_model()
+    latencies = []
+    tokens = []
+    lock = threading.Lock()
+
+    def one(prompt):
+        start = time.perf_counter()
+        text = generate(prompt, max_tokens=max_tokens, temperature=temperature)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            tokens.append(len(tokenizer.encode(text, add_special_tokens=False)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, prompts))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "seconds": elapsed,
+        "summaries_per_second": len(prompts) / elapsed,
+        "tokens_per_second": sum(tokens) / elapsed,
+        "latency_p50": latencies[len(latencies) // 2],
+        "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary generation throughput with and without continuous batching")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers on the engine")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--transcripts", help="Text file with one transcript per line instead of synthetic ones")
+    parser.add_argument("--skip-single", action="store_true", help="Only measure the engine")
+    args = parser.parse_args()
+
+    if args.transcripts:
+        with open(args.transcripts) as f:
+            transcripts = [line.strip() for line in f if line.strip()][:args.requests]
+    else:
+        transcripts = synthetic_transcripts(args.requests)
+    prompts = [build_json_prompt(t) for t in transcripts]
+
+    _load_model()
+    engine = _get_engine()
+    # Warmup, so CUDA kernel setup is not billed to either run
+    llama_generate_batched(prompts[0], max_tokens=8, temperature=args.temperature)
+
+    results = {}
+    if not args.skip_single:
+        results["single"] = run(llama_generate_single, prompts, 1, args.max_tokens, args.temperature)
+    results["engine"] = run(llama_generate_batched, prompts, args.concurrency, args.max_tokens, args.temperature)
+
+    print(f"\n{len(prompts)} prompts, max {args.max_tokens} new tokens, engine batch size {engine.max_batch_size}")
+    print(f"{'':<8} {'summaries/s':>12} {'tokens/s':>10} {'p50 s':>8} {'p95 s':>8}")
+    for name, r in results.items():
+        print(
+            f"{name:<8} {r['summaries_per_second']:>12.2f} {r['tokens_per_second']:>10.1f}"
+            f" {r['latency_p50']:>8.2f} {r['latency_p95']:>8.2f}"
+        )
+    if "single" in results:
+        print(f"Engine speedup: {results['engine']['summaries_per_second'] / results['single']['summaries_per_second']:.1f}x")
+    print(f"Engine: {engine.stats()}")
+    engine.stop()
+
+
+if __name__ == "__main__":
+    main()
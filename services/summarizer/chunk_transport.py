@@ -0,0 +1,173 @@
+"""
+How the summarizer receives transcript chunks and claims work.
+
+CHUNK_TRANSPORT must match the transcriber's setting:
+
+- lists (default): chunks in `call:{id}:chunks`, work claimed with BLPOP on
+  `summarize_queue`, progress kept as an integer `processed_index`.
+- streams: chunks in the `call:{id}:stream` stream, work claimed through
+  the `summarizers` consumer group on `summarize_stream`, progress kept as
+  the last summarized stream ID in `processed_id`. An entry is acknowledged
+  only after its call has been summarized, so work held by a crashed or
+  busy worker is reclaimed with XAUTOCLAIM once it has been idle for
+  STREAM_CLAIM_IDLE_MS.
+
+In both layouts `processed_index` holds the number of chunks summarized so
+far, for reporting.
+"""
+
+import os
+import time
+
+import redis
+
+CHUNK_TRANSPORT = os.getenv("CHUNK_TRANSPORT", "lists")
+STREAM_CLAIM_IDLE_MS = int(os.getenv("STREAM_CLAIM_IDLE_MS", "15000"))
+
+PENDING_SET = "pending_calls"
+SUMMARIZE_QUEUE = "summarize_queue"
+SUMMARIZE_STREAM = "summarize_stream"
+SUMMARIZE_STREAM_MAXLEN = 10000
+CONSUMER_GROUP = "summarizers"
+
+
+class ListTransport:
+    def __init__(self, r_client: redis.Redis):
+        self.r = r_client
+
+    def setup(self):
+        pass
+
+    def chunks_key(self, call_id: str) -> str:
+        return f"call:{call_id}:chunks"
+
+    def claim(self, consumer: str, timeout: int = 5) -> list:
+        """Block for work; returns [(call_id, token)]."""
+        result = self.r.blpop(SUMMARIZE_QUEUE, timeout=timeout)
+        if not result:
+            return []
+        _, call_id = result
+        self.r.srem(PENDING_SET, call_id)
+        return [(call_id, None)]
+
+    def ack(self, call_id: str, token):
+        pass
+
+    def defer(self, call_id: str, token):
+        """Not due yet; re-enqueue so it runs later."""
+        time.sleep(1)
+        self.enqueue(call_id)
+
+    def enqueue(self, call_id: str):
+        if self.r.sadd(PENDING_SET, call_id):
+            self.r.rpush(SUMMARIZE_QUEUE, call_id)
+
+    def has_new(self, call_id: str) -> bool:
+        last_idx = int(self.r.get(f"call:{call_id}:processed_index") or 0)
+        return self.r.llen(self.chunks_key(call_id)) > last_idx
+
+    def read_new(self, call_id: str):
+        """Chunks not summarized yet, and the cursor to store once they are."""
+        last_idx = int(self.r.get(f"call:{call_id}:processed_index") or 0)
+        chunks = self.r.lrange(self.chunks_key(call_id), last_idx, -1)
+        return chunks, last_idx + len(chunks)
+
+    def set_processed(self, pipe, call_id: str, cursor, count: int):
+        pipe.set(f"call:{call_id}:processed_index", cursor)
+
+    def cleanup_keys(self, call_id: str) -> list:
+        return [self.chunks_key(call_id)]
+
+
+class StreamTransport:
+    def __init__(self, r_client: redis.Redis):
+        self.r = r_client
+
+    def setup(self):
+        """Create the consumer group (and the stream) if they do not exist."""
+        try:
+            self.r.xgroup_create(SUMMARIZE_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def chunks_key(self, call_id: str) -> str:
+        return f"call:{call_id}:stream"
+
+    def claim(self, consumer: str, timeout: int = 5) -> list:
+        """
+        Take over one entry left idle by another consumer if there is one,
+        otherwise block for a new entry. Returns [(call_id, entry_id)].
+        """
+        reclaimed = self.r.xautoclaim(
+            SUMMARIZE_STREAM,
+            CONSUMER_GROUP,
+            consumer,
+            min_idle_time=STREAM_CLAIM_IDLE_MS,
+            start_id="0-0",
+            count=1,
+        )
+        entries = reclaimed[1]
+        if not entries:
+            result = self.r.xreadgroup(
+                CONSUMER_GROUP, consumer, {SUMMARIZE_STREAM: ">"}, count=1, block=timeout * 1000
+            )
+            entries = result[0][1] if result else []
+
+        claimed = []
+        for entry_id, fields in entries:
+            if fields and "call_id" in fields:
+                claimed.append((fields["call_id"], entry_id))
+            else:
+                # Trimmed or malformed entry; nothing to do for it
+                self.r.xack(SUMMARIZE_STREAM, CONSUMER_GROUP, entry_id)
+        return claimed
+
+    def ack(self, call_id: str, token):
+        # Leave the pending set before checking for chunks that arrived while
+        # summarizing, so the next XADD is not swallowed by the set.
+        self.r.srem(PENDING_SET, call_id)
+        if self.has_new(call_id):
+            self.enqueue(call_id)
+        self.r.xack(SUMMARIZE_STREAM, CONSUMER_GROUP, token)
+
+    def defer(self, call_id: str, token):
+        """Leave the entry unacknowledged; XAUTOCLAIM hands it out again later."""
+        pass
+
+    def enqueue(self, call_id: str):
+        if self.r.sadd(PENDING_SET, call_id):
+            self.r.xadd(
+                SUMMARIZE_STREAM,
+                {"call_id": call_id},
+                maxlen=SUMMARIZE_STREAM_MAXLEN,
+                approximate=True,
+            )
+
+    def _last_id(self, call_id: str) -> str:
+        return self.r.get(f"call:{call_id}:processed_id") or "0-0"
+
+    def has_new(self, call_id: str) -> bool:
+        return bool(self.r.xrange(self.chunks_key(call_id), min=f"({self._last_id(call_id)}", max="+", count=1))
+
+    def read_new(self, call_id: str):
+        """Chunks after the last summarized stream ID, and the new last ID."""
+        last_id = self._last_id(call_id)
+        entries = self.r.xrange(self.chunks_key(call_id), min=f"({last_id}", max="+")
+        chunks = [fields["text"] for _, fields in entries]
+        return chunks, entries[-1][0] if entries else last_id
+
+    def set_processed(self, pipe, call_id: str, cursor, count: int):
+        pipe.set(f"call:{call_id}:processed_id", cursor)
+        pipe.incrby(f"call:{call_id}:processed_index", count)
+
+    def cleanup_keys(self, call_id: str) -> list:
+        return [self.chunks_key(call_id), f"call:{call_id}:processed_id"]
+
+
+def make_transport(r_client: redis.Redis):
+    if CHUNK_TRANSPORT == "streams":
+        return StreamTransport(r_client)
+    if CHUNK_TRANSPORT == "lists":
+        return ListTransport(r_client)
+    raise ValueError(f"Unknown CHUNK_TRANSPORT '{CHUNK_TRANSPORT}', expected 'lists' or 'streams'")
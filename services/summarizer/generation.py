@@ -0,0 +1,279 @@
+"""
+Continuous batching for the summarizer's Llama model.
+
+One GenerationEngine thread owns the model. Callers on any thread submit a
+tokenized prompt and wait on a Future for the generated tokens, while the
+engine keeps a single batch of sequences decoding together:
+
+- waiting requests are prefilled together, left padded to the longest
+  prompt, and join the running batch with their KV cache left padded to
+  the batch's length
+- every step feeds each sequence its last token and samples the next one
+- a sequence that produces an end-of-turn token or reaches its token limit
+  leaves the batch at once and resolves its future, so a short reply never
+  waits for a long one and its slot goes to the next request
+
+Decoding one token is bound by reading the weights, not by arithmetic, so
+a step over GENERATION_BATCH_SIZE sequences costs little more than a step
+over one.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+from transformers import DynamicCache
+
+GENERATION_BATCH_SIZE = int(os.getenv("GENERATION_BATCH_SIZE", "8"))
+
+
+class GenerationRequest:
+    """One prompt in the engine, from submission until its future resolves."""
+
+    __slots__ = ("prompt_ids", "max_new_tokens", "temperature", "future", "tokens", "submitted_at")
+
+    def __init__(self, prompt_ids: list, max_new_tokens: int, temperature: float):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.future = Future()
+        self.tokens = []
+        self.submitted_at = time.perf_counter()
+
+
+def _layers(cache) -> list:
+    """(keys, values) per layer, for the cache layouts of transformers 4.x and 5.x."""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def _pad_left(tensor: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+class GenerationEngine(threading.Thread):
+    """
+    Batches concurrent generate calls on one causal LM.
+
+    `eos_token_ids` end a sequence (Llama 3.1 ends turns with several).
+    Sampling follows each request's temperature (0 = greedy), with nucleus
+    sampling at `top_p` as the model's generation config asks.
+    """
+
+    def __init__(self, model, eos_token_ids, pad_token_id: int, max_batch_size: int = GENERATION_BATCH_SIZE, top_p: float = 1.0):
+        super().__init__(daemon=True)
+        self.model = model
+        self.decoder = model.get_decoder()
+        self.lm_head = model.get_output_embeddings()
+        self.device = model.device
+        self.eos_token_ids = set(eos_token_ids)
+        self.pad_token_id = pad_token_id
+        self.max_batch_size = max_batch_size
+        self.top_p = top_p
+        self.requests = queue.Queue()
+        self.running = True
+
+        # The running batch; row i of every tensor belongs to _active[i]
+        self._active = []
+        self._cache = None
+        self._mask = None  # (rows, cache length): 1 where a row has a real token
+        self._next = None  # (rows,) sampled tokens not yet fed to the model
+        self._positions = None  # (rows,) position id of those tokens
+
+        self.steps = 0
+        self.rows_stepped = 0
+        self.prefills = 0
+        self.tokens_generated = 0
+        self.finished = 0
+        self.failed = 0
+
+    def submit(self, prompt_ids, max_new_tokens: int = 256, temperature: float = 0.0) -> Future:
+        """Queue a prompt from any thread; the future resolves to the generated token ids."""
+        request = GenerationRequest(list(prompt_ids), max_new_tokens, temperature)
+        if max_new_tokens <= 0 or not request.prompt_ids:
+            request.future.set_result([])
+        else:
+            self.requests.put(request)
+        return request.future
+
+    def stop(self):
+        self.running = False
+        self.requests.put(None)
+
+    def run(self):
+        print(f"[GenerationEngine] Started (max_batch_size={self.max_batch_size})")
+        while self.running:
+            joining = self._take()
+            try:
+                with torch.inference_mode():
+                    if joining:
+                        self._join(joining)
+                    if self._active:
+                        self._step()
+            except Exception as e:
+                print(f"[GenerationEngine] Batch failed: {e}")
+                self._fail(self._active + [r for r in joining if r not in self._active], e)
+                self._reset()
+        self._fail(self._active, RuntimeError("Generation engine stopped"))
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                self._fail([request], RuntimeError("Generation engine stopped"))
+
+    def _take(self) -> list:
+        """Requests for the free slots; blocks only while the batch is empty."""
+        taken = []
+        while len(self._active) + len(taken) < self.max_batch_size:
+            try:
+                block = not self._active and not taken
+                request = self.requests.get(block=block)
+            except queue.Empty:
+                break
+            if request is None:
+                self.running = False
+                break
+            taken.append(request)
+        return taken
+
+    def _forward(self, input_ids, attention_mask, position_ids, cache) -> torch.Tensor:
+        """Logits at each row's last position only; full-sequence logits of a long prompt would not fit."""
+        hidden = self.decoder(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=cache,
+            use_cache=True,
+        ).last_hidden_state[:, -1]
+        return self.lm_head(hidden).float()
+
+    def _join(self, joining: list):
+        """Prefill new requests and merge them into the running batch."""
+        width = max(len(r.prompt_ids) for r in joining)
+        ids = torch.full((len(joining), width), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(joining), width), dtype=torch.long)
+        for i, r in enumerate(joining):
+            ids[i, width - len(r.prompt_ids):] = torch.tensor(r.prompt_ids)
+            mask[i, width - len(r.prompt_ids):] = 1
+        ids, mask = ids.to(self.device), mask.to(self.device)
+        positions = (mask.cumsum(-1) - 1).clamp(min=0)
+
+        cache = DynamicCache()
+        logits = self._forward(ids, mask, positions, cache)
+        first = self._sample(logits, joining)
+        self.prefills += 1
+
+        lengths = torch.tensor([len(r.prompt_ids) for r in joining], device=self.device)
+        if not self._active:
+            self._cache, self._mask, self._next, self._positions = cache, mask, first, lengths
+        else:
+            length = max(self._mask.shape[1], width)
+            self._cache = DynamicCache([
+                (
+                    torch.cat([_pad_left(k, length, -2), _pad_left(k_new, length, -2)]),
+                    torch.cat([_pad_left(v, length, -2), _pad_left(v_new, length, -2)]),
+                )
+                for (k, v), (k_new, v_new) in zip(_layers(self._cache), _layers(cache))
+            ])
+            self._mask = torch.cat([_pad_left(self._mask, length, 1), _pad_left(mask, length, 1)])
+            self._next = torch.cat([self._next, first])
+            self._positions = torch.cat([self._positions, lengths])
+        self._active.extend(joining)
+        self._record(first.tolist(), joining)
+
+    def _step(self):
+        """Feed every row its pending token and sample the next one."""
+        rows = len(self._active)
+        self._mask = torch.cat([self._mask, self._mask.new_ones((rows, 1))], dim=1)
+        logits = self._forward(self._next[:, None], self._mask, self._positions[:, None], self._cache)
+        self._next = self._sample(logits, self._active)
+        self._positions = self._positions + 1
+        self.steps += 1
+        self.rows_stepped += rows
+        self._record(self._next.tolist(), self._active)
+
+    def _sample(self, logits: torch.Tensor, requests: list) -> torch.Tensor:
+        greedy = logits.argmax(-1)
+        temperatures = torch.tensor([r.temperature for r in requests], device=logits.device)
+        sampling = temperatures > 0
+        if not bool(sampling.any()):
+            return greedy
+        probs = torch.softmax(logits / temperatures.clamp(min=1e-5)[:, None], dim=-1)
+        if self.top_p < 1.0:
+            sorted_probs, order = probs.sort(dim=-1, descending=True)
+            # Keep the smallest set of tokens whose mass reaches top_p
+            sorted_probs[sorted_probs.cumsum(-1) - sorted_probs > self.top_p] = 0
+            probs = torch.zeros_like(probs).scatter_(-1, order, sorted_probs)
+        sampled = torch.multinomial(probs, 1).squeeze(-1)
+        return torch.where(sampling, sampled, greedy)
+
+    def _record(self, tokens: list, requests: list):
+        """Append the sampled tokens and retire the sequences they finish."""
+        done = []
+        for i, (token, r) in enumerate(zip(tokens, requests)):
+            self.tokens_generated += 1
+            if token in self.eos_token_ids:
+                done.append(i)
+                continue
+            r.tokens.append(token)
+            if len(r.tokens) >= r.max_new_tokens:
+                done.append(i)
+        if not done:
+            return
+
+        # requests is always the tail of _active (the joining rows) or all of it
+        offset = len(self._active) - len(requests)
+        finished = {offset + i for i in done}
+        for i in finished:
+            self._active[i].future.set_result(self._active[i].tokens)
+            self.finished += 1
+        keep = [i for i in range(len(self._active)) if i not in finished]
+        if not keep:
+            self._reset()
+            return
+
+        index = torch.tensor(keep, device=self.device)
+        self._active = [self._active[i] for i in keep]
+        self._mask = self._mask[index]
+        self._next = self._next[index]
+        self._positions = self._positions[index]
+        # Columns that were padding for every remaining row go with them
+        start = int(self._mask.any(dim=0).nonzero()[0])
+        self._mask = self._mask[:, start:]
+        self._cache = DynamicCache([
+            (k[index, :, start:], v[index, :, start:]) for k, v in _layers(self._cache)
+        ])
+
+    def _fail(self, requests: list, error: Exception):
+        for r in requests:
+            if not r.future.done():
+                r.future.set_exception(error)
+                self.failed += 1
+
+    def _reset(self):
+        self._active = []
+        self._cache = self._mask = self._next = self._positions = None
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "active": len(self._active),
+            "queued": self.requests.qsize(),
+            "steps": self.steps,
+            "prefills": self.prefills,
+            "mean_batch_size": round(self.rows_stepped / self.steps, 2) if self.steps else 0.0,
+            "tokens_generated": self.tokens_generated,
+            "finished": self.finished,
+            "failed": self.failed,
+        }
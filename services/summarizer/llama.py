@@ -12,16 +12,24 @@ import threading
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
 
+from generation import GENERATION_BATCH_SIZE, GenerationEngine
+
 # --- Configuration ---
 MODEL_ID = os.getenv("MODEL_ID", "meta-llama/Meta-Llama-3.1-8B-Instruct")
 LOCAL_DIR = "/app/models/meta-llama-3.1-8b-instruct"
 HF_TOKEN = os.getenv("HF_TOKEN")
 USE_MOCK = os.getenv("USE_MOCK_LLM", "false").lower() == "true"
+# Concurrent llama_generate calls share batched decode steps (see generation.py)
+CONTINUOUS_BATCHING = os.getenv("LLAMA_CONTINUOUS_BATCHING", "true").lower() == "true"
 
 _tokenizer = None
 _model = None
+_engine = None
 
 _load_lock = threading.Lock()
+_engine_lock = threading.Lock()
+# Fast tokenizers raise "Already borrowed" when used from several threads at once
+_tokenizer_lock = threading.Lock()
 
 # --- Core Model Loading ---
 def _load_model():
@@ -87,29 +95,92 @@ def _load_model():
         return _tokenizer, _model
 
 
-def llama_generate(prompt, max_tokens=256, temperature=0.2):
-    """Standard generation wrapper."""
-    tokenizer, model = _load_model()
-    model.eval()
+def _get_engine():
+    global _engine
+
+    if _engine is not None:
+        return _engine
+
+    with _engine_lock:
+        if _engine is not None:
+            return _engine
+
+        tokenizer, model = _load_model()
+        model.eval()
+        eos = model.generation_config.eos_token_id
+        eos = set(eos if isinstance(eos, (list, tuple)) else [eos]) | {tokenizer.eos_token_id}
+        _engine = GenerationEngine(
+            model,
+            eos_token_ids={e for e in eos if e is not None},
+            pad_token_id=tokenizer.pad_token_id,
+            max_batch_size=GENERATION_BATCH_SIZE,
+            top_p=model.generation_config.top_p or 1.0,
+        )
+        _engine.start()
+        return _engine
+
+
+def start_generation_engine():
+    """Load the model and start the batching engine, so the first call does not wait for it."""
+    if CONTINUOUS_BATCHING:
+        _get_engine()
+
+
+def stop_generation_engine():
+    if _engine is not None:
+        _engine.stop()
+        _engine.join(timeout=5)
+
+
+def generation_stats():
+    if not CONTINUOUS_BATCHING:
+        return {"continuous_batching": False}
+    return {"continuous_batching": True, **(_engine.stats() if _engine else {})}
+
 
+def _chat_inputs(tokenizer, prompt):
+    """The prompt wrapped in the chat template, as a dict of (1, length) tensors."""
     messages = [
         {"role": "system", "content": "You are a helpful assistant. Answer clearly and briefly."},
         {"role": "user", "content": prompt},
     ]
 
-    try:
-        tmp = tokenizer.apply_chat_template(
-            messages,
-            add_generation_prompt=True,
-            return_tensors="pt",
-        )
-        if hasattr(tmp, "shape"):
-            inputs = {"input_ids": tmp.to(model.device)}
-        else:
-            inputs = {k: v.to(model.device) for k, v in tmp.items()}
-    except Exception:
-        enc = tokenizer(prompt, return_tensors="pt")
-        inputs = {k: v.to(model.device) for k, v in enc.items()}
+    with _tokenizer_lock:
+        try:
+            tmp = tokenizer.apply_chat_template(
+                messages,
+                add_generation_prompt=True,
+                return_tensors="pt",
+            )
+            if hasattr(tmp, "shape"):
+                return {"input_ids": tmp}
+            return dict(tmp)
+        except Exception:
+            return dict(tokenizer(prompt, return_tensors="pt"))
+
+
+def llama_generate(prompt, max_tokens=256, temperature=0.2):
+    """Standard generation wrapper."""
+    if CONTINUOUS_BATCHING:
+        return llama_generate_batched(prompt, max_tokens, temperature)
+    return llama_generate_single(prompt, max_tokens, temperature)
+
+
+def llama_generate_batched(prompt, max_tokens=256, temperature=0.2):
+    """Generate through the shared engine; blocks until this prompt's reply is done."""
+    tokenizer, _ = _load_model()
+    input_ids = _chat_inputs(tokenizer, prompt)["input_ids"][0].tolist()
+    tokens = _get_engine().submit(input_ids, max_new_tokens=max_tokens, temperature=temperature).result()
+    with _tokenizer_lock:
+        return tokenizer.decode(tokens, skip_special_tokens=True)
+
+
+def llama_generate_single(prompt, max_tokens=256, temperature=0.2):
+    """One model.generate call for this prompt alone."""
+    tokenizer, model = _load_model()
+    model.eval()
+
+    inputs = {k: v.to(model.device) for k, v in _chat_inputs(tokenizer, prompt).items()}
 
     with torch.no_grad():
         out_ids = model.generate(
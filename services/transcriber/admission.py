@@ -0,0 +1,182 @@
+"""
+Backpressure and admission control for the transcriber service.
+
+Audio frames are queued per session between the WebSocket receive loop and
+the session's decode loop. Queues are bounded per session and globally, and
+OVERLOAD_POLICY decides how a session that falls behind catches up:
+
+- coalesce:    the decode loop merges its whole backlog into one write and
+               one endpointing/decode decision, trading latency for fewer
+               model calls.
+- drop_oldest: frames are processed one by one; when a queue is full the
+               oldest audio is discarded so the session stays near real time.
+- reject:      like drop_oldest, and new calls are refused with close code
+               1013 (Try Again Later) while the service is overloaded.
+
+Whatever the policy, a full queue drops its oldest frames, so memory stays
+bounded, and every drop is counted.
+"""
+
+import asyncio
+from collections import deque
+
+POLICIES = ("coalesce", "drop_oldest", "reject")
+
+# RFC 6455 "Try Again Later"
+CLOSE_OVERLOADED = 1013
+
+
+class AdmissionController:
+    """Global limits and overload counters shared by all sessions."""
+
+    def __init__(
+        self,
+        policy: str = "coalesce",
+        max_sessions: int = 500,
+        session_limit_bytes: int = 160_000,
+        global_limit_bytes: int = 32_000_000,
+        pool_depth_limit: int = 64,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overload policy '{policy}', expected one of {POLICIES}")
+        self.policy = policy
+        self.max_sessions = max_sessions
+        self.session_limit_bytes = session_limit_bytes
+        self.global_limit_bytes = global_limit_bytes
+        self.pool_depth_limit = pool_depth_limit
+
+        self.sessions = 0
+        self.queued_bytes = 0
+
+        self.frames_dropped = 0
+        self.bytes_dropped = 0
+        self.frames_coalesced = 0
+        self.sessions_rejected = 0
+
+    def overloaded(self, pool_depth: int) -> bool:
+        return (
+            self.queued_bytes >= 0.8 * self.global_limit_bytes
+            or pool_depth >= self.pool_depth_limit
+        )
+
+    def try_admit(self, pool_depth: int):
+        """Returns (admitted, reason)."""
+        if self.sessions >= self.max_sessions:
+            reason = f"Transcriber at capacity ({self.max_sessions} sessions)"
+        elif self.policy == "reject" and self.overloaded(pool_depth):
+            reason = "Transcriber overloaded, try again later"
+        else:
+            self.sessions += 1
+            return True, ""
+        self.sessions_rejected += 1
+        return False, reason
+
+    def release(self):
+        self.sessions = max(0, self.sessions - 1)
+
+    def stats(self, pool_depth: int = 0) -> dict:
+        return {
+            "policy": self.policy,
+            "overloaded": self.overloaded(pool_depth),
+            "sessions": self.sessions,
+            "max_sessions": self.max_sessions,
+            "queued_bytes": self.queued_bytes,
+            "global_limit_bytes": self.global_limit_bytes,
+            "frames_dropped": self.frames_dropped,
+            "bytes_dropped": self.bytes_dropped,
+            "frames_coalesced": self.frames_coalesced,
+            "sessions_rejected": self.sessions_rejected,
+        }
+
+
+class Silence:
+    """Queue item for a stretch of silence the client sent as a marker instead of audio."""
+
+    __slots__ = ("samples",)
+
+    def __init__(self, samples: int):
+        self.samples = samples
+
+    def __len__(self) -> int:
+        return 0  # holds no bytes
+
+
+class InboundQueue:
+    """
+    Bounded FIFO of PCM frames (and Silence markers) for one session. A
+    frame may carry a tag (the sequence number after it); `last_tag` is
+    that of the last frame handed out.
+    """
+
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+        self._frames = deque()
+        self._tags = deque()
+        self.last_tag = None
+        self._ready = asyncio.Event()
+        self.nbytes = 0
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def put(self, frame: bytes, tag=None) -> int:
+        """Queue a frame, dropping the oldest ones if a limit is hit. Returns bytes dropped."""
+        ctl = self.controller
+        self._frames.append(frame)
+        self._tags.append(tag)
+        self.nbytes += len(frame)
+        ctl.queued_bytes += len(frame)
+
+        dropped = 0
+        while len(self._frames) > 1 and (
+            self.nbytes > ctl.session_limit_bytes or ctl.queued_bytes > ctl.global_limit_bytes
+        ):
+            old = self._frames.popleft()
+            self._tags.popleft()
+            self.nbytes -= len(old)
+            ctl.queued_bytes -= len(old)
+            ctl.frames_dropped += 1
+            ctl.bytes_dropped += len(old)
+            dropped += len(old)
+
+        self._ready.set()
+        return dropped
+
+    async def get(self, max_bytes: int):
+        """
+        Wait for audio and return a list of frames, or None once the queue is
+        closed and drained. Under the coalesce policy the backlog is returned
+        in one go (up to `max_bytes`, at least one frame); otherwise one frame.
+        A Silence marker is always returned on its own.
+        """
+        while not self._frames:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+
+        frames = [self._frames.popleft()]
+        tag = self._tags.popleft()
+        size = len(frames[0])
+        if self.controller.policy == "coalesce" and not isinstance(frames[0], Silence):
+            while (
+                self._frames
+                and not isinstance(self._frames[0], Silence)
+                and size + len(self._frames[0]) <= max_bytes
+            ):
+                frame = self._frames.popleft()
+                tag = self._tags.popleft()
+                frames.append(frame)
+                size += len(frame)
+            self.controller.frames_coalesced += len(frames) - 1
+        if tag is not None:
+            self.last_tag = tag
+
+        self.nbytes -= size
+        self.controller.queued_bytes -= size
+        return frames
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
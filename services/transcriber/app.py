@@ -1,111 +1,1324 @@
 import os
+import re
 import json
 import asyncio
-import numpy as np
-from collections import defaultdict, deque
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 import redis
+import redis.asyncio as aioredis
+
+import numpy as np
+from pydantic import BaseModel
+
+from admission import CLOSE_OVERLOADED, AdmissionController, InboundQueue, Silence
+from audio import PCM16_SCALE, RingBuffer
+from audio_codecs import PCM16, PacketDecoder, negotiate
+from batch import BatchJob, default_progress_path, job_key, read_inputs
+from checkpoint import CHECKPOINT_GRACE_SECONDS, SESSION_CHECKPOINTS, SessionCheckpointer
+from endpointing import Endpointer
+from metrics import (
+    CODEC_DECODE_SECONDS,
+    DECODE_WAIT_SECONDS,
+    HEX_DECODE_SECONDS,
+    PCM_CONVERT_SECONDS,
+    metric,
+    render,
+)
+from model_config import read_recommendation
+from quality import Tier
+from redis_writer import RedisChunkWriter
+from retranscribe import Retranscriber
+from scheduler import WorkerPool
+from sessions import DEFAULT_SPEAKERS, SEQ_HEADER, Channel, Session, SessionManager
+from spool import AudioSpool
+from streaming import LocalAgreement
+from telephony import PcmConverter
 
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 SAMPLE_RATE = 16000
 BUFFER_SECONDS = 3
-WHISPER_MODEL = os.getenv("WHISPER_MODEL", "medium.en")
 WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cuda")
-WHISPER_COMPUTE = os.getenv("WHISPER_COMPUTE", "float16")
-MODEL_PATH = os.getenv("WHISPER_MODEL_PATH", None)
+# Variant picked for this host by download_model.py --autotune (see
+# model_config.py); the three settings below apply when there is none
+WHISPER_CONFIG = os.getenv("WHISPER_CONFIG", "")
+RECOMMENDED = read_recommendation(WHISPER_CONFIG, WHISPER_DEVICE)
+WHISPER_MODEL = RECOMMENDED.get("model") or os.getenv("WHISPER_MODEL", "medium.en")
+WHISPER_COMPUTE = RECOMMENDED.get("compute_type") or os.getenv("WHISPER_COMPUTE", "float16")
+MODEL_PATH = RECOMMENDED.get("model_path") or os.getenv("WHISPER_MODEL_PATH", None)
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "1"))
+# On CPU, split the cores between replicas so they do not oversubscribe
+WHISPER_CPU_THREADS = int(os.getenv(
+    "WHISPER_CPU_THREADS",
+    str(max(1, (os.cpu_count() or 1) // max(1, WHISPER_WORKERS)) if WHISPER_DEVICE == "cpu" else 0),
+))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "50"))
+# Load-adaptive quality (see quality.py): beam search when there is
+# headroom, a smaller preloaded model under overload
+QUALITY_ADAPTIVE = os.getenv("QUALITY_ADAPTIVE", "true").lower() == "true"
+QUALITY_HIGH_BEAM = int(os.getenv("QUALITY_HIGH_BEAM", "5"))
+QUALITY_FALLBACK_MODEL = os.getenv("QUALITY_FALLBACK_MODEL", "")
+STREAM_STRIDE_SECONDS = float(os.getenv("STREAM_STRIDE_SECONDS", "0.5"))
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", "10"))
+ENDPOINTING = os.getenv("ENDPOINTING", "true").lower() == "true"
+ENDPOINT_MAX_SECONDS = float(os.getenv("ENDPOINT_MAX_SECONDS", "10"))
+ENDPOINT_MIN_SILENCE_MS = int(os.getenv("ENDPOINT_MIN_SILENCE_MS", "500"))
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-45"))
+OVERLOAD_POLICY = os.getenv("OVERLOAD_POLICY", "coalesce")
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "500"))
+SESSION_QUEUE_SECONDS = float(os.getenv("SESSION_QUEUE_SECONDS", "5"))
+GLOBAL_QUEUE_SECONDS = float(os.getenv("GLOBAL_QUEUE_SECONDS", "1000"))
+POOL_DEPTH_LIMIT = int(os.getenv("POOL_DEPTH_LIMIT", "64"))
+SPOOL_AUDIO = os.getenv("SPOOL_AUDIO", "false").lower() == "true"
+SPOOL_DIR = os.getenv("SPOOL_DIR", "/tmp/transcriber-spool")
+SPOOL_KEEP = os.getenv("SPOOL_KEEP", "false").lower() == "true"
+RETRANSCRIBE_MODEL = os.getenv("RETRANSCRIBE_MODEL", "")
+RETRANSCRIBE_BEAM = int(os.getenv("RETRANSCRIBE_BEAM", "5"))
+WARMUP_SECONDS = float(os.getenv("WARMUP_SECONDS", "5"))
+WARMUP_DECODES = int(os.getenv("WARMUP_DECODES", "2"))
+CODEC_THREADS = int(os.getenv("CODEC_THREADS", "2"))
+RESUME_SECONDS = float(os.getenv("RESUME_SECONDS", "300"))
+# Connections that send nothing (not even silence markers) for this long are closed
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "60"))
+# Ring-buffer memory all sessions together may reserve; 0 means no cap
+MAX_BUFFER_MB = float(os.getenv("MAX_BUFFER_MB", "1024"))
+# POST /batch reads recordings only under BATCH_ROOT and writes output and
+# progress files only under BATCH_JOBS_DIR
+BATCH_ROOT = os.path.realpath(os.getenv("BATCH_ROOT", "recordings"))
+BATCH_JOBS_DIR = os.path.realpath(os.getenv("BATCH_JOBS_DIR", os.path.join(BATCH_ROOT, "jobs")))
+
+PROCESS_STARTED = time.perf_counter()
+
+redis_client = aioredis.Redis(host=REDIS_HOST, port=6379, decode_responses=True)
+
+# Live sessions by call_id. A reconnect replaces the entry while the old
+# session may still be finishing its final decode.
+sessions = SessionManager(idle_seconds=SESSION_IDLE_SECONDS, max_buffer_bytes=int(MAX_BUFFER_MB * 2**20))
+
+endpoint_stats = {
+    "segments_flushed": 0,
+    "silence_samples_skipped": 0,
+}
 
-redis_client = redis.Redis(host=REDIS_HOST, port=6379, decode_responses=True)
+# Transcript chunks pushed, by the quality tier that decoded them
+chunk_tiers: dict[str, int] = {}
 
-print(f"Loading Whisper model '{WHISPER_MODEL}' on {WHISPER_DEVICE} ({WHISPER_COMPUTE})...")
-from faster_whisper import WhisperModel
+window_stats = {
+    "decoded": 0,
+    "empty": 0,  # decoded, but the model found no text
+    "silent": 0,  # never decoded, the endpointer found no speech
+}
 
-model_location = MODEL_PATH if MODEL_PATH else WHISPER_MODEL
-model = WhisperModel(model_location, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE)
-print("Model loaded.")
+# Built by load_and_warm_up() once the model is loaded; until then the
+# service is live but not ready.
+model = None
+pool: WorkerPool | None = None
+retranscriber: Retranscriber | None = None
 
-session_buffers: dict[str, deque] = defaultdict(
-    lambda: deque(maxlen=BUFFER_SECONDS * SAMPLE_RATE)
+startup = {
+    "phase": "starting",  # -> loading -> warming_up -> ready, or failed
+    "ready": False,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "first_decode_seconds": None,
+    "cold_start_seconds": None,
+    "error": None,
+}
+
+redis_writer = RedisChunkWriter(redis_client)
+
+# int16 PCM is 2 bytes per sample
+admission = AdmissionController(
+    policy=OVERLOAD_POLICY,
+    max_sessions=MAX_SESSIONS,
+    session_limit_bytes=int(SESSION_QUEUE_SECONDS * SAMPLE_RATE * 2),
+    global_limit_bytes=int(GLOBAL_QUEUE_SECONDS * SAMPLE_RATE * 2),
+    pool_depth_limit=POOL_DEPTH_LIMIT,
+)
+
+# Where sequenced calls left off: call_id -> (next_seq, disconnected_at).
+# A client reconnecting within RESUME_SECONDS resends only what is missing.
+resume_points: dict[str, tuple[int, float]] = {}
+
+# Tails of sequenced sessions in Redis, so any replica can resume a call.
+# Binary values, so its own client without decode_responses.
+checkpointer = (
+    SessionCheckpointer(aioredis.Redis(host=REDIS_HOST, port=6379), ttl_seconds=RESUME_SECONDS)
+    if SESSION_CHECKPOINTS else None
 )
 
-app = FastAPI(title="Transcriber Service")
+# Silence markers from clients that gate their audio, and the audio they stood for
+silence_stats = {
+    "markers": 0,
+    "samples": 0,
+}
+
+sequence_stats = {
+    "resumed_sessions": 0,
+    "duplicate_frames": 0,  # resent after a reconnect, already received
+    "missing_frames": 0,  # never received (dropped by the client or lost)
+}
+
+# Bytes received per negotiated codec, to compare link usage
+inbound_bytes: dict[str, int] = {}
+
+# Opus/FLAC decoding runs here so it never blocks the event loop
+codec_executor = ThreadPoolExecutor(max_workers=CODEC_THREADS, thread_name_prefix="codec")
+
+# Decode loops of live and disconnected calls, kept referenced until they finish
+session_tasks: set[asyncio.Task] = set()
+
+# Offline transcription jobs started over HTTP, and their tasks
+batch_jobs: dict[str, BatchJob] = {}
+batch_tasks: dict[str, asyncio.Task] = {}
+
+
+def load_models():
+    """
+    Load the live model, plus the re-transcription and overload fallback
+    models when configured. Blocking.
+    """
+    from faster_whisper import WhisperModel
+
+    model_location = MODEL_PATH if MODEL_PATH else WHISPER_MODEL
+    print(
+        f"[Transcriber] Loading Whisper model '{WHISPER_MODEL}' on {WHISPER_DEVICE} ({WHISPER_COMPUTE}), "
+        f"{WHISPER_WORKERS} worker(s) x {WHISPER_CPU_THREADS or 'default'} threads..."
+    )
+    # num_workers gives CTranslate2 one model replica per pool worker, so the
+    # workers' generate calls run in parallel instead of queueing on one replica.
+    live_model = WhisperModel(
+        model_location,
+        device=WHISPER_DEVICE,
+        compute_type=WHISPER_COMPUTE,
+        cpu_threads=WHISPER_CPU_THREADS,
+        num_workers=WHISPER_WORKERS,
+    )
+
+    retranscribe_model = live_model
+    if SPOOL_AUDIO and RETRANSCRIBE_MODEL and RETRANSCRIBE_MODEL != model_location:
+        print(f"[Transcriber] Loading re-transcription model '{RETRANSCRIBE_MODEL}'...")
+        retranscribe_model = WhisperModel(
+            RETRANSCRIBE_MODEL,
+            device=WHISPER_DEVICE,
+            compute_type=WHISPER_COMPUTE,
+            cpu_threads=WHISPER_CPU_THREADS,
+        )
+
+    fallback_model = None
+    if QUALITY_ADAPTIVE and QUALITY_FALLBACK_MODEL:
+        print(f"[Transcriber] Loading overload fallback model '{QUALITY_FALLBACK_MODEL}'...")
+        fallback_model = WhisperModel(
+            QUALITY_FALLBACK_MODEL,
+            device=WHISPER_DEVICE,
+            compute_type=WHISPER_COMPUTE,
+            cpu_threads=WHISPER_CPU_THREADS,
+            num_workers=WHISPER_WORKERS,
+        )
+    return live_model, retranscribe_model, fallback_model
+
+
+def quality_tiers(live_model, fallback_model) -> list:
+    """Tiers the workers may decode at, best first."""
+    tiers = [Tier("standard", live_model, beam_size=1)]
+    if QUALITY_ADAPTIVE:
+        if QUALITY_HIGH_BEAM > 1:
+            # Beam search costs roughly its width in decoder steps, less the shared encoder pass
+            tiers.insert(0, Tier("accurate", live_model, beam_size=QUALITY_HIGH_BEAM, cost=1 + QUALITY_HIGH_BEAM / 4))
+        if fallback_model is not None:
+            tiers.append(Tier("fast", fallback_model, beam_size=1, cost=0.4))
+    return tiers
+
+
+def warmup_audio() -> np.ndarray:
+    """Synthetic speech-band audio: a few harmonics over low noise."""
+    t = np.arange(int(WARMUP_SECONDS * SAMPLE_RATE)) / SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    tone = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((180, 360, 720)))
+    return (0.1 * tone + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+async def warm_up():
+    """
+    Run WARMUP_DECODES decodes on every worker at every quality tier,
+    alternating the plain and timestamped prompts, so CTranslate2 kernels
+    and allocator pools are initialised before the first real call.
+    """
+    audio = warmup_audio()
+
+    async def one_worker(worker):
+        times = []
+        for tier in worker.policy.tiers:
+            for i in range(WARMUP_DECODES):
+                start = time.perf_counter()
+                await worker.submit(f"warmup:{worker.worker_id}", audio, timestamps=bool(i % 2), tier=tier.name)
+                times.append(time.perf_counter() - start)
+        return times
+
+    results = await asyncio.gather(*(one_worker(w) for w in pool.workers))
+    for worker, times in zip(pool.workers, results):
+        print(
+            f"[Transcriber] Warmup worker {worker.worker_id}: "
+            + ", ".join(f"{t * 1000:.0f} ms" for t in times)
+        )
+        worker.reset_stats()
+    return max((times[0] for times in results if times), default=None)
+
+
+async def load_and_warm_up():
+    """Startup phase: load the model off the import path, build the pool, warm it up."""
+    global model, pool, retranscriber
+    try:
+        startup["phase"] = "loading"
+        start = time.perf_counter()
+        model, retranscribe_model, fallback_model = await asyncio.to_thread(load_models)
+        startup["load_seconds"] = round(time.perf_counter() - start, 3)
+        print(f"[Transcriber] Model loaded in {startup['load_seconds']:.1f}s")
+
+        pool = WorkerPool(
+            model,
+            num_workers=WHISPER_WORKERS,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            tiers=quality_tiers(model, fallback_model),
+        )
+        pool.start()
+
+        startup["phase"] = "warming_up"
+        start = time.perf_counter()
+        first = await warm_up()
+        startup["warmup_seconds"] = round(time.perf_counter() - start, 3)
+        startup["first_decode_seconds"] = round(first, 3) if first is not None else None
+
+        if SPOOL_AUDIO:
+            # Sync client: the re-transcriber runs on its own thread
+            retranscriber = Retranscriber(
+                retranscribe_model,
+                redis.Redis(host=REDIS_HOST, port=6379, decode_responses=True),
+                pool,
+                beam_size=RETRANSCRIBE_BEAM,
+                keep_spool=SPOOL_KEEP,
+            )
+            retranscriber.start()
+
+        startup["cold_start_seconds"] = round(time.perf_counter() - PROCESS_STARTED, 3)
+        startup["phase"] = "ready"
+        startup["ready"] = True
+        print(
+            f"[Transcriber] Ready: cold start {startup['cold_start_seconds']:.1f}s "
+            f"(load {startup['load_seconds']:.1f}s, warmup {startup['warmup_seconds']:.1f}s)"
+        )
+    except Exception as e:
+        startup["phase"] = "failed"
+        startup["error"] = str(e)
+        print(f"[Transcriber] Startup failed: {e}")
+
+
+def pool_depth() -> int:
+    return pool.queue_depth() if pool else 0
+
+
+async def reap_idle_sessions():
+    """Close idle connections for as long as the service runs."""
+    interval = min(5.0, max(0.1, SESSION_IDLE_SECONDS / 4))
+    while True:
+        await asyncio.sleep(interval)
+        await sessions.evict_idle()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the Redis writer and begin loading the model in the background,
+    so /health answers while the model loads; stop everything on shutdown.
+    """
+    redis_writer.start()
+    startup_task = asyncio.create_task(load_and_warm_up())
+    reaper_task = asyncio.create_task(reap_idle_sessions())
+    yield
+    startup_task.cancel()
+    reaper_task.cancel()
+    for task in batch_tasks.values():
+        task.cancel()
+    for session in sessions.running():
+        session.inbound.close()
+    if session_tasks:
+        await asyncio.wait(session_tasks, timeout=10)
+    codec_executor.shutdown(wait=False)
+    await redis_writer.close()
+    if retranscriber:
+        retranscriber.stop()
+    if pool:
+        pool.stop()
+        pool.join(timeout=2)
+
+
+app = FastAPI(title="Transcriber Service", lifespan=lifespan)
+
+
+def buffer_capacity(streaming: bool) -> int:
+    if streaming:
+        # Headroom past the window so a late frame never overwrites
+        # audio that has not been committed yet.
+        seconds = STREAM_WINDOW_SECONDS + 2 * STREAM_STRIDE_SECONDS
+    elif ENDPOINTING:
+        seconds = ENDPOINT_MAX_SECONDS + 1
+    else:
+        seconds = BUFFER_SECONDS
+    return int(seconds * SAMPLE_RATE)
+
+
+async def send_event(websocket: WebSocket, session: Session, event: dict):
+    """Send a JSON message unless the client has already gone away."""
+    if not session.connected:
+        return
+    try:
+        await websocket.send_text(json.dumps(event))
+    except Exception:
+        session.connected = False
+
+
+async def decode_session(session: Session, channel: Channel, timestamps: bool = False) -> list:
+    """Submit a channel's buffered window to the batch scheduler."""
+    buf = channel.buf
+    if buf is None or len(buf) == 0:
+        return []
+    # Zero-copy view; only this session's decode loop writes to the buffer,
+    # and it is waiting here until the worker has resolved the request.
+    # Both channels of a stereo call share the call's worker, so windows
+    # they submit together are decoded in the same batch.
+    # Windows the endpointer closed already hold speech; any other window
+    # goes through VAD first, so silence is not decoded into hallucinations
+    vad = session.streaming or not ENDPOINTING
+    start = time.perf_counter()
+    segments, channel.tier = await pool.submit(session.call_id, buf.view(), timestamps=timestamps, vad=vad)
+    DECODE_WAIT_SECONDS.observe(time.perf_counter() - start)
+    window_stats["decoded"] += 1
+    if not any(text.strip() for _, _, text in segments):
+        window_stats["empty"] += 1
+    return segments
+
+
+async def publish_chunk(websocket: WebSocket, session: Session, channel: Channel, text: str, audio_end: float):
+    """
+    Push a finished chunk to Redis and the client, tagged with its quality
+    tier and, on stereo calls, its speaker.
+    """
+    redis_writer.push(
+        session.call_id, session.customer_id, channel.label(text), tier=channel.tier, speaker=channel.speaker
+    )
+    chunk_tiers[channel.tier] = chunk_tiers.get(channel.tier, 0) + 1
+    session.chunks_out += 1
+    event = {
+        "call_id": session.call_id,
+        "transcript_chunk": text,
+        "audio_end": audio_end,
+        "tier": channel.tier,
+    }
+    if channel.speaker:
+        event["speaker"] = channel.speaker
+    await send_event(websocket, session, event)
+
+
+async def transcribe_buffer(session: Session, channel: Channel) -> str:
+    segments = await decode_session(session, channel)
+    return " ".join(text for _, _, text in segments)
+
+
+async def stream_step(websocket: WebSocket, session: Session, channel: Channel, final: bool = False):
+    """
+    Re-decode the streaming window, commit the words two consecutive
+    hypotheses agree on and send the rest as an interim hypothesis.
+    """
+    buf = channel.buf
+    audio_end = round(buf.total_written / SAMPLE_RATE, 3)
+    window_full = len(buf) >= STREAM_WINDOW_SECONDS * SAMPLE_RATE
+    segments = await decode_session(session, channel, timestamps=True)
+    committed, interim, trim_seconds = channel.stream.update(segments, final=final or window_full)
+
+    if committed:
+        await publish_chunk(websocket, session, channel, " ".join(committed), audio_end)
+    if not final:
+        event = {
+            "type": "interim",
+            "call_id": session.call_id,
+            "text": " ".join(interim),
+            "audio_end": audio_end,
+        }
+        if channel.speaker:
+            event["speaker"] = channel.speaker
+        await send_event(websocket, session, event)
+
+    if trim_seconds is None:
+        buf.clear()
+    elif trim_seconds > 0:
+        buf.consume(int(trim_seconds * SAMPLE_RATE))
+
+
+def new_endpointer() -> Endpointer:
+    return Endpointer(
+        sample_rate=SAMPLE_RATE,
+        threshold_db=VAD_THRESHOLD_DB,
+        min_silence_ms=ENDPOINT_MIN_SILENCE_MS,
+        max_segment_seconds=ENDPOINT_MAX_SECONDS,
+    )
+
+
+async def flush_window(websocket: WebSocket, session: Session, channel: Channel):
+    """Decode the whole buffered window, push it and start a new one."""
+    audio_end = round(channel.buf.total_written / SAMPLE_RATE, 3)
+    transcript = await transcribe_buffer(session, channel)
+    if transcript.strip():
+        await publish_chunk(websocket, session, channel, transcript, audio_end)
+    channel.buf.clear()
+
 
+async def process_audio(websocket: WebSocket, session: Session, payload: bytes):
+    """Write one (possibly coalesced) payload and decode if a window is ready."""
+    capacity = buffer_capacity(session.streaming)
+    if session.converter is not None:
+        # G.711 or another rate: a table lookup and a polyphase filter,
+        # cheap enough to run inline (see bench_telephony.py)
+        start = time.perf_counter()
+        converted = session.converter.convert(payload)
+        PCM_CONVERT_SECONDS.observe(time.perf_counter() - start)
+        if session.spool is not None:
+            session.spool.write_float32(converted[0])
+        await asyncio.gather(*(
+            write_slices(websocket, session, channel, samples)
+            for channel, samples in zip(session.channels, converted)
+        ))
+        return
+
+    if session.decoder is None and len(session.channels) == 1:
+        channel = session.channels[0]
+        written = channel.ensure_buffer(capacity).write_pcm16(payload)
+        await advance_window(websocket, session, channel, written)
+        return
+
+    if session.decoder is None:
+        # Interleaved stereo: each column is a strided view of one channel,
+        # scaled straight into that channel's buffer without a copy.
+        frames = np.frombuffer(payload, dtype="<i2").reshape(-1, len(session.channels))
+        written = [
+            channel.ensure_buffer(capacity).write(frames[:, i], scale=PCM16_SCALE)
+            for i, channel in enumerate(session.channels)
+        ]
+        # Channels whose windows close on the same write are submitted
+        # together and decoded in one batched model call.
+        await asyncio.gather(*(
+            advance_window(websocket, session, channel, n)
+            for channel, n in zip(session.channels, written)
+        ))
+        return
 
-def transcribe_buffer(call_id: str) -> str:
-    buf = session_buffers[call_id]
-    if len(buf) == 0:
-        return ""
-    audio_np = np.array(buf, dtype=np.float32)
-    segments, _ = model.transcribe(
-        audio_np,
-        language="en",
-        vad_filter=True,
-        beam_size=1,
-        without_timestamps=True,
+    start = time.perf_counter()
+    samples = await asyncio.get_running_loop().run_in_executor(
+        codec_executor, session.decoder.decode, payload
     )
-    return " ".join(seg.text.strip() for seg in segments)
+    CODEC_DECODE_SECONDS.observe(time.perf_counter() - start)
+    if session.spool is not None:
+        session.spool.write_float32(samples)
+    await write_slices(websocket, session, session.channels[0], samples)
+
+
+async def write_slices(websocket: WebSocket, session: Session, channel: Channel, samples: np.ndarray):
+    """
+    Write decoded samples a slice at a time. The queue limits count wire
+    bytes, so one coalesced payload can hold more audio than the buffer
+    has room for; no window is overwritten before it is decoded.
+    """
+    buf = channel.ensure_buffer(buffer_capacity(session.streaming))
+    pos = 0
+    while pos < len(samples):
+        room = max(buf.capacity - len(buf), SAMPLE_RATE // 10)
+        written = buf.write(samples[pos:pos + room])
+        pos += written
+        await advance_window(websocket, session, channel, written)
+
+
+async def advance_window(websocket: WebSocket, session: Session, channel: Channel, written: int):
+    """Run the streaming, endpointing or fixed-window logic on newly written samples."""
+    buf = channel.buf
+    if session.streaming:
+        if channel.stream is None:
+            channel.stream = LocalAgreement()
+        if buf.total_written - channel.last_decode_at >= STREAM_STRIDE_SECONDS * SAMPLE_RATE:
+            channel.last_decode_at = buf.total_written
+            await stream_step(websocket, session, channel)
+    elif ENDPOINTING:
+        if channel.endpointer is None:
+            channel.endpointer = new_endpointer()
+        endpointer = channel.endpointer
+        action = endpointer.feed(buf.view(written))
+        if action == "drop":
+            skipped = len(buf) - endpointer.preroll_samples
+            if skipped > 0:
+                buf.consume(skipped)
+                endpoint_stats["silence_samples_skipped"] += skipped
+                window_stats["silent"] += 1
+            endpointer.dropped(len(buf))
+        elif action == "flush":
+            await flush_window(websocket, session, channel)
+            endpointer.reset()
+            endpoint_stats["segments_flushed"] += 1
+    elif len(buf) >= BUFFER_SECONDS * SAMPLE_RATE:
+        await flush_window(websocket, session, channel)
 
 
-def push_to_redis(call_id: str, customer_id: str, text: str):
-    if not text or not text.strip():
+async def skip_silence(websocket: WebSocket, session: Session, channel: Channel, samples: int):
+    """
+    Advance one channel over silence the client sent as a marker. The gap
+    is never buffered or decoded: it closes the current window (for the
+    endpointer, once the pause is long enough) and audio positions still
+    count it.
+    """
+    buf = channel.ensure_buffer(buffer_capacity(session.streaming))
+    if session.streaming:
+        if len(buf) and channel.stream is not None:
+            await stream_step(websocket, session, channel, final=True)
+    elif not ENDPOINTING:
+        if len(buf):
+            await flush_window(websocket, session, channel)
+    else:
+        if channel.endpointer is None:
+            channel.endpointer = new_endpointer()
+        endpointer = channel.endpointer
+        if endpointer.has_speech:
+            if endpointer.skip(samples) == "flush":
+                await flush_window(websocket, session, channel)
+                endpointer.reset()
+                endpoint_stats["segments_flushed"] += 1
+        else:
+            # Nothing but pre-roll buffered, and it is stale once the gap is over
+            endpoint_stats["silence_samples_skipped"] += len(buf)
+            buf.clear()
+            endpointer.reset()
+        endpoint_stats["silence_samples_skipped"] += samples
+    buf.total_written += samples
+    channel.last_decode_at = buf.total_written
+
+
+async def finalize_channel(session: Session, channel: Channel):
+    buf = channel.buf
+    if buf is None or len(buf) == 0:
         return
+    if channel.stream is not None:
+        await stream_step(None, session, channel, final=True)
+    elif channel.endpointer is None or channel.endpointer.has_speech:
+        await flush_window(None, session, channel)
+    else:
+        window_stats["silent"] += 1
+
+
+async def finalize_session(session: Session):
+    """Decode whatever a disconnected call left buffered."""
+    await asyncio.gather(*(finalize_channel(session, channel) for channel in session.channels))
+
+
+def spool_path(call_id: str) -> str:
+    return os.path.join(SPOOL_DIR, re.sub(r"[^\w.-]", "_", call_id) + ".pcm")
+
+
+async def drop_spool(session: Session):
+    """Stop spooling a call that cannot be re-transcribed whole."""
+    session.spool.close()
+    session.spool.delete()
+    session.spool = None
+    await redis_client.delete(f"call:{session.call_id}:retranscribe")
+
 
-    text = text.strip()
+async def hand_off_spool(session: Session):
+    """
+    Queue the call's spooled audio for re-transcription once its live
+    chunks are all in Redis, so the replacement cannot be overtaken by them.
+    """
+    if not await redis_writer.flush(timeout=30):
+        print(f"[Transcriber] Live chunks for call {session.call_id} still queued, re-transcribing anyway")
+    retranscriber.enqueue(session.call_id, session.customer_id, session.spool)
 
-    pipe = redis_client.pipeline()
 
-    pipe.set(f"call:{call_id}:customer_id", customer_id)
-    pipe.rpush(f"call:{call_id}:chunks", text)
+async def restore_tail(websocket: WebSocket, session: Session):
+    """Write a claimed checkpoint's tails back into the buffers, ahead of any new audio."""
+    checkpoint, session.restored = session.restored, None
+    capacity = buffer_capacity(session.streaming)
+    for channel, (start, pcm) in zip(session.channels, checkpoint.tails):
+        buf = channel.ensure_buffer(capacity)
+        written = buf.write(pcm, scale=PCM16_SCALE)
+        # Audio positions carry on from where the call left off
+        buf.total_written = start + len(pcm)
+        if written:
+            await advance_window(websocket, session, channel, written)
 
-    # Try adding to pending set
-    pipe.sadd("pending_calls", call_id)
 
-    results = pipe.execute()
+async def release_checkpoint(session: Session) -> bool:
+    """
+    At the end of a checkpointed session, decide who decodes its tail.
+    After a dropped connection the tail waits in Redis for
+    CHECKPOINT_GRACE_SECONDS so a reconnect on any replica can claim it.
+    Returns whether this session still owns the call.
+    """
+    if not session.clean_close and await checkpointer.save(session):
+        await asyncio.sleep(CHECKPOINT_GRACE_SECONDS)
+    return await checkpointer.release(session)
 
-    was_added = results[-1]  # sadd returns 1 if newly added
 
-    if was_added:
-        redis_client.rpush("summarize_queue", call_id)
+async def run_session(websocket: WebSocket, session: Session):
+    """
+    Decode loop for one call: drains the inbound queue until the receive
+    loop closes it, then flushes the remaining audio. Checkpointed sessions
+    save their tail between payloads.
+    """
+    try:
+        while True:
+            # Never coalesce more audio than the ring buffer has room for
+            free = buffer_capacity(session.streaming) - session.buffered_samples()
+            room = session.frame_bytes * (free * session.sample_rate // SAMPLE_RATE)
+            frames = await session.inbound.get(max_bytes=room)
+            if frames is None:
+                break
+            if session.restored is not None:
+                await restore_tail(websocket, session)
+            if isinstance(frames[0], Silence):
+                await asyncio.gather(*(
+                    skip_silence(websocket, session, channel, frames[0].samples)
+                    for channel in session.channels
+                ))
+            else:
+                payload = frames[0] if len(frames) == 1 else b"".join(frames)
+                await process_audio(websocket, session, payload)
+            if session.inbound.last_tag is not None:
+                session.processed_seq = session.inbound.last_tag
+            if session.checkpoint is not None and checkpointer.due(session):
+                await checkpointer.save(session)
+        if session.restored is not None:
+            await restore_tail(None, session)
+        if session.checkpoint is None or await release_checkpoint(session):
+            await finalize_session(session)
+    except Exception as e:
+        print(f"[Transcriber] Session {session.call_id} failed: {e}")
+    finally:
+        if not session.native_pcm and session.spool is not None:
+            # Compressed and converted sessions spool from this loop, so close it here
+            session.spool.close()
+        current = sessions.remove(session)
+        if sessions.get(session.call_id) is None:
+            # A reconnected call keeps its worker until its last session ends
+            pool.release(session.call_id)
+        if current:
+            # A reconnected call keeps spooling; its last session hands off
+            if session.spool is not None and not (session.checkpoint and session.checkpoint.superseded):
+                await hand_off_spool(session)
+
+
+def accept_sequenced(session: Session, seq: int, count: int) -> int:
+    """Track a sequenced message; returns how many of its frames are new (0 for a resend)."""
+    overlap, missing = session.accept_seq(seq, count)
+    sequence_stats["duplicate_frames"] += overlap
+    sequence_stats["missing_frames"] += missing
+    return count - overlap
+
+
+def new_frames(session: Session, payload: bytes, fresh: int, count: int) -> bytes:
+    """
+    The last `fresh` of a message's `count` frames, for a resend that
+    overlaps audio already received. A message's frames are equal-sized
+    blocks, so PCM is cut in proportion. Compressed packets do not line up
+    with frames; such a message is dropped and its new frames count as
+    missing, rather than transcribing the overlap twice.
+    """
+    if session.decoder is not None:
+        sequence_stats["missing_frames"] += fresh
+        return b""
+    cut = len(payload) * (count - fresh) // count
+    return payload[cut - cut % session.frame_bytes:]
 
 
 @app.websocket("/ws/transcribe")
 async def ws_transcribe(websocket: WebSocket):
+    """
+    Stream audio for one call.
+
+    Two framings are accepted on the same endpoint:
+    - JSON (legacy): every text frame carries call_id, customer_id and
+      the int16 PCM as an `audio_hex` string.
+    - Binary: a single text handshake `{"type": "start", "call_id": ...,
+      "customer_id": ...}` followed by raw little-endian int16 PCM frames.
+
+    With `"seq": true` in the handshake every binary frame starts with a
+    6-byte header (sessions.SEQ_HEADER): the sequence number of its first
+    audio frame and its frame count. `session_started` then carries
+    `next_seq`, the first frame the server has not received for this call,
+    so a reconnecting client resends from there; frames received twice are
+    dropped. Positions are kept for RESUME_SECONDS after a disconnect.
+
+    With SESSION_CHECKPOINTS=true the position and the unflushed audio tail
+    are also checkpointed to Redis (see checkpoint.py), so the reconnect
+    may land on any replica: the new session claims the tail and the old
+    one, once it notices, hands the call over instead of decoding it. A
+    dropped session waits CHECKPOINT_GRACE_SECONDS for a reconnect before
+    decoding its own tail; a normal close (1000) decodes it at once.
+
+    The handshake may offer compressed codecs (`"codecs": ["opus",
+    "pcm16"]`, see audio_codecs.py); `session_started` names the one
+    chosen. Opus at 24 kbps is about a tenth of the PCM bit rate. Packets
+    are decoded on CODEC_THREADS worker threads by the session's decode
+    loop, straight into its float32 buffer.
+
+    By default a window is closed by the energy endpointer at the first
+    pause after speech (or at ENDPOINT_MAX_SECONDS), and audio without
+    speech is dropped before it reaches the model. With ENDPOINTING=false
+    windows are a fixed BUFFER_SECONDS long and are only decoded if Silero
+    VAD finds speech in them (as are streaming windows).
+
+    Setting `"mode": "streaming"` on the start (or first JSON) message
+    switches from single-pass windows to overlapping decodes every
+    STREAM_STRIDE_SECONDS, with `interim` hypotheses sent over the socket
+    and only stable text pushed to Redis.
+
+    Clients that gate silence send `{"type": "silence", "ms": N}` (plus
+    `seq` and `count` on sequenced sessions) in place of N ms of audio. The
+    gap is queued in order with the audio and never buffered or decoded:
+    it closes the current window like a pause (streaming commits its
+    hypothesis), and audio positions still advance over it.
+
+    `"channels": 2` on the start message takes interleaved stereo pcm16,
+    agent on the left channel and customer on the right (override with
+    `"speakers": [...]`). Each channel is endpointed and decoded on its
+    own, in the same worker batch, and its chunks are pushed as
+    "Agent: ..." / "Customer: ..." with a `speaker` field. Stereo calls are
+    not spooled for re-transcription.
+
+    Telephony sources declare their frames with `"encoding"` (pcm16,
+    mulaw or alaw) and `"sample_rate"` (8000-48000) on the start message;
+    anything but 16 kHz pcm16 is decoded and resampled to 16 kHz by the
+    decode loop (see telephony.py), with no codec negotiation.
+
+    Transcript and interim events carry `audio_end`: the call's audio
+    position, in seconds, at the end of the decoded window, so clients can
+    measure end-to-end latency. Transcript events also carry `tier`, the
+    quality tier (quality.py) the window was decoded at.
+
+    A connection that sends nothing, not even a silence marker, for
+    SESSION_IDLE_SECONDS is closed with code 1001 and its call finishes as
+    after any disconnect. New calls are refused with 1013 while the ring
+    buffers of running sessions would exceed MAX_BUFFER_MB; GET /sessions
+    lists them.
+
+    This loop only parses frames and queues them; decoding runs in the
+    session's own task (see run_session), so a slow model shows up as a
+    bounded queue handled by OVERLOAD_POLICY instead of unbounded backlog.
+    New calls are refused with close code 1013 while the model is still
+    warming up or when admission fails.
+
+    With SPOOL_AUDIO=true the raw PCM is also spooled to SPOOL_DIR and
+    re-transcribed with RETRANSCRIBE_BEAM (and RETRANSCRIBE_MODEL, if set)
+    after the call; the result replaces the live chunks in Redis.
+    """
     await websocket.accept()
-    call_id = None
+    session = None
+    previous = None
     try:
         while True:
-            raw = await websocket.receive_text()
-            data = json.loads(raw)
-            call_id = data["call_id"]
-            customer_id = str(data.get("customer_id", call_id))
-            audio_hex = data["audio_hex"]
-
-            audio_bytes = bytes.fromhex(audio_hex)
-            audio_int16 = np.frombuffer(audio_bytes, dtype=np.int16)
-            audio_float32 = audio_int16.astype(np.float32) / 32768.0
-
-            buf = session_buffers[call_id]
-            buf.extend(audio_float32.tolist())
-
-            if len(buf) >= BUFFER_SECONDS * SAMPLE_RATE:
-                transcript = await asyncio.to_thread(transcribe_buffer, call_id)
-                if transcript.strip():
-                    push_to_redis(call_id, customer_id, transcript)
-                    await websocket.send_text(json.dumps({
-                        "call_id": call_id,
-                        "transcript_chunk": transcript,
-                    }))
-                buf.clear()
-
-    except WebSocketDisconnect:
-        if call_id and len(session_buffers.get(call_id, [])) > 0:
-            transcript = transcribe_buffer(call_id)
-            if transcript.strip():
-                push_to_redis(call_id, str(call_id), transcript)
-        if call_id and call_id in session_buffers:
-            del session_buffers[call_id]
-        print(f"Client disconnected (call_id={call_id})")
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if session is not None:
+                session.touch(len(message.get("bytes") or message.get("text") or ""))
+
+            payload = message.get("bytes")
+            if payload is not None:
+                if session is None:
+                    await websocket.close(code=1008, reason="Send a start message before binary audio")
+                    return
+                if session.sequenced:
+                    if len(payload) < SEQ_HEADER.size:
+                        print(f"[Transcriber] Dropping frame without sequence header for call {session.call_id}")
+                        continue
+                    seq, count = SEQ_HEADER.unpack_from(payload)
+                    fresh = accept_sequenced(session, seq, count)
+                    if not fresh:
+                        continue
+                    payload = payload[SEQ_HEADER.size:]
+                    if fresh < count:
+                        payload = new_frames(session, payload, fresh, count)
+                        if not payload:
+                            continue
+            else:
+                data = json.loads(message["text"])
+                if session is None:
+                    call_id = data["call_id"]
+                    channels = int(data.get("channels", 1))
+                    if channels not in (1, 2):
+                        await websocket.close(code=1008, reason="channels must be 1 or 2")
+                        return
+                    encoding = data.get("encoding", PCM16)
+                    sample_rate = int(data.get("sample_rate", SAMPLE_RATE))
+                    converter = None
+                    if encoding != PCM16 or sample_rate != SAMPLE_RATE:
+                        try:
+                            converter = PcmConverter(encoding, sample_rate, channels, out_rate=SAMPLE_RATE)
+                        except ValueError as e:
+                            await websocket.close(code=1008, reason=str(e))
+                            return
+                    if not startup["ready"]:
+                        await websocket.close(code=CLOSE_OVERLOADED, reason="Transcriber is starting up")
+                        return
+                    streaming = data.get("mode") == "streaming"
+                    reserve = channels * RingBuffer.nbytes_for(buffer_capacity(streaming))
+                    if not sessions.has_room(reserve):
+                        print(f"[Transcriber] Rejected call {call_id}: buffer memory limit ({MAX_BUFFER_MB:g} MB)")
+                        await websocket.close(code=CLOSE_OVERLOADED, reason="Transcriber buffer memory full")
+                        return
+                    admitted, reason = admission.try_admit(pool.queue_depth())
+                    if not admitted:
+                        print(f"[Transcriber] Rejected call {call_id}: {reason}")
+                        await websocket.close(code=CLOSE_OVERLOADED, reason=reason)
+                        return
+                    speakers = data.get("speakers") or DEFAULT_SPEAKERS
+                    session = Session(
+                        call_id,
+                        str(data.get("customer_id", call_id)),
+                        InboundQueue(admission),
+                        streaming=streaming,
+                        speakers=[str(s) for s in speakers[:2]] if channels == 2 else None,
+                    )
+                    session.encoding = encoding
+                    session.sample_rate = sample_rate
+                    session.converter = converter
+                    session.websocket = websocket
+                    session.reserved_bytes = reserve
+                    session.touch(len(message["text"]))
+                    # The re-transcriber reads mono spools only
+                    spooled = retranscriber is not None and channels == 1
+                    if spooled:
+                        # Tells the summarizer a better transcript is on its way.
+                        # Written before sessions.add, so a Redis error cannot
+                        # leave a session registered without a decode loop
+                        await redis_client.set(f"call:{call_id}:retranscribe", "pending")
+                    previous = sessions.add(session)
+                    if spooled:
+                        if previous is not None and previous.spool is not None:
+                            # The old connection may not have noticed it is gone;
+                            # take its spool over so it never writes or trims it again
+                            session.spool, previous.spool = previous.spool, None
+                        else:
+                            try:
+                                session.spool = AudioSpool(spool_path(call_id), sample_rate=SAMPLE_RATE)
+                            except OSError:
+                                sessions.remove(session)
+                                raise
+                    task = asyncio.create_task(run_session(websocket, session))
+                    session_tasks.add(task)
+                    task.add_done_callback(session_tasks.discard)
+
+                if data.get("type") == "start":
+                    if session.converter is not None:
+                        # Telephony audio keeps its wire format; nothing to negotiate
+                        session.codec = session.encoding
+                    else:
+                        # Stereo arrives as interleaved pcm16 only
+                        session.codec = negotiate(data.get("codecs")) if len(session.channels) == 1 else PCM16
+                    if session.converter is None and session.codec != PCM16:
+                        config = data.get("codec_config")
+                        try:
+                            session.decoder = PacketDecoder(
+                                session.codec,
+                                extradata=base64.b64decode(config) if config else None,
+                                sample_rate=SAMPLE_RATE,
+                            )
+                        except Exception as e:
+                            print(f"[Transcriber] Cannot decode {session.codec} for call {session.call_id}: {e}")
+                            await websocket.close(code=1008, reason=f"Bad {session.codec} codec_config")
+                            return
+                    started = {
+                        "type": "session_started",
+                        "call_id": session.call_id,
+                        "codec": session.codec,
+                        "channels": len(session.channels),
+                        "encoding": session.encoding,
+                        "sample_rate": session.sample_rate,
+                    }
+                    if data.get("seq"):
+                        session.sequenced = True
+                        restored = await checkpointer.claim(session) if checkpointer else None
+                        if restored is not None:
+                            session.restored = restored
+                            session.next_seq = restored.next_seq
+                            if previous is None and session.spool is not None and session.spool.samples == 0:
+                                # Moved from another replica, whose spool holds the call
+                                # so far: the live chunks stand instead.
+                                await drop_spool(session)
+                        elif previous is not None and previous.sequenced and checkpointer is None:
+                            # The old connection has not noticed it is gone yet
+                            session.next_seq = previous.next_seq
+                        else:
+                            # With checkpoints, a previous session that never saved
+                            # has published nothing, so the call restarts from 0
+                            session.next_seq = resume_points.pop(session.call_id, (0, 0))[0]
+                        session.processed_seq = session.next_seq
+                        if session.next_seq:
+                            sequence_stats["resumed_sessions"] += 1
+                        started["next_seq"] = session.next_seq
+                    await send_event(websocket, session, started)
+                    continue
+
+                if data.get("type") == "silence":
+                    samples = int(data["ms"]) * SAMPLE_RATE // 1000
+                    if session.sequenced:
+                        count = int(data["count"])
+                        fresh = accept_sequenced(session, int(data["seq"]), count)
+                        if not fresh:
+                            continue
+                        samples = samples * fresh // count
+                    silence_stats["markers"] += 1
+                    silence_stats["samples"] += samples
+                    # Never spooled: re-transcription is better off without the gap
+                    session.inbound.put(Silence(samples), tag=session.next_seq if session.sequenced else None)
+                    continue
+
+                hex_start = time.perf_counter()
+                payload = bytes.fromhex(data["audio_hex"])
+                HEX_DECODE_SECONDS.observe(time.perf_counter() - hex_start)
+
+            if session.decoder is None and len(payload) % session.frame_bytes:
+                print(f"[Transcriber] Dropping partial PCM frame for call {session.call_id}")
+                continue
+            inbound_bytes[session.codec] = inbound_bytes.get(session.codec, 0) + len(payload)
+
+            # Spooled before queueing, so audio dropped under overload is
+            # still in the re-transcribed record. Compressed and converted
+            # audio is spooled by the decode loop once at 16 kHz.
+            if session.spool is not None and session.native_pcm:
+                session.spool.write_pcm16(payload)
+
+            dropped = session.inbound.put(payload, tag=session.next_seq if session.sequenced else None)
+            if dropped:
+                event = {
+                    "type": "overload",
+                    "call_id": session.call_id,
+                    "dropped_bytes": dropped,
+                }
+                if session.decoder is None:
+                    event["dropped_ms"] = int(dropped / session.frame_bytes / session.sample_rate * 1000)
+                await send_event(websocket, session, event)
+
+    except WebSocketDisconnect as e:
+        if session is not None:
+            session.clean_close = e.code == 1000
+    finally:
+        if session is not None:
+            # The decode loop drains what is queued and flushes the rest in
+            # the background, so the disconnect never waits on the model.
+            session.connected = False
+            session.inbound.close()
+            admission.release()
+            if session.sequenced and sessions.is_current(session):
+                now = time.time()
+                for stale in [c for c, (_, at) in resume_points.items() if now - at > RESUME_SECONDS]:
+                    del resume_points[stale]
+                resume_points[session.call_id] = (session.next_seq, now)
+            if session.spool is not None and session.native_pcm:
+                session.spool.close()
+        print(f"Client disconnected (call_id={session.call_id if session else None})")
+
+
+def session_memory() -> dict:
+    """Per-session and total buffer memory, for sizing transcriber pods."""
+    report = {
+        call_id: {
+            "channels": len(session.channels),
+            "buffered_samples": session.buffered_samples(),
+            "capacity_samples": max((c.buf.capacity for c in session.channels if c.buf), default=0),
+            "allocated_bytes": session.buffer_bytes(),
+            "queued_bytes": session.inbound.nbytes,
+        }
+        for call_id, session in sessions.items()
+    }
+    return {
+        "active_sessions": len(report),
+        "total_allocated_bytes": sum(s["allocated_bytes"] for s in report.values()),
+        "total_reserved_bytes": sessions.reserved_bytes(),
+        "max_buffer_bytes": sessions.max_buffer_bytes,
+        "total_queued_bytes": admission.queued_bytes,
+        "sessions": report,
+    }
+
+
+@app.get("/memory")
+def memory():
+    return session_memory()
+
+
+@app.get("/sessions")
+def list_sessions():
+    """Admin view of every session with a running decode loop: timing, traffic and memory."""
+    return {**sessions.stats(), "sessions": sessions.listing(SAMPLE_RATE)}
 
 
 @app.get("/health")
 def health():
-    return {"status": "healthy", "model": WHISPER_MODEL, "device": WHISPER_DEVICE}
+    """Liveness: the process is up, whether or not the model is ready yet."""
+    body = {
+        "status": "unhealthy" if startup["phase"] == "failed" else "healthy",
+        "model": WHISPER_MODEL,
+        "device": WHISPER_DEVICE,
+        "compute_type": WHISPER_COMPUTE,
+        "autotuned": bool(RECOMMENDED),
+        "startup": startup,
+        "pool": pool.stats() if pool else None,
+        "redis_writer": redis_writer.stats(),
+        "overload": admission.stats(pool_depth()),
+        "retranscribe": retranscriber.stats() if retranscriber else {"enabled": False},
+        "checkpoints": checkpointer.stats() if checkpointer else {"enabled": False},
+        "sessions": sessions.stats(),
+        "endpointing": {
+            "enabled": ENDPOINTING,
+            "segments_flushed": endpoint_stats["segments_flushed"],
+            "silence_seconds_skipped": endpoint_stats["silence_samples_skipped"] / SAMPLE_RATE,
+            "client_silence_markers": silence_stats["markers"],
+            "client_silence_seconds": silence_stats["samples"] / SAMPLE_RATE,
+        },
+    }
+    if startup["phase"] == "failed":
+        return JSONResponse(body, status_code=503)
+    return body
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 only once the model is loaded and warmed up."""
+    body = {
+        "ready": startup["ready"],
+        "phase": startup["phase"],
+        "cold_start_seconds": startup["cold_start_seconds"],
+    }
+    return JSONResponse(body, status_code=200 if startup["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of session, model, Redis and overload metrics."""
+    live = sessions.items()
+    session_stats = sessions.stats()
+    writer = redis_writer.stats()
+    overload = admission.stats(pool_depth())
+    pool_workers = pool.workers if pool else []
+    workers = [{"worker": w.worker_id} for w in pool_workers]
+
+    families = [
+        metric("transcriber_ready", "gauge", "1 once the model is loaded and warmed up.", int(startup["ready"])),
+        metric("transcriber_active_sessions", "gauge", "Calls with a live or finishing decode loop.", session_stats["running"]),
+        metric(
+            "transcriber_session_reserved_bytes", "gauge",
+            "Ring-buffer memory reserved by running sessions (cap: MAX_BUFFER_MB).", session_stats["reserved_bytes"],
+        ),
+        metric(
+            "transcriber_sessions_evicted_total", "counter",
+            "Connections closed for sending nothing for SESSION_IDLE_SECONDS.",
+            [({"reason": "idle"}, session_stats["idle_evictions"])],
+        ),
+        metric(
+            "transcriber_buffer_rejections_total", "counter",
+            "Calls refused because their buffers would exceed MAX_BUFFER_MB.", session_stats["buffer_rejections"],
+        ),
+        metric(
+            "transcriber_session_buffered_seconds", "gauge",
+            "Audio in a session's ring buffer waiting to be decoded.",
+            [({"call_id": call_id}, s.buffered_samples() / SAMPLE_RATE) for call_id, s in live],
+        ),
+        metric(
+            "transcriber_session_queued_seconds", "gauge",
+            "Audio received but not yet taken by a session's decode loop.",
+            [({"call_id": call_id}, s.inbound.nbytes / s.frame_bytes / s.sample_rate) for call_id, s in live],
+        ),
+        metric(
+            "transcriber_model_rtf", "gauge",
+            "Model real-time factor (decode seconds per audio second) since start.",
+            [(labels, w.rtf()) for labels, w in zip(workers, pool_workers)],
+        ),
+        metric(
+            "transcriber_decoded_audio_seconds_total", "counter",
+            "Seconds of audio run through the model.",
+            [(labels, w.audio_seconds) for labels, w in zip(workers, pool_workers)],
+        ),
+        metric(
+            "transcriber_decode_busy_seconds_total", "counter",
+            "Seconds the model spent decoding.",
+            [(labels, w.busy_seconds) for labels, w in zip(workers, pool_workers)],
+        ),
+        metric(
+            "transcriber_quality_tier", "gauge",
+            "1 for the quality tier each worker currently decodes at.",
+            [({**labels, "tier": w.policy.tier.name}, 1) for labels, w in zip(workers, pool_workers)],
+        ),
+        metric(
+            "transcriber_tier_audio_seconds_total", "counter",
+            "Seconds of audio decoded, by quality tier.",
+            [
+                ({**labels, "tier": tier}, seconds)
+                for labels, w in zip(workers, pool_workers)
+                for tier, seconds in list(w.tier_audio_seconds.items())
+            ],
+        ),
+        metric(
+            "transcriber_chunks_by_tier_total", "counter",
+            "Transcript chunks pushed, by the quality tier that decoded them.",
+            [({"tier": tier}, n) for tier, n in chunk_tiers.items()],
+        ),
+        metric(
+            "transcriber_pool_queue_depth", "gauge",
+            "Windows waiting for a worker.",
+            [(labels, w.queue_depth()) for labels, w in zip(workers, pool_workers)],
+        ),
+        metric("transcriber_windows_decoded_total", "counter", "Windows sent to the model.", window_stats["decoded"]),
+        metric("transcriber_windows_empty_total", "counter", "Decoded windows that produced no text.", window_stats["empty"]),
+        metric(
+            "transcriber_windows_silent_total", "counter",
+            "Windows dropped by the endpointer without decoding.", window_stats["silent"],
+        ),
+        metric(
+            "transcriber_silence_skipped_seconds_total", "counter",
+            "Audio the endpointer dropped as silence.", endpoint_stats["silence_samples_skipped"] / SAMPLE_RATE,
+        ),
+        metric("transcriber_chunks_pushed_total", "counter", "Transcript chunks handed to the Redis writer.", writer["chunks_pushed"]),
+        metric("transcriber_chunks_written_total", "counter", "Transcript chunks written to Redis.", writer["chunks_written"]),
+        metric("transcriber_chunks_dropped_total", "counter", "Transcript chunks the Redis writer gave up on.", writer["chunks_dropped"]),
+        metric("transcriber_redis_writer_pending", "gauge", "Chunks queued for the Redis writer.", writer["pending"]),
+        metric(
+            "transcriber_inbound_bytes_total", "counter",
+            "Audio bytes received, by negotiated codec.",
+            [({"codec": codec}, n) for codec, n in inbound_bytes.items()],
+        ),
+        metric("transcriber_inbound_queued_bytes", "gauge", "Audio bytes queued across all sessions.", overload["queued_bytes"]),
+        metric("transcriber_frames_dropped_total", "counter", "Inbound frames dropped under overload.", overload["frames_dropped"]),
+        metric(
+            "transcriber_sessions_resumed_total", "counter",
+            "Sequenced calls that reconnected and resumed.", sequence_stats["resumed_sessions"],
+        ),
+        metric(
+            "transcriber_frames_duplicate_total", "counter",
+            "Sequenced frames received twice and dropped.", sequence_stats["duplicate_frames"],
+        ),
+        metric(
+            "transcriber_frames_missing_total", "counter",
+            "Gaps in sequenced frames (audio the client never delivered).", sequence_stats["missing_frames"],
+        ),
+        metric(
+            "transcriber_client_silence_seconds_total", "counter",
+            "Silence clients sent as markers instead of audio.", silence_stats["samples"] / SAMPLE_RATE,
+        ),
+        metric("transcriber_sessions_rejected_total", "counter", "Calls refused by admission control.", overload["sessions_rejected"]),
+    ]
+    if checkpointer:
+        checkpoints = checkpointer.stats()
+        families += [
+            metric(
+                "transcriber_checkpoint_bytes_total", "counter",
+                "Audio tail bytes written to Redis checkpoints.", checkpoints["bytes_written"],
+            ),
+            metric(
+                "transcriber_checkpoint_restored_total", "counter",
+                "Sessions resumed from a checkpoint left by another session.", checkpoints["restored"],
+            ),
+            metric(
+                "transcriber_checkpoint_superseded_total", "counter",
+                "Sessions that handed their call to a session resumed elsewhere.", checkpoints["superseded"],
+            ),
+        ]
+    return PlainTextResponse(render(families), media_type="text/plain; version=0.0.4")
+
+
+def batch_path(path: str, root: str, field: str) -> str:
+    """Resolve a request path relative to `root`; 400 if it is absolute or escapes it."""
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.isabs(path) or os.path.commonpath([resolved, root]) != root:
+        raise HTTPException(status_code=400, detail=f"{field} must be a relative path under {root}")
+    return resolved
+
+
+class BatchRequest(BaseModel):
+    input: str  # directory or manifest under BATCH_ROOT
+    output: str  # "redis" or a JSONL path under BATCH_JOBS_DIR
+    progress: str | None = None  # under BATCH_JOBS_DIR
+    max_files: int = 8
+    max_pieces: int = 8
+
+
+@app.post("/batch")
+async def start_batch(request: BatchRequest):
+    """
+    Start an offline transcription job over recorded calls (see batch.py).
+    The job shares the worker pool with live calls but only submits pieces
+    while no live window is queued, at most `max_pieces` at a time, so live
+    calls keep their latency and quality tier. Re-posting the same
+    input/output resumes from its progress file; the job ID is derived from
+    them, and a job that is still running is not started twice.
+
+    Paths are relative: `input` to BATCH_ROOT, `output` and `progress` to
+    BATCH_JOBS_DIR. Anything that resolves outside them, including
+    manifest entries and symlinks, is rejected with 400.
+    """
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail="Transcriber is starting up")
+    source = batch_path(request.input, BATCH_ROOT, "input")
+    output = "redis" if request.output == "redis" else batch_path(request.output, BATCH_JOBS_DIR, "output")
+    job_id = job_key(source, output)
+    progress = None  # next to a file output
+    if request.progress is not None:
+        progress = batch_path(request.progress, BATCH_JOBS_DIR, "progress")
+    elif output == "redis":
+        progress = os.path.join(BATCH_JOBS_DIR, default_progress_path(job_id, output))
+    if job_id in batch_tasks:
+        raise HTTPException(status_code=409, detail=f"Batch job {job_id} is already running")
+    try:
+        entries = await asyncio.to_thread(read_inputs, source)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot read input: {e}")
+    for entry in entries:
+        resolved = os.path.realpath(entry["path"])
+        if os.path.commonpath([resolved, BATCH_ROOT]) != BATCH_ROOT:
+            raise HTTPException(status_code=400, detail=f"Recording {entry['path']} is outside {BATCH_ROOT}")
+    os.makedirs(BATCH_JOBS_DIR, exist_ok=True)
+
+    job = BatchJob(
+        job_id,
+        entries,
+        output,
+        progress_path=progress,
+        redis_client=redis_client,
+        max_files=request.max_files,
+        max_pieces=request.max_pieces,
+        yield_to_live=True,
+    )
+    batch_jobs[job_id] = job
+    task = asyncio.create_task(job.run(pool))
+    batch_tasks[job_id] = task
+    task.add_done_callback(lambda _: batch_tasks.pop(job_id, None))
+    return job.report()
+
+
+@app.get("/batch")
+def list_batches():
+    return [job.report() for job in batch_jobs.values()]
+
+
+@app.get("/batch/{job_id}")
+def batch_status(job_id: str):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No batch job {job_id}")
+    return job.report()
+
+
+@app.delete("/batch/{job_id}")
+def cancel_batch(job_id: str):
+    task = batch_tasks.get(job_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"No running batch job {job_id}")
+    task.cancel()
+    return {"job_id": job_id, "status": "cancelling"}
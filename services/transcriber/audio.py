@@ -0,0 +1,122 @@
+"""
+Audio decoding helpers for the transcriber service.
+"""
+
+import numpy as np
+
+# Full scale of int16 PCM; every float32 <-> int16 conversion uses it, so
+# audio round-trips through the spool and checkpoints unchanged
+PCM16_FULL_SCALE = 32768.0
+PCM16_SCALE = np.float32(1.0 / PCM16_FULL_SCALE)
+
+
+def pcm16_to_float32(payload) -> np.ndarray:
+    """
+    Decode little-endian int16 PCM into normalised float32 samples.
+
+    `np.frombuffer` views the payload in place, so the only allocation is
+    the float32 output written by the scaling multiply.
+    """
+    audio_int16 = np.frombuffer(payload, dtype="<i2")
+    return np.multiply(audio_int16, PCM16_SCALE, dtype=np.float32)
+
+
+def float32_to_pcm16(samples: np.ndarray) -> np.ndarray:
+    """Normalised float32 samples as little-endian int16, the inverse of pcm16_to_float32."""
+    return np.clip(samples * PCM16_FULL_SCALE, -32768, 32767).astype("<i2")
+
+
+class RingBuffer:
+    """
+    Fixed-capacity float32 sample buffer with zero-copy contiguous reads.
+
+    Storage is mirrored: every sample is written at index i and i + capacity,
+    so the newest `len(self)` samples are always one contiguous slice and
+    `view()` can hand them to the model without concatenating or copying.
+    When full, new samples overwrite the oldest ones (like deque(maxlen=...)).
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0  # next write position in [0, capacity)
+        self._size = 0
+        self.total_written = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes allocated for sample storage (fixed for the buffer's lifetime)."""
+        return self._data.nbytes
+
+    @staticmethod
+    def nbytes_for(capacity: int, dtype=np.float32) -> int:
+        """What `nbytes` will be for a buffer of `capacity` samples, before allocating it."""
+        return 2 * capacity * np.dtype(dtype).itemsize
+
+    def write(self, samples: np.ndarray, scale=None) -> int:
+        """
+        Append samples in place, optionally multiplying by `scale` on the way in.
+
+        Passing int16 PCM with `scale=PCM16_SCALE` converts straight into the
+        buffer, skipping the intermediate float32 array.
+        Returns the number of samples written.
+        """
+        n = len(samples)
+        if n == 0:
+            return 0
+        self.total_written += n
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        head = self._head
+        first = min(n, cap - head)
+        self._store(samples[:first], head, scale)
+        if n > first:
+            self._store(samples[first:], 0, scale)
+
+        self._head = (head + n) % cap
+        self._size = min(self._size + n, cap)
+        return n
+
+    def write_pcm16(self, payload) -> int:
+        """Decode little-endian int16 PCM bytes directly into the buffer."""
+        return self.write(np.frombuffer(payload, dtype="<i2"), scale=PCM16_SCALE)
+
+    def _store(self, chunk: np.ndarray, pos: int, scale):
+        cap = self.capacity
+        end = pos + len(chunk)
+        primary = self._data[pos:end]
+        if scale is None:
+            primary[...] = chunk
+        else:
+            np.multiply(chunk, scale, out=primary, casting="unsafe")
+        self._data[pos + cap:end + cap] = primary
+
+    def view(self, n: int = None) -> np.ndarray:
+        """
+        Contiguous view of the newest `n` samples (all buffered samples by default).
+
+        The view aliases the buffer's storage, so it is only valid until the
+        next write.
+        """
+        if n is None or n > self._size:
+            n = self._size
+        start = (self._head - n) % self.capacity
+        return self._data[start:start + n]
+
+    def consume(self, n: int = None):
+        """Drop the oldest `n` samples (all of them by default)."""
+        if n is None or n >= self._size:
+            self._size = 0
+        else:
+            self._size -= n
+
+    def clear(self):
+        self._size = 0
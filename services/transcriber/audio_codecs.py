@@ -0,0 +1,113 @@
+"""
+Compressed audio ingest for the transcriber WebSocket.
+
+A client offers codecs in its start message, most preferred first:
+
+    {"type": "start", ..., "codecs": ["opus", "pcm16"], "codec_config": "<base64>"}
+
+and `session_started` names the one the server picked (`"codec": ...`).
+Without an offer, or if nothing offered is supported, the session stays on
+raw int16 PCM.
+
+For opus and flac every binary frame holds one or more encoded packets,
+each prefixed with its length as a 2-byte big-endian integer. Frames are
+therefore self-delimiting, so the inbound queue can still coalesce them or
+drop whole frames under overload. `codec_config` carries the encoder's
+extradata (OpusHead, FLAC STREAMINFO) when the decoder needs it.
+
+Decoding uses PyAV, which faster-whisper already depends on.
+"""
+
+import struct
+
+import numpy as np
+
+try:
+    import av
+except ImportError:  # only pcm16 is offered then
+    av = None
+
+PCM16 = "pcm16"
+
+# Wire name -> FFmpeg decoder
+DECODERS = {
+    "opus": "libopus",
+    "flac": "flac",
+}
+
+_LENGTH = struct.Struct(">H")
+
+
+def supported_codecs() -> list:
+    if av is None:
+        return [PCM16]
+    return [name for name, decoder in DECODERS.items() if decoder in av.codecs_available] + [PCM16]
+
+
+def negotiate(offered) -> str:
+    """First offered codec this server can decode, else pcm16."""
+    supported = supported_codecs()
+    for name in offered or ():
+        if name in supported:
+            return name
+    return PCM16
+
+
+def split_packets(payload) -> list:
+    """Length-prefixed packets of one (possibly coalesced) frame."""
+    view = memoryview(payload)
+    packets = []
+    pos = 0
+    while pos + 2 <= len(view):
+        (size,) = _LENGTH.unpack_from(view, pos)
+        pos += 2
+        if pos + size > len(view):
+            raise ValueError(f"Truncated packet: {size} bytes announced, {len(view) - pos} left")
+        packets.append(view[pos:pos + size])
+        pos += size
+    if pos != len(view):
+        raise ValueError("Trailing byte after the last packet")
+    return packets
+
+
+class PacketDecoder:
+    """
+    Decodes one session's packets to mono float32 at `sample_rate`.
+
+    Keeps decoder and resampler state between calls, so a session's frames
+    must be decoded in order (the session's decode loop guarantees that).
+    Decoding releases the GIL, so it runs on a worker thread.
+    """
+
+    def __init__(self, codec: str, extradata: bytes = None, sample_rate: int = 16000):
+        if av is None:
+            raise RuntimeError("PyAV is not installed")
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self._ctx = av.CodecContext.create(DECODERS[codec], "r")
+        self._ctx.sample_rate = sample_rate
+        self._ctx.layout = "mono"
+        if extradata:
+            self._ctx.extradata = extradata
+        # libopus always decodes at 48 kHz; the resampler also converts
+        # to the float32 the ring buffer holds.
+        self._resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+        self.packets = 0
+        self.bad_packets = 0
+
+    def decode(self, payload) -> np.ndarray:
+        chunks = []
+        for packet in split_packets(payload):
+            self.packets += 1
+            try:
+                frames = self._ctx.decode(av.Packet(bytes(packet)))
+            except av.error.FFmpegError:
+                # A corrupt packet costs its 20-100 ms, not the session
+                self.bad_packets += 1
+                continue
+            for frame in frames:
+                for out in self._resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+        if not chunks:
+            return np.zeros(0, dtype=np.float32)
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
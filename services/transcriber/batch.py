@@ -0,0 +1,368 @@
+"""
+Offline batch transcription of recorded calls.
+
+A BatchJob takes a directory of audio files or a manifest, splits each file
+into <= 30 s pieces at quiet points, and submits the pieces to a WorkerPool,
+where they are batched with each other (and with live windows when the job
+runs inside the transcriber service, where live windows go first). Each
+finished call replaces the
+call's chunks in Redis (see chunk_transport.py) or is appended to a JSONL
+file, and is recorded in a progress file, so a restarted job skips the
+calls it already finished. The progress file is named after the job key,
+a hash of the input and output, so running the same input into the same
+output again resumes it and unrelated runs never share progress.
+
+CLI:
+    python batch.py --input /data/calls --output out.jsonl
+    python batch.py --input manifest.jsonl --output redis --workers 2
+
+A manifest is a JSONL file with one {"path": ..., "call_id": ...,
+"customer_id": ...} object per line (call_id defaults to the file name), or
+a plain text file with one path per line.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from faster_whisper import decode_audio
+
+from chunk_transport import append_chunks, reset_chunks
+from endpointing import frame_energy_db
+
+SAMPLE_RATE = 16000
+IDLE_POLL_SECONDS = 0.05
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".opus", ".m4a", ".webm")
+
+
+def split_on_silence(
+    audio: np.ndarray,
+    sample_rate: int = SAMPLE_RATE,
+    max_seconds: float = 30.0,
+    frame_ms: int = 30,
+    threshold_db: float = -45.0,
+    margin_db: float = 10.0,
+    preroll_ms: int = 300,
+) -> list:
+    """
+    Split a recording into (start, end) sample ranges of at most
+    `max_seconds`. Each piece starts shortly before speech and ends at the
+    quietest frame in the second half of its window, so words are rarely
+    cut. Stretches without speech are skipped.
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    levels = frame_energy_db(audio, frame)
+    if len(levels) == 0:
+        return []
+    # Relative to the recording's own noise floor, as the live endpointer does
+    threshold = max(threshold_db, float(np.percentile(levels, 10)) + margin_db)
+    speech = levels > threshold
+
+    max_frames = max(2, int(max_seconds * 1000 / frame_ms))
+    preroll = int(preroll_ms / frame_ms)
+    n = len(levels)
+    pieces = []
+    pos = 0
+    while pos < n:
+        remaining = speech[pos:]
+        if not remaining.any():
+            break
+        start = max(pos, pos + int(np.argmax(remaining)) - preroll)
+        end = min(start + max_frames, n)
+        if end < n:
+            half = start + max_frames // 2
+            end = half + int(np.argmin(levels[half:end])) + 1
+        pieces.append((start * frame, min(end * frame, len(audio))))
+        pos = end
+    return pieces
+
+
+def read_inputs(source: str) -> list:
+    """Directory or manifest -> list of {"path", "call_id", "customer_id"}."""
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+            if name.lower().endswith(AUDIO_EXTENSIONS)
+        )
+        entries = [{"path": p} for p in paths]
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        entries = []
+        with open(source) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                entry = json.loads(line) if line.startswith("{") else {"path": line}
+                if not os.path.isabs(entry["path"]):
+                    entry["path"] = os.path.join(base, entry["path"])
+                entries.append(entry)
+
+    for entry in entries:
+        entry.setdefault("call_id", os.path.splitext(os.path.basename(entry["path"]))[0])
+        entry["customer_id"] = str(entry.get("customer_id", entry["call_id"]))
+    return entries
+
+
+def job_key(source: str, output: str) -> str:
+    """Stable ID of an input/output pair, independent of the working directory."""
+    if output != "redis":
+        output = os.path.abspath(output)
+    digest = hashlib.sha1(f"{os.path.abspath(source)}\0{output}".encode())
+    return digest.hexdigest()[:12]
+
+
+def default_progress_path(key: str, output: str) -> str:
+    if output == "redis":
+        return f"batch-{key}.progress"
+    return f"{output}.{key}.progress"
+
+
+class BatchJob:
+    """
+    One backfill run over a list of recordings.
+
+    `output` is "redis" (replace the call's chunks) or a JSONL path.
+    Completed call IDs are appended to `progress_path` after their output
+    is written; it defaults to a file named after `job_id`, which should be
+    the job_key() of the input and output for reruns to resume.
+
+    At most `max_pieces` pieces are in the pool at once. With
+    `yield_to_live`, for a pool shared with live calls, a piece is only
+    submitted while no other work is queued, so a live window waits for at
+    most the job's pieces already in flight.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        entries: list,
+        output: str,
+        progress_path: str = None,
+        redis_client=None,
+        max_files: int = 8,
+        max_pieces: int = 8,
+        yield_to_live: bool = False,
+    ):
+        if output == "redis" and redis_client is None:
+            raise ValueError("Redis output needs a Redis client")
+        self.job_id = job_id
+        self.entries = entries
+        self.output = output
+        self.progress_path = progress_path or default_progress_path(job_id, output)
+        self.r = redis_client
+        self.max_files = max_files
+        self.max_pieces = max_pieces
+        self.yield_to_live = yield_to_live
+
+        self.status = "pending"
+        self.files_done = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.pieces_decoded = 0
+        self.audio_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._write_lock = asyncio.Lock()
+        self._pieces = asyncio.Semaphore(max_pieces)
+        self.pieces_in_flight = 0
+        self.idle_waits = 0
+
+    def completed(self) -> set:
+        if not os.path.exists(self.progress_path):
+            return set()
+        with open(self.progress_path) as f:
+            return {line.strip() for line in f if line.strip()}
+
+    async def run(self, pool):
+        self.status = "running"
+        self.started_at = time.perf_counter()
+        done = self.completed()
+        todo = [e for e in self.entries if e["call_id"] not in done]
+        self.files_skipped = len(self.entries) - len(todo)
+        print(f"[BatchJob {self.job_id}] {len(todo)} files to transcribe, {self.files_skipped} already done")
+
+        # Bounds how many decoded recordings are held in memory at once
+        slots = asyncio.Semaphore(self.max_files)
+
+        async def one(entry):
+            async with slots:
+                try:
+                    await self.transcribe_file(pool, entry)
+                except Exception as e:
+                    self.files_failed += 1
+                    print(f"[BatchJob {self.job_id}] {entry['path']} failed: {e}")
+
+        try:
+            await asyncio.gather(*(one(e) for e in todo))
+            self.status = "done"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        finally:
+            self.finished_at = time.perf_counter()
+            print(f"[BatchJob {self.job_id}] {self.status}: {self.report()}")
+
+    async def transcribe_file(self, pool, entry: dict):
+        call_id = entry["call_id"]
+        audio = await asyncio.to_thread(decode_audio, entry["path"], sampling_rate=SAMPLE_RATE)
+        pieces = split_on_silence(audio)
+
+        # Distinct pool keys spread one recording's pieces over all workers
+        keys = [f"batch:{call_id}:{i}" for i in range(len(pieces))]
+        try:
+            results = await asyncio.gather(*(
+                self.submit(pool, key, audio[start:end])
+                for key, (start, end) in zip(keys, pieces)
+            ))
+        finally:
+            for key in keys:
+                pool.release(key)
+
+        segments = []
+        for (start, _), (piece_segments, tier) in zip(pieces, results):
+            offset = start / SAMPLE_RATE
+            for seg_start, seg_end, text in piece_segments:
+                if text.strip():
+                    segments.append({
+                        "start": round(offset + seg_start, 2),
+                        "end": round(offset + seg_end, 2),
+                        "text": text.strip(),
+                        "tier": tier,
+                    })
+
+        duration = len(audio) / SAMPLE_RATE
+        await self.write(entry, duration, segments)
+
+        self.files_done += 1
+        self.pieces_decoded += len(pieces)
+        self.audio_seconds += duration
+        if self.files_done % 10 == 0:
+            print(f"[BatchJob {self.job_id}] {self.report()}")
+
+    async def submit(self, pool, key: str, audio: np.ndarray):
+        async with self._pieces:
+            if self.yield_to_live:
+                await self.wait_for_idle_pool(pool)
+            self.pieces_in_flight += 1
+            try:
+                return await pool.submit(key, audio, timestamps=True, vad=True)
+            finally:
+                self.pieces_in_flight -= 1
+
+    async def wait_for_idle_pool(self, pool):
+        """
+        Wait while windows other than this job's are queued. Queued pieces
+        of the job are among its pieces in flight, so a queue no deeper than
+        that holds nothing else.
+        """
+        waited = False
+        while pool.queue_depth() > self.pieces_in_flight:
+            waited = True
+            await asyncio.sleep(IDLE_POLL_SECONDS)
+        self.idle_waits += waited
+
+    async def write(self, entry: dict, duration: float, segments: list):
+        call_id = entry["call_id"]
+        if self.output == "redis":
+            pipe = self.r.pipeline(transaction=True)
+            pipe.set(f"call:{call_id}:customer_id", entry["customer_id"])
+            reset_chunks(pipe, call_id)
+            append_chunks(pipe, call_id, [s["text"] for s in segments], tiers=[s["tier"] for s in segments])
+            await pipe.execute()
+
+        async with self._write_lock:
+            if self.output != "redis":
+                record = {
+                    "call_id": call_id,
+                    "customer_id": entry["customer_id"],
+                    "path": entry["path"],
+                    "duration": round(duration, 2),
+                    "segments": segments,
+                }
+                with open(self.output, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+            with open(self.progress_path, "a") as f:
+                f.write(call_id + "\n")
+
+    def report(self) -> dict:
+        end = self.finished_at or time.perf_counter()
+        wall = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "files_total": len(self.entries),
+            "files_done": self.files_done,
+            "files_skipped": self.files_skipped,
+            "files_failed": self.files_failed,
+            "pieces_decoded": self.pieces_decoded,
+            "pieces_in_flight": self.pieces_in_flight,
+            "idle_waits": self.idle_waits,
+            "audio_hours": round(self.audio_seconds / 3600, 4),
+            "wall_seconds": round(wall, 1),
+            "audio_hours_per_wall_hour": round(self.audio_seconds / wall, 2) if wall > 0 else 0.0,
+        }
+
+
+async def main(args):
+    from faster_whisper import WhisperModel
+
+    from scheduler import WorkerPool
+
+    entries = read_inputs(args.input)
+    model = WhisperModel(
+        args.model_path or args.model,
+        device=args.device,
+        compute_type=args.compute_type,
+        cpu_threads=args.cpu_threads,
+        num_workers=args.workers,
+    )
+    pool = WorkerPool(model, num_workers=args.workers, max_batch_size=args.batch_size, max_wait_ms=args.max_wait_ms)
+
+    redis_client = None
+    if args.output == "redis":
+        import redis.asyncio as aioredis
+        redis_client = aioredis.Redis(host=args.redis_host, port=6379, decode_responses=True)
+
+    job = BatchJob(
+        job_key(args.input, args.output),
+        entries,
+        args.output,
+        progress_path=args.progress,
+        redis_client=redis_client,
+        max_files=args.max_files,
+        max_pieces=args.max_pieces,
+    )
+    pool.start()
+    try:
+        await job.run(pool)
+    finally:
+        pool.stop()
+        if redis_client is not None:
+            await redis_client.aclose()
+    print(json.dumps(job.report(), indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-transcribe recorded calls")
+    parser.add_argument("--input", required=True, help="Directory of audio files or manifest file")
+    parser.add_argument("--output", required=True, help="'redis' or a JSONL file path")
+    parser.add_argument("--progress", default=None, help="Progress file for resuming (default: named after the input and output)")
+    parser.add_argument("--model", default=os.getenv("WHISPER_MODEL", "medium.en"))
+    parser.add_argument("--model-path", default=os.getenv("WHISPER_MODEL_PATH"))
+    parser.add_argument("--device", default=os.getenv("WHISPER_DEVICE", "cuda"))
+    parser.add_argument("--compute-type", default=os.getenv("WHISPER_COMPUTE", "float16"))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WHISPER_WORKERS", "1")))
+    parser.add_argument("--cpu-threads", type=int, default=int(os.getenv("WHISPER_CPU_THREADS", "0")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("BATCH_MAX_SIZE", "8")))
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("BATCH_MAX_WAIT_MS", "50")))
+    parser.add_argument("--max-files", type=int, default=8, help="Recordings decoded concurrently")
+    parser.add_argument("--max-pieces", type=int, default=8, help="Pieces in the worker pool at once")
+    parser.add_argument("--redis-host", default=os.getenv("REDIS_HOST", "localhost"))
+    asyncio.run(main(parser.parse_args()))
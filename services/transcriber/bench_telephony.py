@@ -0,0 +1,71 @@
+"""
+Microbenchmark of telephony ingest: the CPU one call's audio conversion
+costs, from wire frames to samples in the session's ring buffer.
+
+    python bench_telephony.py                      # 8 kHz mu-law, 20 ms and 500 ms frames
+    python bench_telephony.py --encoding alaw --sample-rate 8000 --frame-ms 20
+
+Reports the conversion time per second of audio, i.e. the fraction of one
+core a single call keeps busy (the target is well under 1%).
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from audio import RingBuffer
+from telephony import ENCODINGS, PcmConverter
+
+OUT_RATE = 16000
+
+
+def wire_audio(encoding: str, sample_rate: int, seconds: float) -> bytes:
+    """Random speech-band noise in the wire format."""
+    rng = np.random.default_rng(0)
+    samples = int(seconds * sample_rate)
+    if encoding == "pcm16":
+        return (rng.standard_normal(samples) * 3000).clip(-32768, 32767).astype("<i2").tobytes()
+    return rng.integers(0, 256, samples, dtype=np.uint8).tobytes()
+
+
+def run(encoding: str, sample_rate: int, frame_ms: float, seconds: float, repeats: int) -> float:
+    """Best-of-`repeats` conversion time per second of audio."""
+    payload = wire_audio(encoding, sample_rate, seconds)
+    frame_bytes = int(sample_rate * frame_ms / 1000) * ENCODINGS[encoding]
+    frames = [payload[i:i + frame_bytes] for i in range(0, len(payload), frame_bytes)]
+    best = float("inf")
+    for _ in range(repeats):
+        converter = PcmConverter(encoding, sample_rate, out_rate=OUT_RATE)
+        buf = RingBuffer(OUT_RATE * 30)
+        start = time.perf_counter()
+        for frame in frames:
+            for samples in converter.convert(frame):
+                buf.write(samples)
+                if len(buf) > OUT_RATE * 20:
+                    buf.clear()
+        best = min(best, time.perf_counter() - start)
+    return best / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of telephony audio conversion per call")
+    parser.add_argument("--encoding", choices=list(ENCODINGS), default="mulaw")
+    parser.add_argument("--sample-rate", type=int, default=8000)
+    parser.add_argument("--frame-ms", type=float, action="append",
+                        help="Frame length to test, repeatable (default 20 and 500)")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Audio per run")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.encoding} at {args.sample_rate} Hz -> float32 at {OUT_RATE} Hz, {args.seconds:.0f}s of audio")
+    for frame_ms in args.frame_ms or [20, 500]:
+        per_second = run(args.encoding, args.sample_rate, frame_ms, args.seconds, args.repeats)
+        print(
+            f"  {frame_ms:g} ms frames: {per_second * 1e3:.3f} ms CPU per audio second"
+            f" = {per_second * 100:.3f}% of a core per call ({1 / per_second:.0f} calls per core)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Redis checkpoints of live sessions, so a dropped call can resume on any
+transcriber replica without sticky routing.
+
+With SESSION_CHECKPOINTS=true, every sequenced session (binary protocol,
+`"seq": true`) keeps three keys in Redis:
+
+- call:{id}:checkpoint   packed header: format version, channel count,
+                         the sequence number after the last frame decoded
+                         into the buffers, and per channel the call
+                         position of its unflushed tail and the tail length
+- call:{id}:tail:{n}     channel n's unflushed tail as int16 PCM. It grows
+                         by APPEND and is rewritten only when a window has
+                         been flushed, so a checkpoint costs about what
+                         arrived since the last one.
+- call:{id}:owner        token of the session that owns (or last owned)
+                         the call, kept for the TTL after it ends
+
+A session starting for the call claims the checkpoint and takes ownership
+in one transaction. Saves and the final release are fenced on the owner
+key (WATCH), so a session that lost the call to a reconnect elsewhere
+stops writing and never publishes the tail it handed over.
+"""
+
+import os
+import struct
+import time
+import uuid
+
+import numpy as np
+from redis.exceptions import RedisError, WatchError
+
+from audio import float32_to_pcm16
+
+SESSION_CHECKPOINTS = os.getenv("SESSION_CHECKPOINTS", "false").lower() == "true"
+CHECKPOINT_SECONDS = float(os.getenv("CHECKPOINT_SECONDS", "0.5"))
+# How long a dropped call's tail waits in Redis for a reconnect before the
+# session that held it decodes it itself
+CHECKPOINT_GRACE_SECONDS = float(os.getenv("CHECKPOINT_GRACE_SECONDS", "10"))
+
+VERSION = 1
+MAX_CHANNELS = 2
+HEADER = struct.Struct(">BBI")  # version, channels, next_seq
+CHANNEL = struct.Struct(">QI")  # tail start position, tail samples
+
+
+def header_key(call_id: str) -> str:
+    return f"call:{call_id}:checkpoint"
+
+
+def tail_key(call_id: str, channel: int) -> str:
+    return f"call:{call_id}:tail:{channel}"
+
+
+def owner_key(call_id: str) -> str:
+    return f"call:{call_id}:owner"
+
+
+def to_pcm16(samples: np.ndarray) -> bytes:
+    return float32_to_pcm16(samples).tobytes()
+
+
+class Checkpoint:
+    """A claimed checkpoint: where the call's frames resume and each channel's tail."""
+
+    __slots__ = ("next_seq", "tails")
+
+    def __init__(self, next_seq: int, tails: list):
+        self.next_seq = next_seq
+        self.tails = tails  # per channel: (start position, int16 samples)
+
+    @classmethod
+    def decode(cls, header: bytes, tails: list):
+        version, channels, next_seq = HEADER.unpack_from(header)
+        if version != VERSION:
+            raise ValueError(f"Unknown checkpoint version {version}")
+        decoded = []
+        for i in range(channels):
+            start, samples = CHANNEL.unpack_from(header, HEADER.size + i * CHANNEL.size)
+            pcm = np.frombuffer(tails[i] or b"", dtype="<i2")
+            decoded.append((start, pcm[:samples]))
+        return cls(next_seq, decoded)
+
+
+class CheckpointState:
+    """What one session has written so far, so the next save only appends."""
+
+    def __init__(self, channels: int):
+        self.token = uuid.uuid4().hex
+        self.saved = [None] * channels  # per channel: (tail start, written up to)
+        self.saved_at = 0.0
+        self.superseded = False
+
+
+class SessionCheckpointer:
+    """Saves, claims and releases session checkpoints. `client` must return bytes."""
+
+    def __init__(self, client, ttl_seconds: float = 300):
+        self.r = client
+        self.ttl = max(1, int(ttl_seconds))
+        self.saves = 0
+        self.bytes_written = 0
+        self.claims = 0
+        self.restored = 0
+        self.superseded = 0
+        self.errors = 0
+
+    @staticmethod
+    def _tail(channel) -> tuple:
+        buf = channel.buf
+        if buf is None:
+            return 0, 0
+        return buf.total_written - len(buf), buf.total_written
+
+    def due(self, session) -> bool:
+        """Time for a save: the interval has passed, or a window was flushed since the last one."""
+        state = session.checkpoint
+        if state.superseded:
+            return False
+        if time.monotonic() - state.saved_at >= CHECKPOINT_SECONDS:
+            return True
+        return any(
+            saved is None or saved[0] != self._tail(channel)[0]
+            for saved, channel in zip(state.saved, session.channels)
+        )
+
+    async def claim(self, session):
+        """
+        Take ownership of the session's call. Returns the checkpoint left by
+        a previous session, if any, which is removed from Redis.
+        """
+        session.checkpoint = CheckpointState(len(session.channels))
+        call_id = session.call_id
+        self.claims += 1
+        try:
+            async with self.r.pipeline(transaction=True) as pipe:
+                pipe.get(header_key(call_id))
+                for i in range(MAX_CHANNELS):
+                    pipe.get(tail_key(call_id, i))
+                pipe.delete(header_key(call_id), *(tail_key(call_id, i) for i in range(MAX_CHANNELS)))
+                pipe.set(owner_key(call_id), session.checkpoint.token, ex=self.ttl)
+                results = await pipe.execute()
+        except RedisError as e:
+            self.errors += 1
+            print(f"[SessionCheckpointer] Claim failed for call {call_id}: {e}")
+            return None
+
+        header, tails = results[0], results[1:1 + MAX_CHANNELS]
+        if header is None:
+            return None
+        try:
+            checkpoint = Checkpoint.decode(header, tails)
+        except (ValueError, struct.error) as e:
+            print(f"[SessionCheckpointer] Ignoring checkpoint of call {call_id}: {e}")
+            return None
+        if len(checkpoint.tails) != len(session.channels):
+            print(f"[SessionCheckpointer] Ignoring checkpoint of call {call_id}: channel count changed")
+            return None
+        self.restored += 1
+        return checkpoint
+
+    async def save(self, session) -> bool:
+        """Write the session's tail. Returns False once another session owns the call."""
+        state = session.checkpoint
+        if state.superseded:
+            return False
+        call_id = session.call_id
+
+        # Snapshot synchronously: the caller is the decode loop, between payloads
+        header = [HEADER.pack(VERSION, len(session.channels), session.processed_seq)]
+        writes = []
+        saved = []
+        for i, channel in enumerate(session.channels):
+            start, until = self._tail(channel)
+            previous = state.saved[i]
+            if previous is not None and previous[0] == start:
+                new = until - previous[1]
+                if new:
+                    writes.append(("append", i, to_pcm16(channel.buf.view(new))))
+            else:
+                writes.append(("set", i, to_pcm16(channel.buf.view()) if channel.buf is not None else b""))
+            header.append(CHANNEL.pack(start, until - start))
+            saved.append((start, until))
+
+        key = owner_key(call_id)
+        try:
+            async with self.r.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                owner = await pipe.get(key)
+                if owner is not None and owner.decode() != state.token:
+                    return self._superseded(session)
+                pipe.multi()
+                pipe.set(header_key(call_id), b"".join(header), ex=self.ttl)
+                for kind, i, data in writes:
+                    if kind == "set":
+                        pipe.set(tail_key(call_id, i), data, ex=self.ttl)
+                    else:
+                        pipe.append(tail_key(call_id, i), data)
+                        pipe.expire(tail_key(call_id, i), self.ttl)
+                pipe.set(key, state.token, ex=self.ttl)
+                await pipe.execute()
+        except WatchError:
+            return self._superseded(session)
+        except RedisError as e:
+            self.errors += 1
+            # Rewrite whole tails next time, the appends may not have landed
+            state.saved = [None] * len(session.channels)
+            state.saved_at = time.monotonic()
+            print(f"[SessionCheckpointer] Save failed for call {call_id}: {e}")
+            return True
+
+        state.saved = saved
+        state.saved_at = time.monotonic()
+        self.saves += 1
+        self.bytes_written += sum(len(data) for _, _, data in writes)
+        return True
+
+    async def release(self, session) -> bool:
+        """
+        Drop the call's checkpoint at the end of a session. Returns whether
+        this session still owned the call, i.e. should decode its own tail.
+        """
+        state = session.checkpoint
+        if state.superseded:
+            return False
+        call_id = session.call_id
+        key = owner_key(call_id)
+        try:
+            async with self.r.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                owner = await pipe.get(key)
+                if owner is not None and owner.decode() != state.token:
+                    return self._superseded(session)
+                pipe.multi()
+                pipe.delete(header_key(call_id), *(tail_key(call_id, i) for i in range(MAX_CHANNELS)))
+                # The owner key stays until it expires, so a session this one
+                # superseded still finds out after this one has finished
+                pipe.set(key, state.token, ex=self.ttl)
+                await pipe.execute()
+        except WatchError:
+            return self._superseded(session)
+        except RedisError as e:
+            # Decoding the tail twice beats losing it
+            self.errors += 1
+            print(f"[SessionCheckpointer] Release failed for call {call_id}: {e}")
+        return True
+
+    def _superseded(self, session) -> bool:
+        session.checkpoint.superseded = True
+        self.superseded += 1
+        print(f"[SessionCheckpointer] Call {session.call_id} resumed by another session, handing it over")
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "saves": self.saves,
+            "bytes_written": self.bytes_written,
+            "claims": self.claims,
+            "restored": self.restored,
+            "superseded": self.superseded,
+            "errors": self.errors,
+        }
@@ -0,0 +1,80 @@
+"""
+How transcript chunks reach the summarizer.
+
+CHUNK_TRANSPORT selects one of two Redis layouts, and must match the
+summarizer's setting:
+
+- lists (default): chunks are RPUSHed to `call:{id}:chunks`, and a call is
+  queued for summarization by adding it to `pending_calls` and RPUSHing it
+  to `summarize_queue`.
+- streams: chunks are XADDed to `call:{id}:stream` with a per-chunk `ts`,
+  the quality `tier` that produced them (see quality.py) and, on stereo
+  calls, their `speaker`. A call is queued by adding it to `pending_calls`
+  and XADDing it to `summarize_stream`, which summarizers read through a
+  consumer group.
+
+The helpers only queue commands on a pipeline (sync or asyncio), so every
+writer keeps its own round-trip pattern.
+"""
+
+import os
+import time
+
+CHUNK_TRANSPORT = os.getenv("CHUNK_TRANSPORT", "lists")
+if CHUNK_TRANSPORT not in ("lists", "streams"):
+    raise ValueError(f"Unknown CHUNK_TRANSPORT '{CHUNK_TRANSPORT}', expected 'lists' or 'streams'")
+
+PENDING_SET = "pending_calls"
+SUMMARIZE_QUEUE = "summarize_queue"
+SUMMARIZE_STREAM = "summarize_stream"
+# Approximate cap on the work stream; acknowledged entries are never re-read
+SUMMARIZE_STREAM_MAXLEN = 10000
+
+
+def chunks_key(call_id: str) -> str:
+    if CHUNK_TRANSPORT == "streams":
+        return f"call:{call_id}:stream"
+    return f"call:{call_id}:chunks"
+
+
+def append_chunks(pipe, call_id: str, texts: list, timestamps: list = None, tiers: list = None, speakers: list = None):
+    if not texts:
+        return
+    if CHUNK_TRANSPORT == "streams":
+        timestamps = timestamps or [time.time()] * len(texts)
+        tiers = tiers or [None] * len(texts)
+        speakers = speakers or [None] * len(texts)
+        for text, ts, tier, speaker in zip(texts, timestamps, tiers, speakers):
+            fields = {"text": text, "ts": f"{ts:.3f}"}
+            if tier:
+                fields["tier"] = tier
+            if speaker:
+                fields["speaker"] = speaker
+            pipe.xadd(chunks_key(call_id), fields)
+    else:
+        pipe.rpush(chunks_key(call_id), *texts)
+
+
+def reset_chunks(pipe, call_id: str):
+    """Drop a call's chunks and its summarizer cursor."""
+    pipe.delete(
+        chunks_key(call_id),
+        f"call:{call_id}:processed_index",
+        f"call:{call_id}:processed_id",
+    )
+
+
+def queue_for_summary(pipe, call_ids: list):
+    """Queue calls whose SADD to `pending_calls` returned 1."""
+    if not call_ids:
+        return
+    if CHUNK_TRANSPORT == "streams":
+        for call_id in call_ids:
+            pipe.xadd(
+                SUMMARIZE_STREAM,
+                {"call_id": call_id},
+                maxlen=SUMMARIZE_STREAM_MAXLEN,
+                approximate=True,
+            )
+    else:
+        pipe.rpush(SUMMARIZE_QUEUE, *call_ids)
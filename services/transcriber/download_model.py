@@ -1,42 +1,252 @@
+"""
+Download the Whisper model for the transcriber, or pick the best variant
+for this host.
+
+    python download_model.py                                  # small.en -> models/whisper-small
+    python download_model.py --autotune --reference refs/ --device cuda
+
+--autotune downloads every model in --models to models/whisper-<model>,
+benchmarks each one at every compute type in --compute-types that the
+device supports, and writes the fastest variant whose word error rate is
+at most --max-wer to --config (see model_config.py), which the transcriber
+reads at startup through WHISPER_CONFIG.
+
+The reference set is a directory of recordings or a manifest, as for
+batch.py. Each recording's transcript is the manifest entry's "text", or a
+.txt file next to it with the same name.
+"""
+
 import argparse
 import os
+import platform
+import re
 import shutil
+import time
 from faster_whisper import WhisperModel
 
 DEFAULT_MODEL = "small.en"
 DEFAULT_OUTPUT = "models/whisper-small"
+DEFAULT_MODELS = "small.en,medium.en"
+# Per device; CTranslate2 has no float16 kernels on CPU
+DEFAULT_COMPUTE_TYPES = {
+    "cuda": "int8,int8_float16,float16",
+    "cpu": "int8,int8_float32,float32",
+}
+DEFAULT_CONFIG = "models/whisper-autotune.json"
+DEFAULT_MAX_WER = 0.15
+SAMPLE_RATE = 16000
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--model", default=DEFAULT_MODEL)
-    parser.add_argument("--output", default=DEFAULT_OUTPUT)
-    args = parser.parse_args()
+def download(model_name: str, output: str):
+    print(f"Downloading Whisper model '{model_name}'...")
 
-    print(f"Downloading Whisper model '{args.model}'...")
-    
     model = WhisperModel(
-        args.model,
+        model_name,
         device="cpu",
         compute_type="int8",
         download_root="tmp_download"
     )
+    del model
 
     # Find the actual snapshot directory
-    base_path = os.path.join("tmp_download", "models--Systran--faster-whisper-" + args.model)
+    base_path = os.path.join("tmp_download", "models--Systran--faster-whisper-" + model_name)
     snapshots = os.path.join(base_path, "snapshots")
     snapshot_hash = os.listdir(snapshots)[0]
     snapshot_path = os.path.join(snapshots, snapshot_hash)
 
     # Copy to clean output folder
-    os.makedirs(args.output, exist_ok=True)
+    os.makedirs(output, exist_ok=True)
     for file in os.listdir(snapshot_path):
         shutil.copy(
             os.path.join(snapshot_path, file),
-            os.path.join(args.output, file)
+            os.path.join(output, file)
         )
 
-    print(f"Model prepared at '{args.output}'")
+    print(f"Model prepared at '{output}'")
     shutil.rmtree("tmp_download")
 
+
+def normalize(text: str) -> list:
+    """Lowercased words without punctuation, for WER."""
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower().replace("-", " ")).split()
+
+
+def edit_distance(reference: list, hypothesis: list) -> int:
+    """Word-level Levenshtein distance (substitutions + deletions + insertions)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1]
+
+
+def load_reference(source: str) -> list:
+    """Reference recordings decoded to 16 kHz and split as the batch path does, with their transcripts."""
+    # Imported here so a plain download needs only faster-whisper
+    from faster_whisper import decode_audio
+
+    from batch import read_inputs, split_on_silence
+
+    references = []
+    for entry in read_inputs(source):
+        text = entry.get("text")
+        if text is None:
+            sidecar = os.path.splitext(entry["path"])[0] + ".txt"
+            if not os.path.exists(sidecar):
+                print(f"Skipping {entry['path']}: no transcript")
+                continue
+            with open(sidecar) as f:
+                text = f.read()
+        audio = decode_audio(entry["path"], sampling_rate=SAMPLE_RATE)
+        pieces = [audio[start:end] for start, end in split_on_silence(audio)]
+        references.append({
+            "path": entry["path"],
+            "words": normalize(text),
+            "pieces": pieces,
+            "seconds": len(audio) / SAMPLE_RATE,
+        })
+    if not references:
+        raise SystemExit(f"No recordings with transcripts in {source}")
+    return references
+
+
+def benchmark(model_path: str, compute_type: str, device: str, references: list, batch_size: int, cpu_threads: int) -> dict:
+    """Real-time factor and WER of one variant, decoding as the live workers do."""
+    from scheduler import decode_batch
+
+    start = time.perf_counter()
+    model = WhisperModel(model_path, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+    load_seconds = time.perf_counter() - start
+
+    # Warmup, so allocator and kernel setup are not billed to the first file
+    first = next(r["pieces"][0] for r in references if r["pieces"])
+    decode_batch(model, [first])
+
+    pieces = [(i, piece) for i, r in enumerate(references) for piece in r["pieces"]]
+    texts = [[] for _ in references]
+    start = time.perf_counter()
+    for b in range(0, len(pieces), batch_size):
+        batch = pieces[b:b + batch_size]
+        for (i, _), segments in zip(batch, decode_batch(model, [piece for _, piece in batch])):
+            texts[i].extend(text for _, _, text in segments)
+    elapsed = time.perf_counter() - start
+    del model
+
+    errors = sum(edit_distance(r["words"], normalize(" ".join(t))) for r, t in zip(references, texts))
+    words = sum(len(r["words"]) for r in references)
+    audio_seconds = sum(r["seconds"] for r in references)
+    return {
+        "rtf": round(elapsed / audio_seconds, 4),
+        "wer": round(errors / max(words, 1), 4),
+        "load_seconds": round(load_seconds, 1),
+    }
+
+
+def autotune(args):
+    import ctranslate2
+
+    from model_config import write_recommendation
+
+    supported = ctranslate2.get_supported_compute_types(args.device)
+    requested = args.compute_types or DEFAULT_COMPUTE_TYPES.get(args.device, "int8")
+    compute_types = [c for c in requested.split(",") if c]
+    for compute_type in compute_types:
+        if compute_type not in supported:
+            print(f"Skipping {compute_type}: not supported on {args.device} (supported: {', '.join(sorted(supported))})")
+    compute_types = [c for c in compute_types if c in supported]
+    if not compute_types:
+        raise SystemExit(f"None of the requested compute types run on {args.device}")
+
+    references = load_reference(args.reference)
+    audio_seconds = sum(r["seconds"] for r in references)
+    print(f"Reference set: {len(references)} recordings, {audio_seconds:.0f}s of audio")
+
+    config_dir = os.path.dirname(os.path.abspath(args.config))
+    results = []
+    for model_name in [m for m in args.models.split(",") if m]:
+        output = os.path.join(args.output_root, f"whisper-{model_name}")
+        if not os.path.exists(os.path.join(output, "model.bin")):
+            download(model_name, output)
+        for compute_type in compute_types:
+            print(f"Benchmarking {model_name} ({compute_type}) on {args.device}...")
+            result = {
+                "model": model_name,
+                "compute_type": compute_type,
+                "model_path": os.path.relpath(os.path.abspath(output), config_dir),
+                **benchmark(output, compute_type, args.device, references, args.batch_size, args.cpu_threads),
+            }
+            result["meets_threshold"] = result["wer"] <= args.max_wer
+            print(f"  RTF {result['rtf']:.4f}, WER {result['wer']:.2%}, loaded in {result['load_seconds']}s")
+            results.append(result)
+
+    passing = [r for r in results if r["meets_threshold"]]
+    if passing:
+        best = min(passing, key=lambda r: r["rtf"])
+    else:
+        best = min(results, key=lambda r: r["wer"])
+        print(f"No variant reaches WER {args.max_wer:.2%}; recommending the most accurate one")
+
+    print(f"\n{'model':<16} {'compute':<14} {'RTF':>8} {'WER':>8}")
+    for r in sorted(results, key=lambda r: r["rtf"]):
+        marker = "  <- recommended" if r is best else ("" if r["meets_threshold"] else "  (over WER limit)")
+        print(f"{r['model']:<16} {r['compute_type']:<14} {r['rtf']:>8.4f} {r['wer']:>8.2%}{marker}")
+
+    os.makedirs(config_dir, exist_ok=True)
+    write_recommendation(args.config, {
+        "model": best["model"],
+        "compute_type": best["compute_type"],
+        "device": args.device,
+        "model_path": best["model_path"],
+        "rtf": best["rtf"],
+        "wer": best["wer"],
+        "max_wer": args.max_wer,
+        "measured_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "host": {
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "cpu_threads": args.cpu_threads,
+            "cuda_devices": ctranslate2.get_cuda_device_count(),
+        },
+        "reference": {
+            "source": args.reference,
+            "recordings": len(references),
+            "audio_seconds": round(audio_seconds, 1),
+            "words": sum(len(r["words"]) for r in references),
+        },
+        "batch_size": args.batch_size,
+        "variants": results,
+    })
+    print(f"\nRecommendation written to '{args.config}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the Whisper model, or benchmark variants and recommend one")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--autotune", action="store_true", help="Benchmark model x compute type variants on this host")
+    parser.add_argument("--reference", help="Directory or manifest of reference recordings with transcripts")
+    parser.add_argument("--models", default=DEFAULT_MODELS, help="Comma-separated model sizes to try")
+    parser.add_argument("--compute-types", help="Comma-separated compute types to try (default depends on --device)")
+    parser.add_argument("--device", default="cuda", help="Device the transcriber will run on: cuda or cpu")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="As WHISPER_CPU_THREADS; 0 = CTranslate2 default")
+    parser.add_argument("--batch-size", type=int, default=8, help="Windows per decode, as BATCH_MAX_SIZE")
+    parser.add_argument("--max-wer", type=float, default=DEFAULT_MAX_WER, help="Accuracy threshold, e.g. 0.15")
+    parser.add_argument("--output-root", default="models", help="Where variants are downloaded")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="Where the recommendation is written")
+    args = parser.parse_args()
+
+    if not args.autotune:
+        download(args.model, args.output)
+        return
+    if not args.reference:
+        parser.error("--autotune needs --reference")
+    autotune(args)
+
 if __name__ == "__main__":
     main()
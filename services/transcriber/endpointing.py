@@ -0,0 +1,109 @@
+"""
+Energy-based endpointing for the transcriber service.
+
+Instead of flushing every BUFFER_SECONDS, each session's audio is scanned in
+short frames. A segment is closed when speech is followed by a pause (or it
+reaches a maximum length), and audio that contains no speech at all is
+dropped without ever reaching the model.
+"""
+
+import numpy as np
+
+
+def frame_energy_db(samples: np.ndarray, frame_samples: int) -> np.ndarray:
+    """RMS level in dBFS of consecutive `frame_samples`-long frames (last frame may be short)."""
+    if len(samples) == 0:
+        return np.empty(0, dtype=np.float32)
+    starts = np.arange(0, len(samples), frame_samples)
+    sums = np.add.reduceat(np.square(samples, dtype=np.float32), starts)
+    lengths = np.diff(np.append(starts, len(samples)))
+    mean_square = sums / lengths
+    return 10.0 * np.log10(np.maximum(mean_square, 1e-10))
+
+
+class Endpointer:
+    """
+    Frame-level speech/pause tracker for one session's buffered audio.
+
+    A frame counts as speech when its level is above both `threshold_db` and
+    the running noise floor plus `margin_db`. `feed()` returns:
+    - "flush": speech followed by `min_silence_ms` of pause, or the segment
+      reached `max_segment_samples`; decode the buffer and start over,
+    - "drop": the buffer holds no speech; trim it down to the pre-roll,
+    - None: keep accumulating.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        threshold_db: float = -45.0,
+        margin_db: float = 10.0,
+        min_silence_ms: int = 500,
+        max_segment_seconds: float = 10.0,
+        preroll_ms: int = 300,
+    ):
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.min_silence_samples = int(sample_rate * min_silence_ms / 1000)
+        self.max_segment_samples = int(sample_rate * max_segment_seconds)
+        self.preroll_samples = int(sample_rate * preroll_ms / 1000)
+        self.noise_floor_db = threshold_db - margin_db
+
+        self.has_speech = False
+        self.trailing_silence = 0
+        self.segment_samples = 0
+
+    def is_speech(self, levels_db: np.ndarray) -> np.ndarray:
+        return levels_db > max(self.threshold_db, self.noise_floor_db + self.margin_db)
+
+    def feed(self, samples: np.ndarray):
+        levels = frame_energy_db(samples, self.frame_samples)
+        speech = self.is_speech(levels)
+
+        quiet = levels[~speech]
+        if len(quiet):
+            # Slow EMA so a long pause does not drag the floor down to digital silence
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * float(quiet.mean())
+
+        self.segment_samples += len(samples)
+        if speech.any():
+            self.has_speech = True
+            last_speech = len(speech) - 1 - int(np.argmax(speech[::-1]))
+            self.trailing_silence = len(samples) - min(
+                (last_speech + 1) * self.frame_samples, len(samples)
+            )
+        else:
+            self.trailing_silence += len(samples)
+
+        if not self.has_speech:
+            return "drop"
+        if self.trailing_silence >= self.min_silence_samples:
+            return "flush"
+        if self.segment_samples >= self.max_segment_samples:
+            return "flush"
+        return None
+
+    def skip(self, samples: int):
+        """
+        Account for `samples` of silence that never reached the buffer (a
+        client silence marker). Same return values as feed(); the noise
+        floor is left alone.
+        """
+        self.trailing_silence += samples
+        if not self.has_speech:
+            return "drop"
+        if self.trailing_silence >= self.min_silence_samples:
+            return "flush"
+        return None
+
+    def dropped(self, remaining: int):
+        """The caller trimmed leading silence, leaving `remaining` samples."""
+        self.segment_samples = remaining
+        self.trailing_silence = min(self.trailing_silence, remaining)
+
+    def reset(self):
+        self.has_speech = False
+        self.trailing_silence = 0
+        self.segment_samples = 0
@@ -0,0 +1,130 @@
+"""
+Prometheus instrumentation for the transcriber service.
+
+Latency histograms are observed where the work happens (model batches in
+the scheduler threads, pipelines in the Redis writer, frame parsing in the
+receive loop); counters and gauges that other components already keep are
+read from their stats at scrape time. `render()` produces the text
+exposition format served on GET /metrics.
+"""
+
+import bisect
+import os
+import resource
+import threading
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, safe to observe from any thread."""
+
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def render(self) -> list:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total:.6f}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+DECODE_SECONDS = Histogram(
+    "transcriber_decode_seconds",
+    "Model time per batched encode + generate call.",
+)
+DECODE_WAIT_SECONDS = Histogram(
+    "transcriber_decode_wait_seconds",
+    "Time from submitting a window to receiving its segments (queueing + batching + model).",
+)
+HEX_DECODE_SECONDS = Histogram(
+    "transcriber_hex_decode_seconds",
+    "Time to decode the audio_hex payload of a legacy JSON frame.",
+)
+CODEC_DECODE_SECONDS = Histogram(
+    "transcriber_codec_decode_seconds",
+    "Time to decode one compressed (Opus/FLAC) payload, including waiting for a codec thread.",
+)
+PCM_CONVERT_SECONDS = Histogram(
+    "transcriber_pcm_convert_seconds",
+    "Time to decode and resample one G.711 or non-16 kHz payload.",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+REDIS_WRITE_SECONDS = Histogram(
+    "transcriber_redis_write_seconds",
+    "Time per pipelined chunk write to Redis, including queueing calls for summarization.",
+)
+
+HISTOGRAMS = (
+    DECODE_SECONDS,
+    DECODE_WAIT_SECONDS,
+    HEX_DECODE_SECONDS,
+    CODEC_DECODE_SECONDS,
+    PCM_CONVERT_SECONDS,
+    REDIS_WRITE_SECONDS,
+)
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metric(name: str, kind: str, help: str, samples) -> list:
+    """
+    Text exposition of a counter or gauge. `samples` is a number or a list
+    of (labels dict, value) pairs.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    if not isinstance(samples, list):
+        samples = [({}, samples)]
+    for labels, value in samples:
+        if labels:
+            label_str = ",".join(f'{k}="{_label_value(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_str}}} {value:g}")
+        else:
+            lines.append(f"{name} {value:g}")
+    return lines
+
+
+def process_metrics() -> list:
+    """CPU time and resident memory of this process, under the usual Prometheus names."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        rss = usage.ru_maxrss * 1024  # peak, in KiB on Linux
+    return [
+        metric("process_cpu_seconds_total", "counter", "User and system CPU time.", usage.ru_utime + usage.ru_stime),
+        metric("process_resident_memory_bytes", "gauge", "Resident set size.", rss),
+    ]
+
+
+def render(families: list) -> str:
+    """Join metric families (lists of lines) and all histograms into one exposition."""
+    lines = []
+    for family in families + process_metrics():
+        lines.extend(family)
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,56 @@
+"""
+The Whisper variant recommended for this host, as measured by
+`download_model.py --autotune`.
+
+The recommendation is a JSON file naming the model, its compute type, the
+device it was benchmarked on and the directory holding the weights
+(relative to the file). The transcriber reads it at startup from
+WHISPER_CONFIG; it takes precedence over WHISPER_MODEL, WHISPER_COMPUTE and
+WHISPER_MODEL_PATH, which remain the fallback when no recommendation exists
+or it was measured on another device.
+"""
+
+import json
+import os
+
+FORMAT_VERSION = 1
+
+
+def read_recommendation(path: str, device: str) -> dict:
+    """{"model", "compute_type", "model_path"} for `device`, or {} if there is none."""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[ModelConfig] Ignoring {path}: {e}")
+        return {}
+    if config.get("version") != FORMAT_VERSION:
+        print(f"[ModelConfig] Ignoring {path}: unknown version {config.get('version')}")
+        return {}
+    if config.get("device") != device:
+        print(f"[ModelConfig] Ignoring {path}: measured on {config.get('device')}, running on {device}")
+        return {}
+
+    model_path = config.get("model_path")
+    if model_path and not os.path.isabs(model_path):
+        model_path = os.path.join(os.path.dirname(os.path.abspath(path)), model_path)
+    print(
+        f"[ModelConfig] Using {config['model']} ({config['compute_type']}) from {path}: "
+        f"RTF {config.get('rtf')}, WER {config.get('wer')}"
+    )
+    return {
+        "model": config["model"],
+        "compute_type": config["compute_type"],
+        "model_path": model_path,
+    }
+
+
+def write_recommendation(path: str, config: dict):
+    """Write atomically, so a transcriber starting meanwhile never reads half a file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": FORMAT_VERSION, **config}, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
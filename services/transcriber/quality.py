@@ -0,0 +1,140 @@
+"""
+Load-adaptive decoding quality for the inference workers.
+
+A worker decodes each batch at one of a few quality tiers, best first:
+
+- accurate: the live model with beam search (QUALITY_HIGH_BEAM)
+- standard: the live model, greedy (beam 1)
+- fast:     a smaller model loaded at startup (QUALITY_FALLBACK_MODEL),
+            greedy; only offered when one is configured
+
+Every worker keeps its own QualityPolicy. It steps down a tier as soon as
+its queue backs up or it has been busy for most of the last
+QUALITY_WINDOW_SECONDS, and steps back up when its queue is empty and the
+predicted utilisation at the better tier (scaled by that tier's measured
+real-time factor) stays under QUALITY_UP_UTILISATION.
+"""
+
+import os
+import time
+from collections import deque
+
+QUALITY_WINDOW_SECONDS = float(os.getenv("QUALITY_WINDOW_SECONDS", "10"))
+QUALITY_UP_UTILISATION = float(os.getenv("QUALITY_UP_UTILISATION", "0.5"))
+QUALITY_DOWN_UTILISATION = float(os.getenv("QUALITY_DOWN_UTILISATION", "0.85"))
+QUALITY_DOWN_QUEUE = int(os.getenv("QUALITY_DOWN_QUEUE", "16"))
+# Minimum time at a tier before stepping up, so its cost is measured first
+QUALITY_HOLD_SECONDS = float(os.getenv("QUALITY_HOLD_SECONDS", "5"))
+# Stepping down reacts faster; overload only gets worse while waiting
+QUALITY_DOWN_HOLD_SECONDS = 1.0
+
+RTF_SMOOTHING = 0.2
+
+
+class Tier:
+    """
+    A model and beam size to decode with. `cost` is the expected real-time
+    factor relative to the standard tier, used until the tier has been
+    measured.
+    """
+
+    __slots__ = ("name", "model", "beam_size", "cost")
+
+    def __init__(self, name: str, model, beam_size: int = 1, cost: float = 1.0):
+        self.name = name
+        self.model = model
+        self.beam_size = beam_size
+        self.cost = cost
+
+
+class QualityPolicy:
+    """Picks the tier for one worker's next batch. Used only from that worker's thread."""
+
+    def __init__(self, tiers: list, initial: str = "standard"):
+        if not tiers:
+            raise ValueError("At least one tier is required")
+        self.tiers = tiers
+        names = [t.name for t in tiers]
+        self.index = names.index(initial) if initial in names else 0
+        self.changed_at = time.perf_counter()
+        self.changes = 0
+        self._batches = deque()  # (finished_at, busy_seconds)
+        self._rtf = {}  # tier name -> smoothed real-time factor
+
+    @property
+    def tier(self) -> Tier:
+        return self.tiers[self.index]
+
+    def record(self, tier: Tier, busy_seconds: float, audio_seconds: float):
+        """Account for one finished batch."""
+        now = time.perf_counter()
+        self._batches.append((now, busy_seconds))
+        self._expire(now)
+        if audio_seconds > 0:
+            rtf = busy_seconds / audio_seconds
+            previous = self._rtf.get(tier.name)
+            self._rtf[tier.name] = rtf if previous is None else previous + RTF_SMOOTHING * (rtf - previous)
+
+    def _expire(self, now: float):
+        while self._batches and now - self._batches[0][0] > QUALITY_WINDOW_SECONDS:
+            self._batches.popleft()
+
+    def utilisation(self) -> float:
+        """
+        Fraction of the last QUALITY_WINDOW_SECONDS (or of the time since
+        the last tier change, if shorter) spent decoding.
+        """
+        now = time.perf_counter()
+        window = max(1.0, min(QUALITY_WINDOW_SECONDS, now - self.changed_at))
+        # Copied first: stats() reads this from the event loop thread
+        busy = sum(b for at, b in list(self._batches) if now - at <= window)
+        return busy / window
+
+    def rtf(self, tier: Tier) -> float:
+        """Measured real-time factor of a tier, or an estimate from its relative cost."""
+        if tier.name in self._rtf:
+            return self._rtf[tier.name]
+        current = self.tier
+        measured = self._rtf.get(current.name)
+        if measured is None:
+            return tier.cost
+        return measured * tier.cost / current.cost
+
+    def choose(self, queue_depth: int) -> Tier:
+        now = time.perf_counter()
+        held = now - self.changed_at
+        utilisation = self.utilisation()
+
+        if self.index < len(self.tiers) - 1 and held >= QUALITY_DOWN_HOLD_SECONDS and (
+            queue_depth >= QUALITY_DOWN_QUEUE or utilisation > QUALITY_DOWN_UTILISATION
+        ):
+            self._move(self.index + 1, f"queue {queue_depth}, utilisation {utilisation:.2f}")
+        elif self.index > 0 and held >= QUALITY_HOLD_SECONDS and queue_depth == 0:
+            better = self.tiers[self.index - 1]
+            predicted = utilisation * self.rtf(better) / max(self.rtf(self.tier), 1e-6)
+            if predicted < QUALITY_UP_UTILISATION:
+                self._move(self.index - 1, f"predicted utilisation {predicted:.2f}")
+        return self.tier
+
+    def _move(self, index: int, reason: str):
+        old = self.tier.name
+        self.index = index
+        self.changed_at = time.perf_counter()
+        self.changes += 1
+        # The new tier's load is measured from scratch
+        self._batches.clear()
+        print(f"[QualityPolicy] {old} -> {self.tier.name} ({reason})")
+
+    def reset(self):
+        """Forget warmup decodes, whose cost says little about real traffic."""
+        self._batches.clear()
+        self._rtf.clear()
+        self.changed_at = time.perf_counter()
+
+    def stats(self) -> dict:
+        return {
+            "tier": self.tier.name,
+            "tier_changes": self.changes,
+            "recent_utilisation": round(self.utilisation(), 4),
+            "tier_rtf": {name: round(rtf, 4) for name, rtf in list(self._rtf.items())},
+        }
@@ -0,0 +1,140 @@
+"""
+Non-blocking transcript writes for the transcriber service.
+
+Sessions hand finished chunks to a RedisChunkWriter and move on. A single
+background task drains the queue and writes everything that accumulated as
+one pipeline, so a slow Redis delays chunk delivery but never the event loop
+or other calls' audio.
+"""
+
+import asyncio
+import time
+
+import redis
+import redis.asyncio as aioredis
+
+from chunk_transport import PENDING_SET, append_chunks, queue_for_summary
+from metrics import REDIS_WRITE_SECONDS
+
+
+class RedisChunkWriter:
+    """
+    Batches chunk appends from all sessions into pipelined writes, using
+    the layout selected by CHUNK_TRANSPORT (see chunk_transport.py).
+
+    Chunks for a call are written in the order they were pushed. Batches
+    that fail on a connection error or timeout are retried with backoff up
+    to `max_retries` times; other Redis errors drop the batch at once.
+    """
+
+    def __init__(self, client: aioredis.Redis, max_batch: int = 256, max_queue: int = 10000, max_retries: int = 5):
+        self.r = client
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+
+        self.chunks_pushed = 0
+        self.chunks_written = 0
+        self.batches_written = 0
+        self.chunks_dropped = 0
+        self.last_write_seconds = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def push(self, call_id: str, customer_id: str, text: str, tier: str = None, speaker: str = None):
+        """Queue a chunk without waiting for Redis."""
+        if not text or not text.strip():
+            return
+        try:
+            self._queue.put_nowait((call_id, customer_id, text.strip(), time.time(), tier, speaker))
+            self.chunks_pushed += 1
+        except asyncio.QueueFull:
+            self.chunks_dropped += 1
+            print(f"[RedisChunkWriter] Queue full, dropped chunk for call {call_id}")
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._write_with_retry(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _write_with_retry(self, batch: list):
+        delay = 0.1
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._write(batch)
+                return
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    self.chunks_dropped += len(batch)
+                    print(f"[RedisChunkWriter] Giving up on {len(batch)} chunks: {e}")
+                    return
+                print(f"[RedisChunkWriter] Redis error, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+            except redis.RedisError as e:
+                # A command error (wrong key type, OOM, ...) fails the same way
+                # again; drop the batch rather than stop the writer
+                self.chunks_dropped += len(batch)
+                print(f"[RedisChunkWriter] Dropping {len(batch)} chunks: {e}")
+                return
+
+    async def _write(self, batch: list):
+        start = time.perf_counter()
+
+        pipe = self.r.pipeline(transaction=False)
+        for call_id, customer_id, text, ts, tier, speaker in batch:
+            pipe.set(f"call:{call_id}:customer_id", customer_id)
+            append_chunks(pipe, call_id, [text], [ts], [tier], [speaker])
+            # Try adding to pending set
+            pipe.sadd(PENDING_SET, call_id)
+        results = await pipe.execute()
+
+        # sadd returns 1 if the call was not pending yet; enqueue those once
+        newly_pending = []
+        for i, (call_id, *_) in enumerate(batch):
+            if results[3 * i + 2] and call_id not in newly_pending:
+                newly_pending.append(call_id)
+        if newly_pending:
+            pipe = self.r.pipeline(transaction=False)
+            queue_for_summary(pipe, newly_pending)
+            await pipe.execute()
+
+        self.last_write_seconds = time.perf_counter() - start
+        REDIS_WRITE_SECONDS.observe(self.last_write_seconds)
+        self.chunks_written += len(batch)
+        self.batches_written += 1
+
+    async def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything pushed so far has been written."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self, timeout: float = 5.0):
+        """Flush queued chunks, then stop the background task."""
+        if not await self.flush(timeout):
+            print(f"[RedisChunkWriter] {self.pending()} chunks still queued at shutdown")
+        if self._task:
+            self._task.cancel()
+        await self.r.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending(),
+            "chunks_pushed": self.chunks_pushed,
+            "chunks_written": self.chunks_written,
+            "batches_written": self.batches_written,
+            "chunks_dropped": self.chunks_dropped,
+            "last_write_ms": round(self.last_write_seconds * 1000, 3),
+        }
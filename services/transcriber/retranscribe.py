@@ -0,0 +1,153 @@
+"""
+End-of-call re-transcription for the transcriber service.
+
+Live windows are decoded greedily for latency. When SPOOL_AUDIO is enabled,
+each call's audio is also spooled to disk (see spool.py) and, once the call
+has ended, decoded again in one pass with a larger beam and optionally a
+larger model. The result replaces the call's live chunks so the final summary
+and the CRM record are built from the more accurate transcript.
+"""
+
+import queue
+import threading
+import time
+
+import redis
+
+from chunk_transport import PENDING_SET, append_chunks, queue_for_summary, reset_chunks
+from spool import AudioSpool
+
+# Summarizer lock TTL, see services/summarizer/app.py
+LOCK_TTL = 30
+
+
+class Retranscriber(threading.Thread):
+    """
+    Low-priority worker that re-decodes spooled calls one at a time.
+
+    Between segments it waits while the live worker pool has requests
+    queued, so re-transcription only uses capacity live calls leave idle.
+    """
+
+    def __init__(self, model, r_client: redis.Redis, pool, beam_size: int = 5, keep_spool: bool = False):
+        super().__init__()
+        self.model = model
+        self.r = r_client
+        self.pool = pool
+        self.beam_size = beam_size
+        self.keep_spool = keep_spool
+        self.jobs = queue.Queue()
+        self.running = True
+        self.daemon = True
+
+        self.calls_done = 0
+        self.calls_failed = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    def enqueue(self, call_id: str, customer_id: str, spool: AudioSpool):
+        self.jobs.put((call_id, customer_id, spool))
+
+    def run(self):
+        print("[Retranscriber] Started")
+        while self.running:
+            try:
+                job = self.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+            call_id, customer_id, spool = job
+            try:
+                self.process(call_id, customer_id, spool)
+                self.calls_done += 1
+            except Exception as e:
+                self.calls_failed += 1
+                print(f"[Retranscriber] Call {call_id} failed, keeping live transcript: {e}")
+                try:
+                    self.r.set(f"call:{call_id}:retranscribe", "failed")
+                except redis.RedisError:
+                    pass
+            finally:
+                if not self.keep_spool:
+                    spool.delete()
+
+    def wait_for_idle_pool(self):
+        while self.running and self.pool.queue_depth() > 0:
+            time.sleep(0.1)
+
+    def transcribe(self, spool: AudioSpool) -> list:
+        audio = spool.read_float32()
+        if len(audio) == 0:
+            return []
+        self.wait_for_idle_pool()
+        segments, _ = self.model.transcribe(
+            audio,
+            language="en",
+            beam_size=self.beam_size,
+            vad_filter=True,
+        )
+        chunks = []
+        # Segments are decoded lazily, so yielding here pauses the decode
+        while True:
+            self.wait_for_idle_pool()
+            segment = next(segments, None)
+            if segment is None:
+                break
+            if segment.text.strip():
+                chunks.append(segment.text.strip())
+        return chunks
+
+    def process(self, call_id: str, customer_id: str, spool: AudioSpool):
+        start = time.perf_counter()
+        chunks = self.transcribe(spool)
+        elapsed = time.perf_counter() - start
+        self.busy_seconds += elapsed
+        self.audio_seconds += spool.seconds
+        print(
+            f"[Retranscriber] Call {call_id}: {spool.seconds:.1f}s of audio "
+            f"re-transcribed in {elapsed:.1f}s ({len(chunks)} chunks)"
+        )
+
+        if not chunks:
+            self.r.set(f"call:{call_id}:retranscribe", "done")
+            return
+        self.replace_chunks(call_id, customer_id, chunks)
+
+    def replace_chunks(self, call_id: str, customer_id: str, chunks: list):
+        """
+        Swap in the new transcript under the summarizer's call lock and
+        reset the call's summary so it is rebuilt from the new chunks.
+        """
+        lock_key = f"lock:call:{call_id}"
+        deadline = time.time() + 2 * LOCK_TTL
+        while not self.r.set(lock_key, "retranscriber", nx=True, ex=LOCK_TTL):
+            if time.time() > deadline:
+                raise TimeoutError("summarizer lock is held")
+            time.sleep(0.5)
+
+        try:
+            pipe = self.r.pipeline(transaction=True)
+            pipe.set(f"call:{call_id}:customer_id", customer_id)
+            reset_chunks(pipe, call_id)
+            append_chunks(pipe, call_id, chunks, tiers=["retranscribe"] * len(chunks))
+            pipe.delete(f"call:{call_id}:summary", f"call:{call_id}:history")
+            pipe.set(f"call:{call_id}:retranscribe", "done")
+            pipe.sadd(PENDING_SET, call_id)
+            results = pipe.execute()
+            if results[-1]:
+                pipe = self.r.pipeline(transaction=False)
+                queue_for_summary(pipe, [call_id])
+                pipe.execute()
+        finally:
+            self.r.delete(lock_key)
+
+    def stop(self):
+        self.running = False
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.jobs.qsize(),
+            "calls_done": self.calls_done,
+            "calls_failed": self.calls_failed,
+            "audio_seconds": round(self.audio_seconds, 1),
+            "rtf": round(self.busy_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+        }
@@ -0,0 +1,405 @@
+"""
+Cross-call batched Whisper inference for the transcriber service.
+
+Every WebSocket session submits its ready audio window to a WorkerPool. Each
+call sticks to one InferenceScheduler worker; a worker gathers windows from
+its calls, runs them through the model as one batched encode + generate, and
+resolves each caller's future with its own segments and the quality tier
+(see quality.py) they were decoded at.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+
+import numpy as np
+from faster_whisper.audio import pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.transcribe import get_suppressed_tokens
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from metrics import DECODE_SECONDS
+from quality import QualityPolicy, Tier
+
+# Same rule faster-whisper applies per segment: treat the window as silence
+# when the model is confident there is no speech and the decode is unlikely.
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
+TIME_PRECISION = 0.02  # seconds per Whisper timestamp token
+MAX_INITIAL_TIMESTAMP = 1.0
+SAMPLE_RATE = 16000
+
+
+def has_speech(window: np.ndarray) -> bool:
+    """Silero VAD over the window, as transcribe(vad_filter=True) runs it."""
+    return bool(get_speech_timestamps(window, VadOptions()))
+
+
+def decode_batch(
+    model,
+    windows: list,
+    beam_size: int = 1,
+    language: str = "en",
+    timestamps: list = None,
+    vad: list = None,
+) -> list:
+    """
+    Transcribe several independent audio windows with one encoder pass and
+    one generate call. Windows longer than 30 s are truncated.
+
+    Returns, per window, a list of (start, end, text) segments. Windows whose
+    `timestamps` flag is set are decoded with Whisper timestamp tokens and
+    may yield several segments; the others yield at most one segment that
+    spans the whole window. Windows whose `vad` flag is set are checked for
+    speech first and yield nothing without being decoded if there is none;
+    use it for audio the endpointer has not already filtered.
+    """
+    if not windows:
+        return []
+    if timestamps is None:
+        timestamps = [False] * len(windows)
+    if vad is None:
+        vad = [False] * len(windows)
+
+    outputs = [[] for _ in windows]
+    keep = [i for i, (window, check) in enumerate(zip(windows, vad)) if not check or has_speech(window)]
+    if keep:
+        decoded = _decode(model, [windows[i] for i in keep], beam_size, language, [timestamps[i] for i in keep])
+        for i, segments in zip(keep, decoded):
+            outputs[i] = segments
+    return outputs
+
+
+def _decode(model, windows: list, beam_size: int, language: str, timestamps: list) -> list:
+    """The batched encode + generate behind decode_batch."""
+    tokenizer = Tokenizer(
+        model.hf_tokenizer,
+        model.model.is_multilingual,
+        task="transcribe",
+        language=language,
+    )
+    features = np.stack([
+        pad_or_trim(model.feature_extractor(window)[..., :-1])
+        for window in windows
+    ])
+    prompts = [
+        model.get_prompt(tokenizer, previous_tokens=[], without_timestamps=not ts)
+        for ts in timestamps
+    ]
+
+    encoder_output = model.encode(features)
+    results = model.model.generate(
+        encoder_output,
+        prompts,
+        beam_size=beam_size,
+        max_length=model.max_length,
+        suppress_blank=True,
+        suppress_tokens=get_suppressed_tokens(tokenizer, [-1]),
+        max_initial_timestamp_index=int(round(MAX_INITIAL_TIMESTAMP / TIME_PRECISION)),
+        return_scores=True,
+        return_no_speech_prob=True,
+    )
+
+    outputs = []
+    for window, ts, result in zip(windows, timestamps, results):
+        tokens = result.sequences_ids[0]
+        duration = len(window) / SAMPLE_RATE
+        # scores[0] is already divided by the length; undo that and
+        # average over the tokens plus end-of-text, as faster-whisper does
+        avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOG_PROB_THRESHOLD:
+            outputs.append([])
+        elif ts:
+            outputs.append(split_timestamped(tokenizer, tokens, duration))
+        else:
+            text = tokenizer.decode(tokens).strip()
+            outputs.append([(0.0, duration, text)] if text else [])
+    return outputs
+
+
+def split_timestamped(tokenizer, tokens: list, duration: float) -> list:
+    """Split a timestamped token sequence into (start, end, text) segments."""
+    segments = []
+    start = 0.0
+    text_tokens = []
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            t = min((token - tokenizer.timestamp_begin) * TIME_PRECISION, duration)
+            if text_tokens:
+                text = tokenizer.decode(text_tokens).strip()
+                if text:
+                    segments.append((start, t, text))
+                text_tokens = []
+            start = t
+        else:
+            text_tokens.append(token)
+    if text_tokens:
+        text = tokenizer.decode(text_tokens).strip()
+        if text:
+            segments.append((start, duration, text))
+    return segments
+
+
+class _Request:
+    __slots__ = ("call_id", "audio", "timestamps", "vad", "tier", "future", "loop", "submitted_at")
+
+    def __init__(self, call_id, audio, timestamps, vad, tier, future, loop):
+        self.call_id = call_id
+        self.audio = audio
+        self.timestamps = timestamps
+        self.vad = vad
+        self.tier = tier
+        self.future = future
+        self.loop = loop
+        self.submitted_at = time.perf_counter()
+
+
+class InferenceScheduler(threading.Thread):
+    """
+    Collects ready windows from all sessions and decodes them in batches.
+
+    A batch is dispatched as soon as `max_batch_size` windows are waiting, or
+    `max_wait_ms` after the first window of the batch arrived, whichever
+    comes first. Each batch is decoded at the tier the worker's
+    QualityPolicy picks from its queue depth and recent load; without
+    `tiers` there is a single tier, `model` at `beam_size`.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 50,
+        beam_size: int = 1,
+        worker_id: int = 0,
+        tiers: list = None,
+    ):
+        super().__init__(name=f"inference-worker-{worker_id}")
+        self.worker_id = worker_id
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.beam_size = beam_size
+        self.policy = QualityPolicy(tiers or [Tier("standard", model, beam_size)])
+        self.running = True
+        self.daemon = True
+        self._queue = queue.Queue()
+
+        self.batches_run = 0
+        self.windows_decoded = 0
+        self.busy_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.tier_audio_seconds = {}
+        self.started_at = time.perf_counter()
+
+    async def submit(self, call_id: str, audio: np.ndarray, timestamps: bool = False, vad: bool = False, tier: str = None):
+        """
+        Queue one window and wait for its (start, end, text) segments.
+        Returns (segments, tier name). `vad` skips the window if it holds no
+        speech (see decode_batch).
+
+        `tier` forces a tier instead of the policy's choice (for warmup).
+        `audio` is read from the scheduler thread, so the caller must not
+        modify it until this coroutine returns.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(_Request(call_id, audio, timestamps, vad, tier, future, loop))
+        return await future
+
+    def run(self):
+        self.started_at = time.perf_counter()
+        print(
+            f"[InferenceScheduler {self.worker_id}] Started (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait * 1000:.0f})"
+        )
+        while self.running:
+            batch = self._collect_batch()
+            if batch:
+                self._run_batch(batch)
+
+    def _collect_batch(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _tier(self, batch: list) -> Tier:
+        forced = batch[0].tier
+        for tier in self.policy.tiers:
+            if tier.name == forced:
+                return tier
+        return self.policy.choose(self.queue_depth())
+
+    def _run_batch(self, batch: list):
+        tier = self._tier(batch)
+        start = time.perf_counter()
+        try:
+            outputs = decode_batch(
+                tier.model,
+                [req.audio for req in batch],
+                beam_size=tier.beam_size,
+                timestamps=[req.timestamps for req in batch],
+                vad=[req.vad for req in batch],
+            )
+        except Exception as e:
+            print(f"[InferenceScheduler {self.worker_id}] Batch of {len(batch)} failed: {e}")
+            for req in batch:
+                req.loop.call_soon_threadsafe(_set_exception, req.future, e)
+            return
+        finally:
+            elapsed = time.perf_counter() - start
+            self.busy_seconds += elapsed
+            DECODE_SECONDS.observe(elapsed)
+
+        audio_seconds = sum(len(req.audio) for req in batch) / SAMPLE_RATE
+        self.policy.record(tier, elapsed, audio_seconds)
+        self.batches_run += 1
+        self.windows_decoded += len(batch)
+        self.audio_seconds += audio_seconds
+        self.tier_audio_seconds[tier.name] = self.tier_audio_seconds.get(tier.name, 0.0) + audio_seconds
+        for req, segments in zip(batch, outputs):
+            req.loop.call_soon_threadsafe(_set_result, req.future, (segments, tier.name))
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def reset_stats(self):
+        """Forget warmup decodes so utilisation and RTF reflect real traffic."""
+        self.batches_run = 0
+        self.windows_decoded = 0
+        self.busy_seconds = 0.0
+        self.audio_seconds = 0.0
+        self.tier_audio_seconds = {}
+        self.policy.reset()
+        self.started_at = time.perf_counter()
+
+    def utilisation(self) -> float:
+        """Fraction of wall time since start spent decoding."""
+        elapsed = time.perf_counter() - self.started_at
+        return self.busy_seconds / elapsed if elapsed > 0 else 0.0
+
+    def rtf(self) -> float:
+        """Real-time factor: model seconds per second of audio decoded."""
+        return self.busy_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "queue_depth": self.queue_depth(),
+            "utilisation": round(self.utilisation(), 4),
+            "batches_run": self.batches_run,
+            "windows_decoded": self.windows_decoded,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "rtf": round(self.rtf(), 4),
+            **self.policy.stats(),
+            "tier_audio_seconds": {name: round(s, 3) for name, s in self.tier_audio_seconds.items()},
+            "mean_batch_size": (
+                self.windows_decoded / self.batches_run if self.batches_run else 0.0
+            ),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    def stop(self):
+        self.running = False
+
+
+class WorkerPool:
+    """
+    N InferenceScheduler workers sharing one multi-replica model.
+
+    A call is pinned to a worker the first time it submits (the worker with
+    the fewest pinned calls, then the shortest queue) and keeps it until
+    `release()`, so its windows are always decoded in order by one thread.
+    """
+
+    def __init__(self, model, num_workers: int = 1, **scheduler_kwargs):
+        self.workers = [
+            InferenceScheduler(model, worker_id=i, **scheduler_kwargs)
+            for i in range(max(1, num_workers))
+        ]
+        self._affinity = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def join(self, timeout=None):
+        for worker in self.workers:
+            worker.join(timeout=timeout)
+
+    def worker_for(self, call_id: str) -> InferenceScheduler:
+        with self._lock:
+            worker = self._affinity.get(call_id)
+            if worker is None:
+                pinned = [0] * len(self.workers)
+                for w in self._affinity.values():
+                    pinned[w.worker_id] += 1
+                worker = min(
+                    self.workers,
+                    key=lambda w: (pinned[w.worker_id], w.queue_depth()),
+                )
+                self._affinity[call_id] = worker
+            return worker
+
+    async def submit(self, call_id: str, audio: np.ndarray, timestamps: bool = False, vad: bool = False):
+        """Decode one window on the call's worker; returns (segments, tier name)."""
+        return await self.worker_for(call_id).submit(call_id, audio, timestamps=timestamps, vad=vad)
+
+    def release(self, call_id: str):
+        with self._lock:
+            self._affinity.pop(call_id, None)
+
+    def queue_depth(self) -> int:
+        return sum(w.queue_depth() for w in self.workers)
+
+    def rtf(self) -> float:
+        audio = sum(w.audio_seconds for w in self.workers)
+        return sum(w.busy_seconds for w in self.workers) / audio if audio else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            pinned = [0] * len(self.workers)
+            for w in self._affinity.values():
+                pinned[w.worker_id] += 1
+        workers = []
+        for w in self.workers:
+            worker_stats = w.stats()
+            worker_stats["pinned_calls"] = pinned[w.worker_id]
+            workers.append(worker_stats)
+        return {
+            "num_workers": len(self.workers),
+            "queue_depth": self.queue_depth(),
+            "utilisation": round(sum(w.utilisation() for w in self.workers) / len(self.workers), 4),
+            "rtf": round(self.rtf(), 4),
+            "workers": workers,
+        }
+
+
+def _set_result(future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+def _set_exception(future, exc):
+    if not future.done():
+        future.set_exception(exc)
@@ -0,0 +1,246 @@
+"""
+Per-call state for the transcriber service, and the registry that keeps
+its memory bounded over long runs.
+"""
+
+import struct
+import time
+
+from admission import InboundQueue
+from audio import RingBuffer
+from telephony import ENCODINGS
+
+# Sequenced binary frames start with the sequence number of their first
+# audio frame and the number of audio frames they carry.
+SEQ_HEADER = struct.Struct(">IH")
+
+# Speakers of a stereo call, by channel, unless the client names them
+DEFAULT_SPEAKERS = ("agent", "customer")
+
+
+class Channel:
+    """
+    Window state of one audio channel of a call. Mono calls have a single
+    unlabelled channel; stereo calls one per speaker.
+    """
+
+    def __init__(self, speaker: str = None):
+        self.speaker = speaker
+        self.buf = None
+        self.stream = None
+        self.endpointer = None
+        self.last_decode_at = 0
+        self.tier = None  # quality tier of the last decode
+
+    def ensure_buffer(self, capacity_samples: int) -> RingBuffer:
+        if self.buf is None:
+            self.buf = RingBuffer(capacity_samples)
+        return self.buf
+
+    def label(self, text: str) -> str:
+        """Chunk text as stored for the summarizer: "Agent: ..." on stereo calls."""
+        return f"{self.speaker.capitalize()}: {text}" if self.speaker else text
+
+
+class Session:
+    """
+    Everything the receive loop and the decode loop of one call share.
+
+    The receive loop only parses frames and puts them on `inbound`; the
+    decode loop owns the channels' buffers, streams and endpointers.
+    """
+
+    def __init__(
+        self,
+        call_id: str,
+        customer_id: str,
+        inbound: InboundQueue,
+        streaming: bool = False,
+        speakers: list = None,
+    ):
+        self.call_id = call_id
+        self.customer_id = customer_id
+        self.inbound = inbound
+        self.streaming = streaming
+        self.channels = [Channel(s) for s in speakers] if speakers else [Channel()]
+        self.spool = None
+        self.codec = "pcm16"
+        self.decoder = None  # PacketDecoder for compressed sessions
+        self.encoding = "pcm16"
+        self.sample_rate = 16000
+        self.converter = None  # telephony.PcmConverter for G.711 or other rates
+        self.sequenced = False
+        self.next_seq = 0
+        self.processed_seq = 0  # next_seq of the last frame decoded into the buffers
+        self.checkpoint = None  # checkpoint.CheckpointState with SESSION_CHECKPOINTS
+        self.restored = None  # claimed checkpoint, applied by the decode loop
+        self.clean_close = False  # the client closed normally; nothing to resume
+        self.connected = True
+        self.started_at = time.time()
+        self.websocket = None  # closed by the SessionManager when the call goes idle
+        self.reserved_bytes = 0  # buffer memory counted against the manager's cap
+        self.last_activity = time.monotonic()
+        self.messages_in = 0
+        self.bytes_in = 0
+        self.chunks_out = 0
+
+    @property
+    def frame_bytes(self) -> int:
+        """Bytes per sample frame of interleaved uncompressed audio."""
+        return ENCODINGS[self.encoding] * len(self.channels)
+
+    @property
+    def native_pcm(self) -> bool:
+        """Frames are int16 PCM at the model's rate, written to the buffers as they arrive."""
+        return self.decoder is None and self.converter is None
+
+    def buffered_samples(self) -> int:
+        """Samples waiting in the fullest channel buffer."""
+        return max((len(c.buf) for c in self.channels if c.buf is not None), default=0)
+
+    def buffer_bytes(self) -> int:
+        return sum(c.buf.nbytes for c in self.channels if c.buf is not None)
+
+    def touch(self, nbytes: int = 0):
+        """Record a message from the client."""
+        self.last_activity = time.monotonic()
+        self.messages_in += 1
+        self.bytes_in += nbytes
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_activity
+
+    def accept_seq(self, seq: int, count: int):
+        """
+        Track a sequenced message covering frames [seq, seq + count).
+        Returns (overlap, missing): how many of its leading frames were
+        already received, all `count` for a message resent after a
+        reconnect, and how many frames are missing before it.
+        """
+        end = seq + count
+        if end <= self.next_seq:
+            return count, 0
+        overlap = max(0, self.next_seq - seq)
+        missing = max(0, seq - self.next_seq)
+        self.next_seq = end
+        return overlap, missing
+
+
+class SessionManager:
+    """
+    Live sessions by call_id, plus every session whose decode loop is still
+    running after a reconnect replaced it, so their buffers stay counted.
+
+    Sessions reserve their ring-buffer memory when admitted, and a new call
+    is refused while the reservations would exceed `max_buffer_bytes`.
+    `evict_idle` closes connections that have sent nothing, not even a
+    silence marker, for `idle_seconds`; their decode loops then finish as
+    after any disconnect.
+    """
+
+    def __init__(self, idle_seconds: float = 60, max_buffer_bytes: int = 0):
+        self.idle_seconds = idle_seconds
+        self.max_buffer_bytes = max_buffer_bytes  # 0: no cap
+        self._live = {}
+        self._running = set()
+        self.idle_evictions = 0
+        self.buffer_rejections = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def get(self, call_id: str):
+        return self._live.get(call_id)
+
+    def items(self) -> list:
+        return list(self._live.items())
+
+    def running(self) -> list:
+        """Every session with a decode loop, live or finishing."""
+        return list(self._running)
+
+    def is_current(self, session: Session) -> bool:
+        return self._live.get(session.call_id) is session
+
+    def reserved_bytes(self) -> int:
+        return sum(s.reserved_bytes for s in self._running)
+
+    def has_room(self, nbytes: int) -> bool:
+        """Whether a new session reserving `nbytes` fits under the cap."""
+        if self.max_buffer_bytes and self.reserved_bytes() + nbytes > self.max_buffer_bytes:
+            self.buffer_rejections += 1
+            return False
+        return True
+
+    def add(self, session: Session):
+        """Register a new session. Returns the session it replaces, if any."""
+        previous = self._live.get(session.call_id)
+        self._live[session.call_id] = session
+        self._running.add(session)
+        return previous
+
+    def remove(self, session: Session) -> bool:
+        """Forget a session whose decode loop has ended. Returns whether it was the call's live one."""
+        self._running.discard(session)
+        if self.is_current(session):
+            del self._live[session.call_id]
+            return True
+        return False
+
+    async def evict_idle(self) -> int:
+        """Close the connections of sessions idle for longer than `idle_seconds`."""
+        evicted = 0
+        for session in list(self._live.values()):
+            if not session.connected or session.websocket is None:
+                continue
+            idle = session.idle_seconds()
+            if idle < self.idle_seconds:
+                continue
+            session.connected = False
+            self.idle_evictions += 1
+            evicted += 1
+            print(f"[SessionManager] Closing call {session.call_id}: idle for {idle:.0f}s")
+            try:
+                await session.websocket.close(code=1001, reason="Idle timeout")
+            except Exception:
+                pass
+        return evicted
+
+    def listing(self, sample_rate: int = 16000) -> list:
+        """Per-session metadata for the admin endpoint, oldest first."""
+        now = time.time()
+        rows = []
+        for session in sorted(self._running, key=lambda s: s.started_at):
+            rows.append({
+                "call_id": session.call_id,
+                "customer_id": session.customer_id,
+                "state": "live" if session.connected else "finishing",
+                "replaced": not self.is_current(session),
+                "started_at": session.started_at,
+                "age_seconds": round(now - session.started_at, 1),
+                "idle_seconds": round(session.idle_seconds(), 1),
+                "mode": "streaming" if session.streaming else "window",
+                "channels": len(session.channels),
+                "codec": session.codec,
+                "encoding": session.encoding,
+                "sample_rate": session.sample_rate,
+                "messages_in": session.messages_in,
+                "bytes_in": session.bytes_in,
+                "chunks_out": session.chunks_out,
+                "buffered_seconds": round(session.buffered_samples() / sample_rate, 3),
+                "queued_bytes": session.inbound.nbytes,
+                "reserved_bytes": session.reserved_bytes,
+                "allocated_bytes": session.buffer_bytes(),
+            })
+        return rows
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._live),
+            "running": len(self._running),
+            "idle_seconds": self.idle_seconds,
+            "idle_evictions": self.idle_evictions,
+            "reserved_bytes": self.reserved_bytes(),
+            "max_buffer_bytes": self.max_buffer_bytes,
+            "buffer_rejections": self.buffer_rejections,
+        }
@@ -0,0 +1,106 @@
+"""
+On-disk spool of a call's raw audio, used for end-of-call re-transcription.
+
+A spool file is an 8-byte little-endian sample count followed by that many
+int16 PCM samples. Past the count the file may hold preallocated zeros, so
+readers go by the header and never by the file size.
+"""
+
+import os
+
+import numpy as np
+
+from audio import PCM16_SCALE, float32_to_pcm16
+
+HEADER = np.dtype("<u8")
+
+
+class AudioSpool:
+    """
+    Append-only int16 PCM file for one call, written through a memory map.
+
+    The file grows `grow_samples` at a time so appends are plain memory
+    copies into the page cache rather than write() calls; the header is
+    updated with every append and `close()` trims the padding.
+
+    One object spools a call from start to finish: a session that resumes a
+    call takes over its predecessor's spool rather than opening the file
+    again (see app.py).
+    """
+
+    def __init__(self, path: str, sample_rate: int = 16000, grow_samples: int = 60 * 16000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.grow_samples = grow_samples
+        self.samples = 0
+        self._capacity = 0
+        self._mmap = None
+        self._map = None
+        self._header = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size >= HEADER.itemsize:
+            # A call resumed after its spool was closed keeps appending to it
+            self.samples = int(np.fromfile(path, dtype=HEADER, count=1)[0])
+            self._capacity = (size - HEADER.itemsize) // 2
+        else:
+            with open(path, "wb") as f:
+                f.write(np.zeros(1, dtype=HEADER).tobytes())
+
+    def write_pcm16(self, payload) -> int:
+        return self._append(np.frombuffer(payload, dtype="<i2"))
+
+    def write_float32(self, samples: np.ndarray) -> int:
+        """Spool decoded audio (compressed sessions) as int16 PCM."""
+        return self._append(float32_to_pcm16(samples))
+
+    def _append(self, audio: np.ndarray) -> int:
+        n = len(audio)
+        if self._map is None or self.samples + n > self._capacity:
+            self._grow(self.samples + n)
+        self._map[self.samples:self.samples + n] = audio
+        self.samples += n
+        self._header[0] = self.samples
+        return n
+
+    def _grow(self, needed: int):
+        """Map the file, first growing it if `needed` samples do not fit."""
+        capacity = self._capacity
+        if needed > capacity:
+            capacity = max(needed, capacity + self.grow_samples)
+        self._release()
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER.itemsize + capacity * 2)
+        self._mmap = np.memmap(self.path, dtype=np.uint8, mode="r+", shape=(HEADER.itemsize + capacity * 2,))
+        self._header = self._mmap[:HEADER.itemsize].view(HEADER)
+        self._map = self._mmap[HEADER.itemsize:].view("<i2")
+        self._capacity = capacity
+
+    def _release(self):
+        if self._map is not None:
+            self._mmap.flush()
+            self._mmap = self._map = self._header = None
+
+    def close(self):
+        self._release()
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER.itemsize + self.samples * 2)
+        self._capacity = self.samples
+
+    @property
+    def seconds(self) -> float:
+        return self.samples / self.sample_rate
+
+    def read_float32(self) -> np.ndarray:
+        """Whole spooled call as normalised float32 (call after close())."""
+        if self.samples == 0:
+            return np.zeros(0, dtype=np.float32)
+        pcm = np.memmap(self.path, dtype="<i2", mode="r", offset=HEADER.itemsize, shape=(self.samples,))
+        return np.multiply(pcm, PCM16_SCALE, dtype=np.float32)
+
+    def delete(self):
+        self._release()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
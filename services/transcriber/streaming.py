@@ -0,0 +1,82 @@
+"""
+Streaming transcript stabilisation for the transcriber service.
+
+The streaming mode re-decodes a growing window of audio every stride. Only
+words that two consecutive hypotheses agree on (LocalAgreement-2) are
+committed and pushed to Redis; the rest is sent to the agent as an interim
+hypothesis that may still change.
+"""
+
+import re
+
+_NORMALISE = re.compile(r"[^\w']+")
+
+
+def _norm(word: str) -> str:
+    return _NORMALISE.sub("", word.lower())
+
+
+def common_prefix_length(a: list, b: list) -> int:
+    """Number of leading words `a` and `b` agree on, ignoring case and punctuation."""
+    n = 0
+    for x, y in zip(a, b):
+        if _norm(x) != _norm(y):
+            break
+        n += 1
+    return n
+
+
+class LocalAgreement:
+    """
+    Tracks the hypotheses for one call's decode window.
+
+    `update()` takes the timestamped segments of the latest decode (relative
+    to the window start) and returns:
+    - committed: words that became stable with this decode,
+    - interim: the unstable tail of the hypothesis,
+    - trim_seconds: how much audio at the start of the window is fully
+      committed and can be dropped before the next decode, or None when
+      `final=True` committed the whole window.
+    """
+
+    def __init__(self):
+        self.committed = []  # committed words belonging to the current window
+        self.previous = []  # last hypothesis for the current window
+
+    def update(self, segments: list, final: bool = False):
+        words = []
+        boundaries = []  # (word count up to and including segment, segment end)
+        for start, end, text in segments:
+            words.extend(text.split())
+            boundaries.append((len(words), end))
+
+        if final:
+            agreed = len(words)
+        else:
+            agreed = common_prefix_length(self.previous, words)
+
+        new_words = words[len(self.committed):agreed] if agreed > len(self.committed) else []
+        self.committed = self.committed + new_words
+        interim = words[max(agreed, len(self.committed)):]
+
+        if final:
+            self.reset()
+            return new_words, [], None
+
+        # Drop whole segments that are committed, keeping the last one so the
+        # next decode still has some left context at the window start.
+        trim_seconds = 0.0
+        trimmed_words = 0
+        for count, end in boundaries[:-1]:
+            if count > len(self.committed):
+                break
+            trim_seconds = end
+            trimmed_words = count
+
+        self.committed = self.committed[trimmed_words:]
+        self.previous = words[trimmed_words:]
+        return new_words, interim, trim_seconds
+
+    def reset(self):
+        self.committed = []
+        self.previous = []
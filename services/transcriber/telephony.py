@@ -0,0 +1,161 @@
+"""
+Telephony audio ingest: G.711 decoding and sample-rate conversion to the
+model's 16 kHz, done with NumPy in the session's decode loop.
+
+A start message may declare what its binary frames hold:
+
+    {"type": "start", ..., "encoding": "mulaw", "sample_rate": 8000}
+
+`encoding` is pcm16 (little-endian int16, the default), mulaw or alaw
+(G.711, one byte per sample); `sample_rate` defaults to 16000. Frames of
+any other format than 16 kHz pcm16 go through a PcmConverter: G.711 codes
+are decoded with a 256-entry lookup table and the result is resampled by a
+streaming polyphase filter, so an 8 kHz phone call costs a table lookup
+and one small matrix product per frame. See bench_telephony.py for its
+cost per call.
+"""
+
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from audio import PCM16_SCALE
+
+# Wire name -> bytes per sample
+ENCODINGS = {
+    "pcm16": 2,
+    "mulaw": 1,
+    "alaw": 1,
+}
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+# Filter half-length in zero crossings of the lower of the two rates
+ZERO_CROSSINGS = 8
+KAISER_BETA = 8.0
+# Cutoff as a fraction of the lower Nyquist frequency, leaving room for
+# the transition band
+ROLLOFF = 0.92
+
+
+def _mulaw_table() -> np.ndarray:
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return (np.where(codes & 0x80, -magnitude, magnitude) * PCM16_SCALE).astype(np.float32)
+
+
+def _alaw_table() -> np.ndarray:
+    codes = np.arange(256, dtype=np.int32) ^ 0x55
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = np.where(
+        exponent == 0,
+        (mantissa << 4) + 8,
+        ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0),
+    )
+    return (np.where(codes & 0x80, magnitude, -magnitude) * PCM16_SCALE).astype(np.float32)
+
+
+# G.711 code -> float32 sample, in the buffer's [-1, 1) scale
+TABLES = {
+    "mulaw": _mulaw_table(),
+    "alaw": _alaw_table(),
+}
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler for one channel.
+
+    The low-pass prototype (a Kaiser-windowed sinc at the upsampled rate)
+    is split into `up` phases; output sample m is the dot product of phase
+    (m * down) % up with the input samples ending at (m * down) // up. The
+    last taps - 1 input samples are kept between calls, so consecutive
+    blocks resample as one continuous signal.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int):
+        g = gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        factor = max(self.up, self.down)
+        self.taps = -(-2 * ZERO_CROSSINGS * factor // self.up)  # per phase
+        length = self.taps * self.up
+
+        cutoff = ROLLOFF * 0.5 / factor  # cycles per upsampled sample
+        n = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, KAISER_BETA)
+        prototype *= self.up / prototype.sum()
+        # phases[p, k] weighs input sample base - (taps - 1) + k, so a row
+        # lines up with a forward window of the input
+        self.phases = np.ascontiguousarray(prototype.reshape(self.taps, self.up).T[:, ::-1], dtype=np.float32)
+
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._t = 0  # upsampled position of the next output, from the block start
+
+    def output_samples(self, n: int) -> int:
+        """Samples the next call with n input samples will return."""
+        span = n * self.up - self._t
+        return max(0, -(-span // self.down))
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        n = len(block)
+        count = self.output_samples(n)
+        padded = np.concatenate((self._history, block))
+        windows = sliding_window_view(padded, self.taps)
+        if self.down == 1 and self._t == 0:
+            # Integer upsampling (8 kHz -> 16 kHz): every input sample
+            # yields one output per phase, a single matrix product
+            out = (windows[:n] @ self.phases.T).reshape(-1)
+        else:
+            t = self._t + self.down * np.arange(count)
+            out = np.einsum("ij,ij->i", windows[t // self.up], self.phases[t % self.up])
+        self._t += count * self.down - n * self.up
+        self._history = padded[len(padded) - len(self._history):]
+        return out
+
+
+class PcmConverter:
+    """
+    Turns one session's frames into float32 at `out_rate`, per channel.
+
+    Keeps resampler state between calls, so frames must be converted in
+    order (the session's decode loop guarantees that).
+    """
+
+    def __init__(self, encoding: str, sample_rate: int, channels: int = 1, out_rate: int = 16000):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding!r}")
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"sample_rate must be {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE}")
+        self.encoding = encoding
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.table = TABLES.get(encoding)
+        self.resamplers = (
+            [PolyphaseResampler(sample_rate, out_rate) for _ in range(channels)]
+            if sample_rate != out_rate else None
+        )
+
+    @property
+    def frame_bytes(self) -> int:
+        return ENCODINGS[self.encoding] * self.channels
+
+    def decode(self, payload) -> np.ndarray:
+        """Samples as float32, shape (frames, channels)."""
+        if self.table is None:
+            samples = np.frombuffer(payload, dtype="<i2").astype(np.float32)
+            samples *= PCM16_SCALE
+        else:
+            samples = self.table[np.frombuffer(payload, dtype=np.uint8)]
+        return samples.reshape(-1, self.channels)
+
+    def convert(self, payload) -> list:
+        """One float32 array per channel, at the output rate."""
+        frames = self.decode(payload)
+        if self.resamplers is None:
+            return [frames[:, i] for i in range(self.channels)]
+        return [r.process(frames[:, i]) for i, r in enumerate(self.resamplers)]
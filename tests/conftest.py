@@ -0,0 +1,32 @@
+"""
+Unit tests for the services and the streaming client. Each runs from its
+own directory with flat imports, so the transcriber's and whisper_client's
+are put on the path here; summarizer modules whose names clash with the
+transcriber's are loaded by file path with `load_module`.
+
+db_test.py is the end-to-end scenario run by tests/Dockerfile against live
+Redis and Postgres, not a pytest module.
+"""
+
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSCRIBER = os.path.join(ROOT, "services", "transcriber")
+SUMMARIZER = os.path.join(ROOT, "services", "summarizer")
+WHISPER_CLIENT = os.path.join(ROOT, "whisper_client")
+
+sys.path.insert(0, TRANSCRIBER)
+sys.path.append(WHISPER_CLIENT)
+
+collect_ignore = ["db_test.py"]
+
+
+def load_module(name: str, path: str):
+    """Import a file under its own module name, outside sys.path."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, InboundQueue, Silence
+
+
+def frame(n, size=100):
+    return bytes([n]) * size
+
+
+def drain(queue, max_bytes=10_000):
+    async def run():
+        batches = []
+        queue.close()
+        while (frames := await queue.get(max_bytes)) is not None:
+            batches.append(frames)
+        return batches
+    return asyncio.run(run())
+
+
+def test_full_session_queue_drops_oldest():
+    ctl = AdmissionController(session_limit_bytes=300)
+    queue = InboundQueue(ctl)
+    assert [queue.put(frame(i)) for i in range(3)] == [0, 0, 0]
+    assert queue.put(frame(3)) == 100
+    assert [f[0] for f in sum(drain(queue), [])] == [1, 2, 3]
+    assert ctl.frames_dropped == 1 and ctl.bytes_dropped == 100
+    assert ctl.queued_bytes == 0 and queue.nbytes == 0
+
+
+def test_global_limit_drops_across_sessions():
+    ctl = AdmissionController(session_limit_bytes=1000, global_limit_bytes=250)
+    a, b = InboundQueue(ctl), InboundQueue(ctl)
+    a.put(frame(1))
+    a.put(frame(2))
+    # The queue that pushes the total over the limit gives up its own oldest
+    # audio, down to its newest frame
+    assert b.put(frame(3)) == 0
+    assert b.put(frame(4)) == 100
+    assert ctl.queued_bytes == 300
+    assert [f[0] for f in sum(drain(b), [])] == [4]
+    assert [f[0] for f in sum(drain(a), [])] == [1, 2]
+
+
+def test_newest_frame_is_never_dropped():
+    ctl = AdmissionController(session_limit_bytes=50)
+    queue = InboundQueue(ctl)
+    assert queue.put(frame(1)) == 0
+    assert len(queue) == 1
+
+
+def test_coalesce_merges_backlog_up_to_max_bytes():
+    ctl = AdmissionController(policy="coalesce")
+    queue = InboundQueue(ctl)
+    for i in range(5):
+        queue.put(frame(i), tag=i + 1)
+    batches = drain(queue, max_bytes=300)
+    assert [[f[0] for f in b] for b in batches] == [[0, 1, 2], [3, 4]]
+    assert ctl.frames_coalesced == 3
+    assert queue.last_tag == 5
+
+
+def test_coalesce_stops_at_silence_markers():
+    queue = InboundQueue(AdmissionController(policy="coalesce"))
+    queue.put(frame(1))
+    queue.put(Silence(1600))
+    queue.put(frame(2))
+    queue.put(frame(3))
+    batches = drain(queue)
+    assert len(batches) == 3
+    assert isinstance(batches[1][0], Silence) and len(batches[1]) == 1
+    assert [f[0] for f in batches[2]] == [2, 3]
+
+
+def test_drop_oldest_hands_out_one_frame_at_a_time():
+    ctl = AdmissionController(policy="drop_oldest")
+    queue = InboundQueue(ctl)
+    for i in range(3):
+        queue.put(frame(i))
+    assert [len(b) for b in drain(queue)] == [1, 1, 1]
+    assert ctl.frames_coalesced == 0
+
+
+def test_reject_policy_refuses_calls_when_overloaded():
+    ctl = AdmissionController(policy="reject", max_sessions=2, pool_depth_limit=10)
+    assert ctl.try_admit(pool_depth=0) == (True, "")
+    admitted, reason = ctl.try_admit(pool_depth=10)
+    assert not admitted and "overloaded" in reason
+    assert ctl.try_admit(pool_depth=0)[0]
+    admitted, reason = ctl.try_admit(pool_depth=0)
+    assert not admitted and "capacity" in reason
+    ctl.release()
+    assert ctl.try_admit(pool_depth=0)[0]
+    assert ctl.sessions_rejected == 2
+
+
+def test_coalesce_policy_admits_despite_pool_depth():
+    ctl = AdmissionController(policy="coalesce")
+    assert ctl.try_admit(pool_depth=1000)[0]
+    with pytest.raises(ValueError):
+        AdmissionController(policy="nope")
+
+
+def test_get_waits_for_a_frame():
+    queue = InboundQueue(AdmissionController())
+
+    async def run():
+        getter = asyncio.create_task(queue.get(1000))
+        await asyncio.sleep(0.01)
+        assert not getter.done()
+        queue.put(frame(7))
+        return await asyncio.wait_for(getter, 1)
+
+    assert asyncio.run(run())[0][0] == 7
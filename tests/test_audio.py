@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from audio import PCM16_SCALE, RingBuffer, pcm16_to_float32
+
+
+def test_write_and_view_in_order():
+    buf = RingBuffer(8)
+    buf.write(np.arange(5, dtype=np.float32))
+    assert len(buf) == 5
+    assert buf.view().tolist() == [0, 1, 2, 3, 4]
+    assert buf.view(2).tolist() == [3, 4]
+
+
+def test_wraparound_keeps_newest_samples_contiguous():
+    buf = RingBuffer(8)
+    buf.write(np.arange(6, dtype=np.float32))
+    buf.write(np.arange(6, 11, dtype=np.float32))
+    assert len(buf) == 8
+    view = buf.view()
+    assert view.tolist() == list(range(3, 11))
+    # One slice of the mirrored storage, not a copy
+    assert view.base is not None and view.flags.c_contiguous
+    assert buf.total_written == 11
+
+
+def test_write_longer_than_capacity_keeps_the_tail():
+    buf = RingBuffer(4)
+    assert buf.write(np.arange(10, dtype=np.float32)) == 4
+    assert buf.view().tolist() == [6, 7, 8, 9]
+    assert buf.total_written == 10
+
+
+def test_consume_drops_oldest_across_the_wrap():
+    buf = RingBuffer(5)
+    buf.write(np.arange(4, dtype=np.float32))
+    buf.write(np.arange(4, 8, dtype=np.float32))
+    buf.consume(2)
+    assert buf.view().tolist() == [5, 6, 7]
+    buf.write(np.array([8, 9], dtype=np.float32))
+    assert buf.view().tolist() == [5, 6, 7, 8, 9]
+    buf.clear()
+    assert len(buf) == 0 and buf.view().size == 0
+
+
+def test_write_pcm16_scales_into_the_buffer():
+    pcm = np.array([-32768, 0, 16384, 32767], dtype="<i2")
+    buf = RingBuffer(3)
+    buf.write_pcm16(pcm.tobytes())
+    assert np.array_equal(buf.view(), pcm16_to_float32(pcm.tobytes())[1:])
+    assert buf.view().dtype == np.float32
+    assert buf.view()[1] == pytest.approx(16384 * PCM16_SCALE)
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+    assert RingBuffer.nbytes_for(100) == RingBuffer(100).nbytes
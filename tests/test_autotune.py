@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+
+import download_model
+from download_model import edit_distance, normalize
+from model_config import read_recommendation, write_recommendation
+
+
+def wer_errors(reference, hypothesis):
+    return edit_distance(normalize(reference), normalize(hypothesis))
+
+
+def test_identical_text_has_no_errors():
+    assert wer_errors("please close my account", "please close my account") == 0
+
+
+def test_substitution_insertion_and_deletion_count_one_each():
+    assert wer_errors("please close my account", "please close the account") == 1
+    assert wer_errors("please close my account", "please do close my account") == 1
+    assert wer_errors("please close my account", "please close account") == 1
+    assert wer_errors("", "hello there") == 2
+    assert wer_errors("hello there", "") == 2
+
+
+def test_case_and_punctuation_are_not_errors():
+    assert normalize("Hello, World! It's a follow-up.") == ["hello", "world", "it's", "a", "follow", "up"]
+    assert wer_errors("Hello, world.", "hello world") == 0
+
+
+def test_recommendation_round_trips(tmp_path):
+    path = str(tmp_path / "whisper-autotune.json")
+    write_recommendation(path, {"model": "small.en", "compute_type": "int8", "device": "cpu", "model_path": "whisper-small.en"})
+    assert not os.path.exists(path + ".tmp")
+    assert read_recommendation(path, "cpu") == {
+        "model": "small.en",
+        "compute_type": "int8",
+        "model_path": str(tmp_path / "whisper-small.en"),
+    }
+    # Measured on another device, or missing: fall back to the environment
+    assert read_recommendation(path, "cuda") == {}
+    assert read_recommendation(str(tmp_path / "missing.json"), "cpu") == {}
+
+
+def test_unknown_version_is_ignored(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"version": 99, "model": "x", "compute_type": "int8", "device": "cpu"}))
+    assert read_recommendation(str(path), "cpu") == {}
+
+
+def test_autotune_writes_a_loadable_recommendation(tmp_path, monkeypatch):
+    results = {("small.en", "int8"): (0.05, 0.12), ("medium.en", "int8"): (0.2, 0.08)}
+    monkeypatch.setattr(download_model, "load_reference", lambda source: [{"words": ["hi"], "seconds": 10.0}])
+    monkeypatch.setattr(download_model, "download", lambda name, output: os.makedirs(output, exist_ok=True))
+
+    def benchmark(model_path, compute_type, device, references, batch_size, cpu_threads):
+        rtf, wer = results[(os.path.basename(model_path)[len("whisper-"):], compute_type)]
+        return {"rtf": rtf, "wer": wer, "load_seconds": 1.0}
+    monkeypatch.setattr(download_model, "benchmark", benchmark)
+
+    config = str(tmp_path / "conf" / "whisper-autotune.json")
+    args = argparse.Namespace(
+        device="cpu", compute_types="int8", reference="refs", config=config, models="small.en,medium.en",
+        output_root=str(tmp_path / "models"), batch_size=4, cpu_threads=0, max_wer=0.15,
+    )
+    download_model.autotune(args)
+
+    # The fastest variant within the WER limit, with weights found from the file's directory
+    recommended = read_recommendation(config, "cpu")
+    assert (recommended["model"], recommended["compute_type"]) == ("small.en", "int8")
+    assert os.path.normpath(recommended["model_path"]) == str(tmp_path / "models" / "whisper-small.en")
+
+    args.max_wer = 0.1
+    download_model.autotune(args)
+    assert read_recommendation(config, "cpu")["model"] == "medium.en"
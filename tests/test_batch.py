@@ -0,0 +1,193 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import batch
+from batch import SAMPLE_RATE, BatchJob, job_key, split_on_silence
+
+
+class FakePool:
+    """WorkerPool stand-in: every piece decodes to one segment after a short delay."""
+
+    def __init__(self, live_depth=0):
+        self.live_depth = live_depth
+        self.queued = 0
+        self.max_queued = 0
+        self.submitted = []
+        self.depth_checks = 0
+
+    def queue_depth(self):
+        self.depth_checks += 1
+        return self.live_depth + self.queued
+
+    async def submit(self, call_id, audio, timestamps=False, vad=False):
+        self.submitted.append((call_id, self.live_depth))
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        await asyncio.sleep(0.01)
+        self.queued -= 1
+        return [(0.0, len(audio) / SAMPLE_RATE, f"piece {call_id}")], "standard"
+
+    def release(self, call_id):
+        pass
+
+
+def recording(seconds=90.0):
+    """Quiet noise with loud tone bursts, so it splits into several pieces."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = rng.standard_normal(len(t)).astype(np.float32) * 1e-4
+    loud = ((t % 20) < 15)
+    audio[loud] += 0.3 * np.sin(2 * np.pi * 220 * t[loud]).astype(np.float32)
+    return audio
+
+
+@pytest.fixture
+def entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "decode_audio", lambda path, sampling_rate: recording())
+    return [
+        {"path": str(tmp_path / f"call{i}.wav"), "call_id": f"call{i}", "customer_id": str(i)}
+        for i in range(3)
+    ]
+
+
+def test_split_on_silence_skips_quiet_stretches():
+    audio = recording(60.0)
+    pieces = split_on_silence(audio)
+    assert len(pieces) >= 3
+    for start, end in pieces:
+        assert end - start <= 30 * SAMPLE_RATE
+    # Pieces start in a burst or within the pre-roll before one, never mid-gap
+    for start, _ in pieces:
+        phase = start / SAMPLE_RATE % 20
+        assert phase < 15 or phase > 20 - 0.35
+
+
+def test_pieces_in_flight_are_capped(tmp_path, entries):
+    output = tmp_path / "out.jsonl"
+    job = BatchJob("t", entries, str(output), max_files=3, max_pieces=2)
+    pool = FakePool()
+    asyncio.run(job.run(pool))
+    assert job.status == "done"
+    assert job.files_done == 3
+    assert pool.max_queued == 2
+
+
+def test_yield_to_live_waits_for_live_queue(tmp_path, entries, monkeypatch):
+    monkeypatch.setattr(batch, "IDLE_POLL_SECONDS", 0.01)
+    job = BatchJob("t", entries[:1], str(tmp_path / "out.jsonl"), yield_to_live=True)
+    pool = FakePool(live_depth=5)
+
+    async def drain_live():
+        while not pool.depth_checks:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        assert pool.submitted == []
+        pool.live_depth = 0
+
+    async def run():
+        await asyncio.gather(job.run(pool), drain_live())
+
+    asyncio.run(run())
+    assert job.files_done == 1
+    assert pool.submitted and all(live == 0 for _, live in pool.submitted)
+    assert job.idle_waits >= 1
+
+
+def test_rerun_skips_finished_calls(tmp_path, entries):
+    output = tmp_path / "out.jsonl"
+    key = job_key(str(tmp_path), str(output))
+    first = BatchJob(key, entries[:2], str(output))
+    asyncio.run(first.run(FakePool()))
+
+    second = BatchJob(key, entries, str(output))
+    pool = FakePool()
+    asyncio.run(second.run(pool))
+    assert second.files_skipped == 2
+    assert second.files_done == 1
+    assert {key.split(":")[1] for key, _ in pool.submitted} == {"call2"}
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(r["call_id"] for r in records) == ["call0", "call1", "call2"]
+
+
+def test_job_key_is_stable_per_input_and_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    key = job_key("calls", "redis")
+    assert key == job_key(str(tmp_path / "calls"), "redis")
+    assert key != job_key("other-calls", "redis")
+    assert key != job_key("calls", "out.jsonl")
+    assert BatchJob(key, [], "redis", redis_client=object()).progress_path == f"batch-{key}.progress"
+
+
+def test_unrelated_inputs_do_not_share_progress(tmp_path, entries):
+    output = tmp_path / "out.jsonl"
+    first = BatchJob(job_key("set-a", str(output)), entries, str(output))
+    asyncio.run(first.run(FakePool()))
+
+    second = BatchJob(job_key("set-b", str(output)), entries, str(output))
+    asyncio.run(second.run(FakePool()))
+    assert second.files_skipped == 0
+    assert second.files_done == 3
+
+
+@pytest.fixture
+def batch_root(tmp_path, monkeypatch):
+    """app's POST /batch confined to tmp_path/root, with a live FakePool."""
+    import app
+
+    root = tmp_path / "root"
+    (root / "calls").mkdir(parents=True)
+    monkeypatch.setattr(app, "BATCH_ROOT", str(root))
+    monkeypatch.setattr(app, "BATCH_JOBS_DIR", str(root / "jobs"))
+    monkeypatch.setitem(app.startup, "ready", True)
+    monkeypatch.setattr(app, "pool", FakePool())
+    monkeypatch.setattr(app, "batch_jobs", {})
+    monkeypatch.setattr(app, "batch_tasks", {})
+    monkeypatch.setattr(batch, "decode_audio", lambda path, sampling_rate: recording(20.0))
+    return app, root
+
+
+@pytest.mark.parametrize("fields", [
+    {"input": "../calls", "output": "redis"},
+    {"input": "calls/../../calls", "output": "redis"},
+    {"input": "/etc", "output": "redis"},
+    {"input": "calls", "output": "../out.jsonl"},
+    {"input": "calls", "output": "/tmp/out.jsonl"},
+    {"input": "calls", "output": "redis", "progress": "../job.progress"},
+    {"input": "calls", "output": "redis", "progress": "/tmp/job.progress"},
+])
+def test_batch_request_paths_outside_the_root_are_rejected(batch_root, fields):
+    app, _ = batch_root
+    with pytest.raises(app.HTTPException) as error:
+        asyncio.run(app.start_batch(app.BatchRequest(**fields)))
+    assert error.value.status_code == 400
+    assert not app.batch_jobs
+
+
+def test_batch_manifest_and_symlinks_cannot_escape_the_root(batch_root, tmp_path):
+    app, root = batch_root
+    (tmp_path / "secret.wav").touch()
+    (root / "manifest.txt").write_text("../secret.wav\n")
+    (root / "link").symlink_to(tmp_path)
+    for source in ("manifest.txt", "link"):
+        with pytest.raises(app.HTTPException) as error:
+            asyncio.run(app.start_batch(app.BatchRequest(input=source, output="redis")))
+        assert error.value.status_code == 400
+
+
+def test_batch_request_runs_inside_the_root(batch_root):
+    app, root = batch_root
+    (root / "calls" / "call0.wav").touch()
+
+    async def run():
+        report = await app.start_batch(app.BatchRequest(input="calls", output="out.jsonl"))
+        await app.batch_tasks[report["job_id"]]
+        return app.batch_jobs[report["job_id"]]
+
+    job = asyncio.run(run())
+    assert job.status == "done"
+    assert job.output == str(root / "jobs" / "out.jsonl")
+    assert job.progress_path.startswith(str(root / "jobs") + "/")
+    assert (root / "jobs" / "out.jsonl").exists()
@@ -0,0 +1,140 @@
+import asyncio
+
+import fakeredis
+import numpy as np
+import pytest
+
+from admission import AdmissionController, InboundQueue
+from checkpoint import SessionCheckpointer, header_key, owner_key, tail_key
+from sessions import Session
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def checkpointer(server):
+    return SessionCheckpointer(fakeredis.aioredis.FakeRedis(server=server), ttl_seconds=60)
+
+
+def session(call_id="c1"):
+    s = Session(call_id, "1", InboundQueue(AdmissionController()))
+    s.channels[0].ensure_buffer(16000)
+    return s
+
+
+def feed(s, samples, seq):
+    s.channels[0].buf.write(np.asarray(samples, dtype=np.float32))
+    s.processed_seq = seq
+
+
+def test_claim_restores_the_saved_tail(server):
+    async def run():
+        first = session()
+        ckpt = checkpointer(server)
+        assert await ckpt.claim(first) is None
+        feed(first, [0.5] * 100, seq=3)
+        assert await ckpt.save(first)
+
+        second = session()
+        restored = await checkpointer(server).claim(second)
+        return restored, ckpt
+
+    restored, ckpt = asyncio.run(run())
+    assert restored.next_seq == 3
+    (start, pcm), = restored.tails
+    assert start == 0
+    assert pcm.tolist() == [16384] * 100
+    r = fakeredis.FakeRedis(server=server)
+    # Claiming removes the checkpoint so no other session resumes it too
+    assert r.get(header_key("c1")) is None
+    assert r.get(tail_key("c1", 0)) is None
+    assert ckpt.saves == 1
+
+
+def test_save_appends_only_new_audio_until_a_flush(server):
+    async def run():
+        s = session()
+        ckpt = checkpointer(server)
+        await ckpt.claim(s)
+        feed(s, [0.25] * 100, seq=1)
+        await ckpt.save(s)
+        feed(s, [0.5] * 50, seq=2)
+        await ckpt.save(s)
+        appended = ckpt.bytes_written
+
+        # A flushed window moves the tail start: the tail is rewritten whole
+        s.channels[0].buf.consume(120)
+        await ckpt.save(s)
+        return ckpt, appended, await checkpointer(server).claim(session())
+
+    ckpt, appended, restored = asyncio.run(run())
+    assert appended == 2 * 150
+    assert ckpt.bytes_written == appended + 2 * 30
+    (start, pcm), = restored.tails
+    assert start == 120
+    assert pcm.tolist() == [16384] * 30
+    assert restored.next_seq == 2
+
+
+def test_superseded_session_stops_writing(server):
+    async def run():
+        old, new = session(), session()
+        old_ckpt, new_ckpt = checkpointer(server), checkpointer(server)
+        await old_ckpt.claim(old)
+        feed(old, [0.5] * 100, seq=4)
+        await old_ckpt.save(old)
+
+        # The client reconnects to another replica while the old session lives on
+        restored = await new_ckpt.claim(new)
+        feed(new, [0.25] * 10, seq=5)
+        await new_ckpt.save(new)
+
+        feed(old, [0.5] * 10, seq=5)
+        saved = await old_ckpt.save(old)
+        old_owns = await old_ckpt.release(old)
+        return restored, saved, old_owns, old, old_ckpt, new, new_ckpt
+
+    restored, saved, old_owns, old, old_ckpt, new, new_ckpt = asyncio.run(run())
+    assert restored.next_seq == 4
+    assert not saved and not old_owns
+    assert old.checkpoint.superseded
+    assert old_ckpt.superseded == 1
+    assert not old_ckpt.due(old)
+
+    r = fakeredis.FakeRedis(server=server)
+    assert r.get(owner_key("c1")).decode() == new.checkpoint.token
+    pcm = np.frombuffer(r.get(tail_key("c1", 0)), dtype="<i2")
+    assert pcm.tolist() == [8192] * 10
+
+
+def test_release_by_the_owner_drops_the_checkpoint(server):
+    async def run():
+        s = session()
+        ckpt = checkpointer(server)
+        await ckpt.claim(s)
+        feed(s, [0.5] * 10, seq=1)
+        await ckpt.save(s)
+        return await ckpt.release(s), s
+
+    owns, s = asyncio.run(run())
+    assert owns
+    r = fakeredis.FakeRedis(server=server)
+    assert r.get(header_key("c1")) is None
+    # Kept so a session this one superseded still finds out
+    assert r.get(owner_key("c1")).decode() == s.checkpoint.token
+
+
+def test_claim_ignores_a_checkpoint_with_other_channels(server):
+    async def run():
+        stereo = Session("c1", "1", InboundQueue(AdmissionController()), speakers=["Agent", "Customer"])
+        for channel in stereo.channels:
+            channel.ensure_buffer(1600)
+            channel.buf.write(np.zeros(10, dtype=np.float32))
+        ckpt = checkpointer(server)
+        await ckpt.claim(stereo)
+        await ckpt.save(stereo)
+        return await checkpointer(server).claim(session())
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,123 @@
+import asyncio
+import os
+
+import fakeredis
+import pytest
+
+import chunk_transport as producer
+from conftest import SUMMARIZER, load_module
+from redis_writer import RedisChunkWriter
+
+consumer = load_module("summarizer_chunk_transport", os.path.join(SUMMARIZER, "chunk_transport.py"))
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def r(server):
+    r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    r.server = server
+    return r
+
+
+@pytest.fixture
+def streams(r, monkeypatch):
+    monkeypatch.setattr(producer, "CHUNK_TRANSPORT", "streams")
+    transport = consumer.StreamTransport(r)
+    transport.setup()
+    return transport
+
+
+def publish(r, call_id, texts, tiers=None):
+    """Write chunks through the transcriber's RedisChunkWriter."""
+    async def run():
+        writer = RedisChunkWriter(fakeredis.aioredis.FakeRedis(server=r.server, decode_responses=True))
+        writer.start()
+        for text, tier in zip(texts, tiers or [None] * len(texts)):
+            writer.push(call_id, "42", text, tier=tier)
+        await writer.close()
+    asyncio.run(run())
+
+
+def summarize(r, transport, call_id):
+    """The SummarizerWorker's bookkeeping around one summary."""
+    chunks, cursor = transport.read_new(call_id)
+    pipe = r.pipeline()
+    transport.set_processed(pipe, call_id, cursor, len(chunks))
+    pipe.execute()
+    return chunks
+
+
+def pending(r):
+    return r.xpending(consumer.SUMMARIZE_STREAM, consumer.CONSUMER_GROUP)["pending"]
+
+
+def test_entry_is_acked_only_after_summarizing(r, streams):
+    publish(r, "c1", ["hello", "there"], tiers=["high", "high"])
+    [(call_id, token)] = streams.claim("worker-1", timeout=1)
+    assert call_id == "c1"
+    assert pending(r) == 1
+
+    assert summarize(r, streams, "c1") == ["hello", "there"]
+    assert pending(r) == 1
+    streams.ack(call_id, token)
+    assert pending(r) == 0
+    assert not r.sismember(consumer.PENDING_SET, "c1")
+    assert r.get("call:c1:processed_index") == "2"
+    assert not streams.has_new("c1")
+
+
+def test_crashed_worker_entry_is_reclaimed(r, streams, monkeypatch):
+    monkeypatch.setattr(consumer, "STREAM_CLAIM_IDLE_MS", 0)
+    publish(r, "c1", ["hello"])
+    [(_, token)] = streams.claim("worker-1", timeout=1)
+    # worker-1 dies before acknowledging; worker-2 takes the entry over
+    [(call_id, reclaimed)] = streams.claim("worker-2", timeout=1)
+    assert (call_id, reclaimed) == ("c1", token)
+    assert summarize(r, streams, "c1") == ["hello"]
+    streams.ack(call_id, reclaimed)
+    assert pending(r) == 0
+
+
+def test_chunks_arriving_during_summary_requeue_the_call(r, streams):
+    publish(r, "c1", ["one"])
+    [(call_id, token)] = streams.claim("worker-1", timeout=1)
+    assert summarize(r, streams, "c1") == ["one"]
+    # The call is still in pending_calls, so this does not queue it again
+    publish(r, "c1", ["two"])
+    assert r.xlen(consumer.SUMMARIZE_STREAM) == 1
+
+    streams.ack(call_id, token)
+    [(call_id, _)] = streams.claim("worker-1", timeout=1)
+    assert call_id == "c1"
+    assert summarize(r, streams, "c1") == ["two"]
+
+
+def test_deferred_entry_stays_pending(r, streams):
+    publish(r, "c1", ["one"])
+    [(call_id, token)] = streams.claim("worker-1", timeout=1)
+    streams.defer(call_id, token)
+    assert pending(r) == 1
+    assert streams.has_new("c1")
+
+
+def test_stream_entries_carry_tier_and_timestamp(r, streams):
+    publish(r, "c1", ["one"], tiers=["fallback"])
+    [(_, fields)] = r.xrange("call:c1:stream")
+    assert fields["text"] == "one" and fields["tier"] == "fallback"
+    assert float(fields["ts"]) > 0
+
+
+def test_list_transport_round_trip(r, monkeypatch):
+    monkeypatch.setattr(producer, "CHUNK_TRANSPORT", "lists")
+    transport = consumer.ListTransport(r)
+    publish(r, "c1", ["one", "two"])
+    [(call_id, token)] = transport.claim("worker-1", timeout=1)
+    assert call_id == "c1"
+    assert summarize(r, transport, "c1") == ["one", "two"]
+    assert not transport.has_new("c1")
+    publish(r, "c1", ["three"])
+    assert transport.read_new("c1") == (["three"], 3)
@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+import pytest
+
+from audio_codecs import PacketDecoder
+from conftest import ROOT, load_module
+
+pytest.importorskip("av")
+encoders = load_module("encoders", os.path.join(ROOT, "whisper_client", "encoders.py"))
+
+
+def tone(seconds=1.0, sample_rate=16000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+
+
+def test_flac_round_trips_losslessly():
+    encoder = encoders.PacketEncoder("flac")
+    decoder = PacketDecoder("flac", extradata=encoder.extradata)
+    pcm = tone()
+    frames = [encoder.encode(pcm[i:i + 8000]) for i in range(0, len(pcm), 8000)]
+    decoded = np.concatenate([decoder.decode(frame) for frame in frames if frame])
+    assert len(decoded) == len(pcm) - len(pcm) % encoder.frame_size
+    assert np.array_equal(np.round(decoded * 32768).astype(np.int16), pcm[:len(decoded)])
+
+
+def test_opus_offer_and_decode():
+    encoder = encoders.PacketEncoder("opus")
+    assert encoder.start_fields()["codecs"] == ["opus", "pcm16"]
+    decoder = PacketDecoder("opus", extradata=encoder.extradata)
+    pcm = tone()
+    decoded = np.concatenate([decoder.decode(encoder.encode(pcm[i:i + 8000])) for i in range(0, len(pcm), 8000)])
+    assert abs(len(decoded) - len(pcm)) < encoder.frame_size * 2
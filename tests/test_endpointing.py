@@ -0,0 +1,67 @@
+import numpy as np
+
+from endpointing import Endpointer, frame_energy_db
+
+SAMPLE_RATE = 16000
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+def speech(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+
+def feed_blocks(endpointer, audio, block=1600):
+    actions = []
+    for i in range(0, len(audio), block):
+        actions.append(endpointer.feed(audio[i:i + block]))
+    return actions
+
+
+def test_frame_energy_db():
+    levels = frame_energy_db(np.concatenate([silence(0.03), np.full(480, 0.5, dtype=np.float32)]), 480)
+    assert levels[0] == -100.0
+    assert abs(levels[1] - 20 * np.log10(0.5)) < 1e-3
+
+
+def test_silence_is_dropped():
+    endpointer = Endpointer()
+    assert set(feed_blocks(endpointer, silence(1.0))) == {"drop"}
+    assert not endpointer.has_speech
+
+
+def test_pause_after_speech_closes_the_window():
+    endpointer = Endpointer(min_silence_ms=500)
+    actions = feed_blocks(endpointer, speech(1.0))
+    assert actions == [None] * len(actions)
+    actions = feed_blocks(endpointer, silence(0.6))
+    # Five 100 ms blocks of pause reach min_silence_ms
+    assert actions[:4] == [None] * 4 and actions[4] == "flush"
+
+
+def test_short_pause_keeps_the_window_open():
+    endpointer = Endpointer(min_silence_ms=500)
+    feed_blocks(endpointer, speech(0.5))
+    assert set(feed_blocks(endpointer, silence(0.3))) == {None}
+    assert set(feed_blocks(endpointer, speech(0.5))) == {None}
+    assert endpointer.trailing_silence == 0
+
+
+def test_long_speech_closes_at_max_segment():
+    endpointer = Endpointer(max_segment_seconds=2.0)
+    actions = feed_blocks(endpointer, speech(3.0))
+    assert actions.index("flush") == 19
+
+
+def test_silence_marker_closes_after_speech():
+    endpointer = Endpointer(min_silence_ms=500)
+    assert endpointer.skip(SAMPLE_RATE) == "drop"
+    feed_blocks(endpointer, speech(0.5))
+    assert endpointer.skip(SAMPLE_RATE // 10) is None
+    assert endpointer.skip(SAMPLE_RATE // 2) == "flush"
+    endpointer.reset()
+    assert not endpointer.has_speech and endpointer.segment_samples == 0
+
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from conftest import SUMMARIZER, load_module  # noqa: E402
+
+generation = load_module("generation", os.path.join(SUMMARIZER, "generation.py"))
+
+PAD = 0
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=96,
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=256,
+    )
+    return transformers.LlamaForCausalLM(config).eval()
+
+
+def prompt(seed, length):
+    g = torch.Generator().manual_seed(seed)
+    return torch.randint(1, 96, (length,), generator=g).tolist()
+
+
+def reference(model, prompt_ids, max_new_tokens, eos=()):
+    """Greedy tokens from model.generate on the prompt alone, without the end token."""
+    with torch.inference_mode():
+        out = model.generate(
+            torch.tensor([prompt_ids]),
+            attention_mask=torch.ones((1, len(prompt_ids)), dtype=torch.long),
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            eos_token_id=list(eos) or None,
+            pad_token_id=PAD,
+        )[0, len(prompt_ids):].tolist()
+    for i, token in enumerate(out):
+        if token in eos:
+            return out[:i]
+    return out
+
+
+def engine(model, eos=(95,)):
+    return generation.GenerationEngine(model, eos_token_ids=list(eos), pad_token_id=PAD, max_batch_size=4)
+
+
+def drive(engine, schedule):
+    """Run the engine loop by hand: schedule maps step number -> requests joining before it."""
+    step = 0
+    with torch.inference_mode():
+        while step in schedule or engine._active or any(s > step for s in schedule):
+            if step in schedule:
+                engine._join(schedule[step])
+            if engine._active:
+                engine._step()
+            step += 1
+
+
+def request(prompt_ids, max_new_tokens):
+    return generation.GenerationRequest(prompt_ids, max_new_tokens, temperature=0.0)
+
+
+def test_staggered_requests_match_generate(model):
+    prompts = [prompt(1, 5), prompt(2, 17), prompt(3, 9), prompt(4, 30)]
+    limits = [12, 20, 6, 15]
+    requests = [request(p, n) for p, n in zip(prompts, limits)]
+    e = engine(model)
+    # Two requests start together; the others join a batch that is already decoding
+    drive(e, {0: requests[:2], 4: requests[2:3], 9: requests[3:]})
+
+    for r, p, n in zip(requests, prompts, limits):
+        assert r.future.result(timeout=0) == reference(model, p, n, eos=(95,))
+    assert e.prefills == 3
+    assert e._active == [] and e._cache is None
+
+
+def test_request_retires_while_others_continue(model):
+    short, long = request(prompt(5, 8), 3), request(prompt(6, 4), 25)
+    e = engine(model)
+    with torch.inference_mode():
+        e._join([short, long])
+        e._step()
+        e._step()
+        assert short.future.done() and not long.future.done()
+        # The finished row and the columns only it used are gone
+        assert e._active == [long]
+        assert e._mask.shape[0] == 1 and bool(e._mask[:, 0].all())
+
+        late = request(prompt(7, 11), 5)
+        e._join([late])
+    drive(e, {})
+    assert short.future.result(timeout=0) == reference(model, prompt(5, 8), 3)
+    assert long.future.result(timeout=0) == reference(model, prompt(6, 4), 25)
+    assert late.future.result(timeout=0) == reference(model, prompt(7, 11), 5)
+
+
+def test_end_token_retires_a_sequence(model):
+    p = prompt(8, 10)
+    free = reference(model, p, 8)
+    eos = free[3]
+    expected = reference(model, p, 8, eos=(eos,))
+    other = prompt(9, 6)
+    a, b = request(p, 8), request(other, 8)
+    e = engine(model, eos=(eos,))
+    drive(e, {0: [a, b]})
+    assert a.future.result(timeout=0) == expected
+    assert len(expected) < 8
+    assert b.future.result(timeout=0) == reference(model, other, 8, eos=(eos,))
+
+
+def test_engine_thread_serves_concurrent_callers(model):
+    e = engine(model)
+    e.start()
+    try:
+        prompts = [prompt(10 + i, 3 + 4 * i) for i in range(6)]
+        futures = [e.submit(p, max_new_tokens=4 + i) for i, p in enumerate(prompts)]
+        results = [f.result(timeout=60) for f in futures]
+    finally:
+        e.stop()
+        e.join(timeout=10)
+    assert results == [reference(model, p, 4 + i, eos=(95,)) for i, p in enumerate(prompts)]
+    assert e.submit([], max_new_tokens=5).result(timeout=0) == []
@@ -0,0 +1,75 @@
+import asyncio
+import re
+
+import app
+from metrics import Histogram, metric, render
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(,|$)')
+
+
+def unescape(value):
+    return re.sub(r'\\(.)', lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+
+def parse(text):
+    """Minimal text exposition parser: {family: {"type", "help", "samples"}}."""
+    assert text.endswith("\n")
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, help = line[7:].split(" ", 1)
+            assert name not in families, f"{name} declared twice"
+            current = families[name] = {"help": help, "samples": []}
+        elif line.startswith("# TYPE "):
+            name, kind = line[7:].split(" ")
+            assert name in families and kind in ("counter", "gauge", "histogram")
+            families[name]["type"] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"bad sample line: {line!r}"
+            name, labels, value = match.groups()
+            assert current is not None and name.startswith(next(reversed(families)))
+            parsed = {}
+            if labels:
+                pos = 0
+                for m in LABEL.finditer(labels):
+                    assert m.start() == pos, f"bad labels: {labels!r}"
+                    parsed[m.group(1)] = unescape(m.group(2))
+                    pos = m.end()
+                assert pos == len(labels), f"bad labels: {labels!r}"
+            current["samples"].append((name, parsed, float(value)))
+    return families
+
+
+def test_label_values_are_escaped():
+    tricky = 'say "hi"\\ \nbye'
+    text = render([metric("test_calls", "gauge", "Calls.", [({"call_id": tricky}, 2), ({"call_id": "b"}, 0.5)])])
+    family = parse(text)["test_calls"]
+    assert family["type"] == "gauge"
+    assert family["samples"] == [("test_calls", {"call_id": tricky}, 2.0), ("test_calls", {"call_id": "b"}, 0.5)]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+    family = parse("\n".join(histogram.render()) + "\n")["test_seconds"]
+    assert family["type"] == "histogram"
+    samples = {(name, labels.get("le")): value for name, labels, value in family["samples"]}
+    assert samples[("test_seconds_bucket", "0.1")] == 1
+    assert samples[("test_seconds_bucket", "1")] == 3
+    assert samples[("test_seconds_bucket", "+Inf")] == 4
+    assert samples[("test_seconds_count", None)] == 4
+    assert abs(samples[("test_seconds_sum", None)] - 4.25) < 1e-6
+
+
+def test_metrics_endpoint_is_valid_exposition():
+    response = asyncio.run(app.metrics())
+    families = parse(response.body.decode())
+    assert "transcriber_decode_seconds" in families
+    assert "process_resident_memory_bytes" in families
+    for name, family in families.items():
+        assert family.get("type"), f"{name} has no TYPE line"
+        assert family["help"], f"{name} has no HELP text"
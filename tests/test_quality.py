@@ -0,0 +1,91 @@
+import pytest
+
+import quality
+from quality import QualityPolicy, Tier
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(quality, "time", clock)
+    return clock
+
+
+def tiers():
+    return [
+        Tier("accurate", "large", beam_size=5, cost=2.0),
+        Tier("standard", "large"),
+        Tier("fast", "small", cost=0.4),
+    ]
+
+
+def test_backed_up_queue_steps_down_one_tier_at_a_time(clock):
+    policy = QualityPolicy(tiers(), initial="accurate")
+    # Not before the down hold has passed
+    assert policy.choose(quality.QUALITY_DOWN_QUEUE).name == "accurate"
+    clock.now += quality.QUALITY_DOWN_HOLD_SECONDS
+    assert policy.choose(quality.QUALITY_DOWN_QUEUE).name == "standard"
+    assert policy.choose(quality.QUALITY_DOWN_QUEUE).name == "standard"
+    clock.now += quality.QUALITY_DOWN_HOLD_SECONDS
+    assert policy.choose(quality.QUALITY_DOWN_QUEUE).name == "fast"
+    clock.now += quality.QUALITY_DOWN_HOLD_SECONDS
+    # Already at the last tier
+    assert policy.choose(quality.QUALITY_DOWN_QUEUE).name == "fast"
+    assert policy.changes == 2
+
+
+def test_busy_worker_steps_down(clock):
+    policy = QualityPolicy(tiers())
+    clock.now += 2
+    policy.record(policy.tier, busy_seconds=1.9, audio_seconds=4)
+    assert policy.choose(0).name == "fast"
+
+
+def test_idle_worker_steps_up_when_the_better_tier_fits(clock):
+    policy = QualityPolicy(tiers())
+    clock.now += quality.QUALITY_HOLD_SECONDS
+    # Busy 10% of the window; twice the cost is still under the threshold
+    policy.record(policy.tier, busy_seconds=0.5, audio_seconds=5)
+    assert policy.choose(1).name == "standard"
+    assert policy.choose(0).name == "accurate"
+
+
+def test_step_up_uses_the_measured_cost_of_the_better_tier(clock):
+    policy = QualityPolicy(tiers())
+    accurate, standard = policy.tiers[0], policy.tiers[1]
+    # Beam search measured at ten times the cost of greedy decoding
+    policy.record(accurate, busy_seconds=5, audio_seconds=5)
+    clock.now += quality.QUALITY_WINDOW_SECONDS + 1
+    policy.record(standard, busy_seconds=0.5, audio_seconds=5)
+    assert policy.rtf(accurate) == pytest.approx(1.0)
+    # 5% busy would fit the estimated cost (2x), but not the measured one (10x)
+    assert policy.choose(0).name == "standard"
+
+
+def test_reset_forgets_warmup_costs(clock):
+    policy = QualityPolicy(tiers())
+    policy.record(policy.tier, busy_seconds=3, audio_seconds=1)
+    policy.reset()
+    assert policy.utilisation() == 0
+    assert policy.rtf(policy.tiers[0]) == 2.0
+    assert policy.stats()["tier_rtf"] == {}
+
+
+def test_unmeasured_tier_is_scaled_from_the_current_one(clock):
+    policy = QualityPolicy(tiers())
+    policy.record(policy.tier, busy_seconds=1, audio_seconds=4)
+    assert policy.rtf(policy.tiers[0]) == pytest.approx(0.5)
+    assert policy.rtf(policy.tiers[2]) == pytest.approx(0.1)
+
+
+def test_requires_a_tier():
+    with pytest.raises(ValueError):
+        QualityPolicy([])
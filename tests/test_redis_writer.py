@@ -0,0 +1,113 @@
+import asyncio
+
+import fakeredis
+import redis
+
+from redis_writer import RedisChunkWriter
+
+
+class FlakyRedis:
+    """Fails the next `failures` pipeline executions with `error`."""
+
+    def __init__(self, server, failures=0, error=redis.ConnectionError("connection reset")):
+        self.r = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        self.failures = failures
+        self.error = error
+        self.attempts = 0
+
+    def pipeline(self, transaction=True):
+        pipe = self.r.pipeline(transaction=transaction)
+        self.attempts += 1
+        if self.failures:
+            self.failures -= 1
+
+            async def fail():
+                raise self.error
+            pipe.execute = fail
+        return pipe
+
+    def __getattr__(self, name):
+        return getattr(self.r, name)
+
+
+def write(client, chunks, **kwargs):
+    async def run():
+        writer = RedisChunkWriter(client, **kwargs)
+        writer.start()
+        for call_id, text in chunks:
+            writer.push(call_id, "42", text)
+        await writer.close()
+        return writer
+    return asyncio.run(run())
+
+
+def test_chunks_are_written_in_order_and_calls_queued_once():
+    server = fakeredis.FakeServer()
+    chunks = [("a", f"a{i}") for i in range(5)] + [("b", "b0"), ("a", "a5"), ("b", "b1")]
+    writer = write(fakeredis.aioredis.FakeRedis(server=server), chunks, max_batch=3)
+
+    r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    assert r.lrange("call:a:chunks", 0, -1) == [f"a{i}" for i in range(6)]
+    assert r.lrange("call:b:chunks", 0, -1) == ["b0", "b1"]
+    assert r.lrange("summarize_queue", 0, -1) == ["a", "b"]
+    assert r.get("call:a:customer_id") == "42"
+    assert writer.chunks_written == 8
+    assert writer.batches_written >= 3
+
+
+def test_blank_chunks_are_not_written():
+    server = fakeredis.FakeServer()
+    writer = write(fakeredis.aioredis.FakeRedis(server=server), [("a", "  "), ("a", " hi ")])
+    r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    assert r.lrange("call:a:chunks", 0, -1) == ["hi"]
+    assert writer.chunks_written == 1
+
+
+def test_failed_batch_is_retried():
+    server = fakeredis.FakeServer()
+    client = FlakyRedis(server, failures=2)
+    writer = write(client, [("a", "one"), ("a", "two")])
+    r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    assert r.lrange("call:a:chunks", 0, -1) == ["one", "two"]
+    assert client.attempts >= 3
+    assert writer.chunks_dropped == 0
+
+
+def test_batch_is_dropped_after_the_last_retry():
+    server = fakeredis.FakeServer()
+    client = FlakyRedis(server, failures=2)
+
+    async def run():
+        writer = RedisChunkWriter(client, max_retries=1)
+        writer.start()
+        writer.push("a", "42", "lost")
+        await asyncio.sleep(0.5)
+        # The writer keeps going after giving up on a batch
+        writer.push("a", "42", "kept")
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    assert r.lrange("call:a:chunks", 0, -1) == ["kept"]
+    assert writer.chunks_dropped == 1
+
+
+def test_command_error_drops_the_batch_without_retrying():
+    server = fakeredis.FakeServer()
+    client = FlakyRedis(server, failures=1, error=redis.ResponseError("OOM command not allowed"))
+
+    async def run():
+        writer = RedisChunkWriter(client)
+        writer.start()
+        writer.push("a", "42", "lost")
+        await writer.flush()
+        writer.push("a", "42", "kept")
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    assert r.lrange("call:a:chunks", 0, -1) == ["kept"]
+    assert writer.chunks_dropped == 1
+    assert client.attempts == 3  # the failed batch once, then "kept" and its summary queueing
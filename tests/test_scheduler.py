@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import scheduler
+
+
+class FakeTokenizer:
+    timestamp_begin = 1000
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def decode(self, tokens):
+        return " ".join(f"w{t}" for t in tokens)
+
+
+class FakeModel:
+    """Stands in for WhisperModel; generate returns the scripted results in order."""
+
+    def __init__(self, results):
+        self.hf_tokenizer = None
+        self.max_length = 448
+        self.results = list(results)
+        self.generated = []
+        self.model = SimpleNamespace(is_multilingual=False, generate=self._generate)
+
+    def feature_extractor(self, window):
+        return np.zeros((80, 3001), dtype=np.float32)
+
+    def get_prompt(self, tokenizer, previous_tokens, without_timestamps):
+        return [1]
+
+    def encode(self, features):
+        return features
+
+    def _generate(self, encoder_output, prompts, **kwargs):
+        self.generated.append(len(prompts))
+        return [self.results.pop(0) for _ in prompts]
+
+
+def result(tokens, score, no_speech_prob):
+    return SimpleNamespace(sequences_ids=[tokens], scores=[score], no_speech_prob=no_speech_prob)
+
+
+@pytest.fixture(autouse=True)
+def fake_tokenizer(monkeypatch):
+    monkeypatch.setattr(scheduler, "Tokenizer", FakeTokenizer)
+    monkeypatch.setattr(scheduler, "get_suppressed_tokens", lambda tokenizer, tokens: ())
+
+
+def window(seconds=1.0):
+    return np.zeros(int(seconds * scheduler.SAMPLE_RATE), dtype=np.float32)
+
+
+def test_decode_batch_returns_one_segment_per_window():
+    model = FakeModel([result([5, 6], -0.2, 0.01), result([7], -0.3, 0.02)])
+    outputs = scheduler.decode_batch(model, [window(1.0), window(2.0)])
+    assert outputs == [[(0.0, 1.0, "w5 w6")], [(0.0, 2.0, "w7")]]
+    assert model.generated == [2]
+
+
+def test_decode_batch_drops_unlikely_no_speech_window():
+    # scores[0] is CTranslate2's per-token average: 4 tokens at -1.5 sum to
+    # -6.0, which over 4 tokens + end-of-text is -1.2, under LOG_PROB_THRESHOLD
+    model = FakeModel([result([5, 6, 7, 8], -1.5, 0.9)])
+    assert scheduler.decode_batch(model, [window()]) == [[]]
+
+
+def test_decode_batch_keeps_confident_text_despite_no_speech_prob():
+    model = FakeModel([result([5, 6, 7, 8], -0.5, 0.9)])
+    assert scheduler.decode_batch(model, [window()]) == [[(0.0, 1.0, "w5 w6 w7 w8")]]
+
+
+def test_decode_batch_skips_vad_windows_without_speech(monkeypatch):
+    monkeypatch.setattr(scheduler, "has_speech", lambda audio: bool(audio.any()))
+    speech = np.full(scheduler.SAMPLE_RATE, 0.1, dtype=np.float32)
+    model = FakeModel([result([5], -0.1, 0.0), result([6], -0.1, 0.0)])
+    outputs = scheduler.decode_batch(
+        model, [window(), speech, window()], vad=[True, True, False]
+    )
+    assert outputs == [[], [(0.0, 1.0, "w5")], [(0.0, 1.0, "w6")]]
+    assert model.generated == [2]
+
+
+def test_decode_batch_decodes_nothing_when_vad_finds_no_speech():
+    model = FakeModel([])
+    assert scheduler.decode_batch(model, [window(), window()], vad=[True, True]) == [[], []]
+    assert model.generated == []
+
+
+def test_split_timestamped():
+    tokens = [1000, 5, 6, 1050, 1050, 7, 1100]
+    segments = scheduler.split_timestamped(FakeTokenizer(), tokens, 3.0)
+    assert segments == [(0.0, 1.0, "w5 w6"), (1.0, 2.0, "w7")]
+
+
+def test_scheduler_batches_windows_from_concurrent_calls(monkeypatch):
+    batches = []
+
+    def decode_batch(model, windows, **kwargs):
+        batches.append(len(windows))
+        return [[(0.0, 0.01, f"call {int(w[0])}")] for w in windows]
+    monkeypatch.setattr(scheduler, "decode_batch", decode_batch)
+
+    worker = scheduler.InferenceScheduler(model=None, max_batch_size=8, max_wait_ms=200)
+    worker.start()
+
+    async def run():
+        windows = [np.full(160, i, dtype=np.float32) for i in range(3)]
+        return await asyncio.gather(*(worker.submit(f"c{i}", w) for i, w in enumerate(windows)))
+
+    try:
+        assert asyncio.run(run()) == [([(0.0, 0.01, f"call {i}")], "standard") for i in range(3)]
+    finally:
+        worker.stop()
+    assert batches == [3]
+    assert worker.stats()["mean_batch_size"] == 3
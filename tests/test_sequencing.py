@@ -0,0 +1,212 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from client import SEQ_HEADER as CLIENT_SEQ_HEADER
+from client import AudioSender, SilenceGate
+from sessions import SEQ_HEADER, Session
+from admission import AdmissionController, InboundQueue
+
+
+def session():
+    return Session("c1", "1", InboundQueue(AdmissionController()))
+
+
+def test_accept_seq_dedupes_resent_messages():
+    s = session()
+    assert s.accept_seq(0, 3) == (0, 0)
+    assert s.accept_seq(3, 2) == (0, 0)
+    # Resent after a reconnect: already received
+    assert s.accept_seq(0, 3) == (3, 0)
+    assert s.accept_seq(3, 2) == (2, 0)
+    assert s.next_seq == 5
+
+
+def test_accept_seq_counts_missing_frames():
+    s = session()
+    s.accept_seq(0, 2)
+    assert s.accept_seq(5, 1) == (0, 3)
+    assert s.next_seq == 6
+
+
+def test_partly_new_message_reports_its_overlap():
+    s = session()
+    s.accept_seq(0, 4)
+    assert s.accept_seq(2, 4) == (2, 0)
+    assert s.next_seq == 6
+
+
+class FakeClient:
+    """The websocket as ws_transcribe sees it, replaying `messages` then disconnecting."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.events = []
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        if not self.messages:
+            return {"type": "websocket.disconnect", "code": 1000}
+        message = self.messages.pop(0)
+        if isinstance(message, bytes):
+            return {"type": "websocket.receive", "bytes": message}
+        return {"type": "websocket.receive", "text": json.dumps(message)}
+
+    async def send_text(self, message):
+        self.events.append(json.loads(message))
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+def queued(monkeypatch, messages):
+    """What ws_transcribe hands the decode loop for a sequenced call."""
+    import app
+    from sessions import SessionManager
+
+    monkeypatch.setattr(app, "sessions", SessionManager())
+    monkeypatch.setattr(app, "resume_points", {})
+    monkeypatch.setitem(app.startup, "ready", True)
+    monkeypatch.setattr(app, "pool", SimpleNamespace(queue_depth=lambda: 0))
+    items = []
+
+    async def drain(websocket, s):
+        while (got := await s.inbound.get(max_bytes=1 << 20)) is not None:
+            items.extend(got)
+
+    async def run():
+        monkeypatch.setattr(app, "run_session", drain)
+        await app.ws_transcribe(FakeClient([{"type": "start", "call_id": "c1", "seq": True}, *messages]))
+        await asyncio.gather(*app.session_tasks)
+
+    asyncio.run(run())
+    return items
+
+
+def frames(seq, values, samples=1600):
+    audio = np.concatenate([block(v, samples) for v in values])
+    return SEQ_HEADER.pack(seq, len(values)) + audio.tobytes()
+
+
+def test_partly_new_message_passes_only_its_new_frames(monkeypatch):
+    items = queued(monkeypatch, [frames(0, [1, 2, 3, 4]), frames(2, [3, 4, 5, 6]), frames(0, [1])])
+    audio = np.frombuffer(b"".join(items), dtype="<i2")
+    assert list(audio[::1600]) == [1, 2, 3, 4, 5, 6]
+
+
+def test_partly_new_compressed_message_is_dropped():
+    import app
+
+    s = session()
+    s.decoder = object()  # packets cannot be cut at frame boundaries
+    missing = app.sequence_stats["missing_frames"]
+    assert app.new_frames(s, b"packets", 2, 4) == b""
+    assert app.sequence_stats["missing_frames"] == missing + 2
+
+
+def test_partly_new_silence_marker_covers_only_its_new_frames(monkeypatch):
+    from admission import Silence
+
+    marker = {"type": "silence", "ms": 400, "seq": 0, "count": 4}
+    items = queued(monkeypatch, [marker, {**marker, "seq": 2}])
+    assert all(isinstance(item, Silence) for item in items)
+    assert [item.samples for item in items] == [6400, 3200]
+
+
+def test_client_and_server_share_the_header():
+    assert CLIENT_SEQ_HEADER.format == SEQ_HEADER.format
+
+
+class FakeWebSocket:
+    def __init__(self, next_seq=0):
+        self.sent = []
+        self.started = {"type": "session_started", "codec": "pcm16", "next_seq": next_seq}
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def recv(self):
+        return json.dumps(self.started)
+
+
+def block(value, samples=1600):
+    return np.full(samples, value, dtype=np.int16)
+
+
+def send_all(sender, websocket):
+    async def run():
+        await sender._start(websocket)
+        sender.close()
+        await sender._send_loop(websocket)
+        sender.closed = False
+    asyncio.run(run())
+
+
+def sent_seqs(websocket):
+    out = []
+    for message in websocket.sent:
+        if isinstance(message, bytes):
+            out.append(SEQ_HEADER.unpack_from(message))
+        elif message.startswith("{") and "seq" in message:
+            data = json.loads(message)
+            if "count" in data:
+                out.append((data["seq"], data["count"]))
+    return out
+
+
+def test_sender_resends_from_the_servers_next_seq():
+    sender = AudioSender("ws://unused", "c1", "1", max_batch_seconds=0.1)
+    first = FakeWebSocket()
+    for i in range(4):
+        sender.offer(block(i))
+    send_all(sender, first)
+    assert sent_seqs(first) == [(0, 1), (1, 1), (2, 1), (3, 1)]
+
+    # The server had frames 0 and 1 when the connection dropped
+    second = FakeWebSocket(next_seq=2)
+    sender.offer(block(4))
+    send_all(sender, second)
+    assert sent_seqs(second) == [(2, 1), (3, 1), (4, 1)]
+    assert sender.frames_resent == 2
+    assert sender.frames_lost == 0
+    resent = np.frombuffer(second.sent[1][SEQ_HEADER.size:], dtype="<i2")
+    assert (resent == 2).all()
+
+
+def test_sender_counts_frames_past_the_replay_window_as_lost():
+    sender = AudioSender("ws://unused", "c1", "1", max_batch_seconds=0.1, replay_seconds=0.2)
+    first = FakeWebSocket()
+    for i in range(4):
+        sender.offer(block(i))
+    send_all(sender, first)
+
+    second = FakeWebSocket(next_seq=0)
+    send_all(sender, second)
+    # Only the last 0.2 s (two frames) were kept for replay
+    assert sent_seqs(second) == [(2, 1), (3, 1)]
+    assert sender.frames_lost == 2
+
+
+def test_sender_skips_ahead_of_a_server_with_a_longer_call():
+    sender = AudioSender("ws://unused", "c1", "1")
+    websocket = FakeWebSocket(next_seq=100)
+    sender.offer(block(1))
+    send_all(sender, websocket)
+    assert sent_seqs(websocket) == [(100, 1)]
+
+
+def test_silence_markers_take_sequence_numbers():
+    gate = SilenceGate(hangover_seconds=0)
+    sender = AudioSender("ws://unused", "c1", "1", silence_gate=gate, max_batch_seconds=0.1)
+    websocket = FakeWebSocket()
+    sender.offer(block(1000))
+    sender.offer(block(0))
+    sender.offer(block(0))
+    sender.offer(block(1000))
+    send_all(sender, websocket)
+    # Consecutive markers go out as one message covering both frames
+    assert sent_seqs(websocket) == [(0, 1), (1, 2), (3, 1)]
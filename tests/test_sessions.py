@@ -0,0 +1,176 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+import redis
+
+from admission import AdmissionController, InboundQueue
+from sessions import Session, SessionManager
+
+
+def session(call_id="c1", reserved=0):
+    s = Session(call_id, "1", InboundQueue(AdmissionController()))
+    s.reserved_bytes = reserved
+    return s
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.closed = None
+
+    async def close(self, code=1000, reason=""):
+        self.closed = (code, reason)
+
+
+def test_new_sessions_fit_under_the_byte_cap():
+    manager = SessionManager(max_buffer_bytes=1000)
+    assert manager.has_room(600)
+    manager.add(session("a", reserved=600))
+    assert manager.has_room(400)
+    assert not manager.has_room(401)
+    assert manager.buffer_rejections == 1
+    manager.add(session("b", reserved=400))
+    assert manager.reserved_bytes() == 1000
+
+
+def test_no_cap_admits_everything():
+    manager = SessionManager(max_buffer_bytes=0)
+    manager.add(session("a", reserved=10**12))
+    assert manager.has_room(10**12)
+
+
+def test_replaced_session_stays_counted_until_removed():
+    manager = SessionManager(max_buffer_bytes=1000)
+    old, new = session("a", reserved=500), session("a", reserved=500)
+    manager.add(old)
+    assert manager.add(new) is old
+    assert len(manager) == 1
+    assert manager.get("a") is new
+    assert not manager.is_current(old) and manager.is_current(new)
+    # The old decode loop still holds its buffers
+    assert manager.reserved_bytes() == 1000
+    assert not manager.has_room(1)
+
+    # Removing the replaced session leaves the live one alone
+    assert manager.remove(old) is False
+    assert manager.get("a") is new
+    assert manager.reserved_bytes() == 500
+    assert manager.remove(new) is True
+    assert len(manager) == 0 and manager.running() == []
+
+
+def test_idle_connections_are_closed():
+    manager = SessionManager(idle_seconds=60)
+    idle, active, gone = session("idle"), session("active"), session("gone")
+    for s in (idle, active, gone):
+        s.websocket = FakeWebSocket()
+        manager.add(s)
+    idle.last_activity = time.monotonic() - 61
+    gone.last_activity = time.monotonic() - 61
+    gone.connected = False
+
+    assert asyncio.run(manager.evict_idle()) == 1
+    assert idle.websocket.closed == (1001, "Idle timeout")
+    assert not idle.connected
+    assert active.websocket.closed is None and active.connected
+    assert gone.websocket.closed is None
+    assert manager.idle_evictions == 1
+    # Closing the connection ends the call as usual; the session stays until its loop ends
+    assert manager.get("idle") is idle
+    assert asyncio.run(manager.evict_idle()) == 0
+
+
+def test_traffic_resets_the_idle_clock():
+    s = session()
+    s.last_activity = time.monotonic() - 30
+    s.touch(100)
+    assert s.idle_seconds() < 1
+    assert s.bytes_in == 100 and s.messages_in == 1
+
+
+class FakeClient:
+    """The websocket as ws_transcribe sees it: one start message, then a disconnect."""
+
+    def __init__(self, start):
+        self.messages = [{"type": "websocket.receive", "text": json.dumps(start)}]
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        if self.messages:
+            return self.messages.pop(0)
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def close(self, code=1000, reason=""):
+        self.closed = (code, reason)
+
+
+class FailingRedis:
+    async def set(self, key, value):
+        raise redis.exceptions.ConnectionError("Redis is down")
+
+
+def test_failed_start_leaves_no_session_behind(monkeypatch):
+    import app
+
+    manager = SessionManager()
+    monkeypatch.setattr(app, "sessions", manager)
+    monkeypatch.setitem(app.startup, "ready", True)
+    monkeypatch.setattr(app, "pool", SimpleNamespace(queue_depth=lambda: 0))
+    monkeypatch.setattr(app, "retranscriber", object())
+    monkeypatch.setattr(app, "redis_client", FailingRedis())
+    admitted = app.admission.sessions
+
+    with pytest.raises(redis.exceptions.ConnectionError):
+        asyncio.run(app.ws_transcribe(FakeClient({"type": "start", "call_id": "c1"})))
+    assert len(manager) == 0 and manager.running() == []
+    assert manager.reserved_bytes() == 0
+    assert app.admission.sessions == admitted
+
+
+class FakePool:
+    def __init__(self):
+        self.released = []
+
+    def release(self, call_id):
+        self.released.append(call_id)
+
+
+def finish(app, s):
+    """run_session for a call whose connection already closed with nothing queued."""
+    s.inbound.close()
+    asyncio.run(app.run_session(None, s))
+
+
+def test_replaced_session_keeps_the_calls_worker(monkeypatch):
+    import app
+
+    async def finalize(s):
+        pass
+    manager, pool = SessionManager(), FakePool()
+    monkeypatch.setattr(app, "sessions", manager)
+    monkeypatch.setattr(app, "pool", pool)
+    monkeypatch.setattr(app, "finalize_session", finalize)
+
+    old, new = session("c1"), session("c1")
+    manager.add(old)
+    manager.add(new)
+    # The old connection's loop ends while the reconnected one still decodes
+    finish(app, old)
+    assert pool.released == []
+    assert manager.get("c1") is new
+    finish(app, new)
+    assert pool.released == ["c1"]
+
+    # The other way round: the replaced loop outlives the live one and
+    # may have pinned the call again, so it releases too
+    old, new = session("c2"), session("c2")
+    manager.add(old)
+    manager.add(new)
+    finish(app, new)
+    finish(app, old)
+    assert pool.released == ["c1", "c2", "c2"]
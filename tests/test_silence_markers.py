@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import app
+from admission import AdmissionController, InboundQueue
+from sessions import Session
+
+
+class FakePool:
+    def __init__(self):
+        self.windows = []
+
+    async def submit(self, call_id, audio, timestamps=False, vad=False, tier=None):
+        self.windows.append(len(audio))
+        return [(0.0, len(audio) / app.SAMPLE_RATE, "hello")], "standard"
+
+
+class FakeWriter:
+    def __init__(self):
+        self.pushed = []
+
+    def push(self, call_id, customer_id, text, tier=None, speaker=None):
+        self.pushed.append(text)
+
+
+class FakeWebSocket:
+    async def send_text(self, message):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(app, "pool", pool)
+    monkeypatch.setattr(app, "redis_writer", FakeWriter())
+    return pool
+
+
+def speech(seconds):
+    t = np.arange(int(seconds * app.SAMPLE_RATE)) / app.SAMPLE_RATE
+    return (8000 * np.sin(2 * np.pi * 200 * t)).astype("<i2").tobytes()
+
+
+def run(session, *steps):
+    async def go():
+        websocket = FakeWebSocket()
+        for step in steps:
+            if isinstance(step, bytes):
+                await app.process_audio(websocket, session, step)
+            else:
+                await app.skip_silence(websocket, session, session.channels[0], step)
+    asyncio.run(go())
+
+
+def new_session():
+    return Session("c1", "1", InboundQueue(AdmissionController()))
+
+
+def test_marker_closes_the_open_segment_without_buffering(pool, monkeypatch):
+    monkeypatch.setattr(app, "ENDPOINTING", True)
+    session = new_session()
+    run(session, speech(1.0))
+    buf = session.channels[0].buf
+    assert pool.windows == [] and len(buf) == app.SAMPLE_RATE
+
+    run(session, app.SAMPLE_RATE)
+    # The window is decoded as it was; the gap is not appended to it
+    assert pool.windows == [app.SAMPLE_RATE]
+    assert len(buf) == 0
+    assert buf.total_written == 2 * app.SAMPLE_RATE
+
+
+def test_short_marker_keeps_the_segment_open(pool, monkeypatch):
+    monkeypatch.setattr(app, "ENDPOINTING", True)
+    session = new_session()
+    run(session, speech(1.0), app.SAMPLE_RATE // 10)
+    buf = session.channels[0].buf
+    assert pool.windows == []
+    assert len(buf) == app.SAMPLE_RATE
+    assert buf.total_written == app.SAMPLE_RATE + app.SAMPLE_RATE // 10
+
+
+def test_marker_after_silence_drops_the_preroll(pool, monkeypatch):
+    monkeypatch.setattr(app, "ENDPOINTING", True)
+    session = new_session()
+    run(session, bytes(3200), 5 * app.SAMPLE_RATE)
+    buf = session.channels[0].buf
+    assert pool.windows == []
+    assert len(buf) == 0
+    assert buf.total_written == 1600 + 5 * app.SAMPLE_RATE
+
+
+def test_marker_flushes_the_window_without_endpointing(pool, monkeypatch):
+    monkeypatch.setattr(app, "ENDPOINTING", False)
+    session = new_session()
+    run(session, speech(0.5), app.SAMPLE_RATE // 10)
+    assert pool.windows == [app.SAMPLE_RATE // 2]
+    buf = session.channels[0].buf
+    assert len(buf) == 0
+    assert buf.total_written == app.SAMPLE_RATE // 2 + app.SAMPLE_RATE // 10
@@ -0,0 +1,79 @@
+import numpy as np
+
+from audio import float32_to_pcm16, pcm16_to_float32
+from spool import AudioSpool
+
+
+def test_float32_round_trips_through_pcm16():
+    pcm = np.arange(-32768, 32768, dtype="<i2")
+    assert np.array_equal(float32_to_pcm16(pcm16_to_float32(pcm.tobytes())), pcm)
+
+
+def test_spool_round_trips_float32(tmp_path):
+    pcm = np.arange(-32768, 32768, 7, dtype="<i2")
+    samples = pcm16_to_float32(pcm.tobytes())
+    spool = AudioSpool(str(tmp_path / "call.pcm"), grow_samples=1000)
+    spool.write_float32(samples[:5000])
+    spool.write_pcm16(pcm[5000:].tobytes())
+    spool.close()
+    assert spool.samples == len(pcm)
+    assert np.array_equal(spool.read_float32(), samples)
+
+
+def test_spool_grows_and_reads_back(tmp_path):
+    pcm = np.arange(-32768, 32768, 7, dtype="<i2")
+    spool = AudioSpool(str(tmp_path / "call.pcm"), grow_samples=1000)
+    for start in range(0, len(pcm), 777):
+        assert spool.write_pcm16(pcm[start:start + 777].tobytes()) == len(pcm[start:start + 777])
+    spool.close()
+    assert spool.samples == len(pcm)
+    assert spool.seconds == len(pcm) / 16000
+    assert np.array_equal(spool.read_float32(), pcm16_to_float32(pcm.tobytes()))
+
+
+def test_reconnected_call_appends_to_its_spool(tmp_path):
+    path = str(tmp_path / "call.pcm")
+    first = AudioSpool(path, grow_samples=16000)
+    first.write_pcm16(np.arange(100, dtype="<i2").tobytes())
+    first.close()
+
+    resumed = AudioSpool(path, grow_samples=16000)
+    assert resumed.samples == 100
+    resumed.write_pcm16(np.arange(100, 150, dtype="<i2").tobytes())
+    resumed.close()
+    expected = pcm16_to_float32(np.arange(150, dtype="<i2").tobytes())
+    assert np.array_equal(resumed.read_float32(), expected)
+
+
+def test_empty_spool_and_delete(tmp_path):
+    path = tmp_path / "call.pcm"
+    spool = AudioSpool(str(path))
+    spool.close()
+    assert spool.read_float32().size == 0
+    spool.delete()
+    assert not path.exists()
+    spool.delete()
+
+
+def test_reopened_spool_ignores_preallocated_padding(tmp_path):
+    path = str(tmp_path / "call.pcm")
+    first = AudioSpool(path, grow_samples=16000)
+    first.write_pcm16(np.arange(100, dtype="<i2").tobytes())
+    # Never closed, as if the process died: the file still holds its padding
+    first._release()
+    assert AudioSpool(path).samples == 100
+
+    resumed = AudioSpool(path, grow_samples=16000)
+    resumed.write_pcm16(np.arange(100, 150, dtype="<i2").tobytes())
+    resumed.close()
+    assert np.array_equal(float32_to_pcm16(resumed.read_float32()), np.arange(150, dtype="<i2"))
+
+
+def test_spool_keeps_appending_after_close(tmp_path):
+    spool = AudioSpool(str(tmp_path / "call.pcm"), grow_samples=10)
+    spool.write_pcm16(np.arange(5, dtype="<i2").tobytes())
+    spool.close()
+    spool.write_pcm16(np.arange(5, 30, dtype="<i2").tobytes())
+    spool.close()
+    assert spool.samples == 30
+    assert np.array_equal(float32_to_pcm16(spool.read_float32()), np.arange(30, dtype="<i2"))
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import app
+from admission import AdmissionController, InboundQueue
+from sessions import Session
+
+
+class FakePool:
+    """Transcribes each window as the side of the call it came from."""
+
+    def __init__(self):
+        self.windows = []
+
+    async def submit(self, call_id, audio, timestamps=False, vad=False, tier=None):
+        self.windows.append(audio.copy())
+        text = "left side" if audio.mean() > 0 else "right side"
+        return [(0.0, len(audio) / app.SAMPLE_RATE, text)], "standard"
+
+
+class FakeWriter:
+    def __init__(self):
+        self.pushed = []
+
+    def push(self, call_id, customer_id, text, tier=None, speaker=None):
+        self.pushed.append((text, tier, speaker))
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.events = []
+
+    async def send_text(self, message):
+        self.events.append(json.loads(message))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(app, "pool", pool)
+    monkeypatch.setattr(app, "ENDPOINTING", False)
+    return pool
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = FakeWriter()
+    monkeypatch.setattr(app, "redis_writer", writer)
+    return writer
+
+
+def stereo_session():
+    return Session("c1", "1", InboundQueue(AdmissionController()), speakers=["agent", "customer"])
+
+
+def interleaved(seconds, left=8192, right=-8192):
+    frames = np.empty((int(seconds * app.SAMPLE_RATE), 2), dtype="<i2")
+    frames[:, 0] = left
+    frames[:, 1] = right
+    return frames.tobytes()
+
+
+def test_interleaved_frames_are_split_per_channel(pool, writer):
+    session = stereo_session()
+    asyncio.run(app.process_audio(FakeWebSocket(), session, interleaved(1)))
+    agent, customer = session.channels
+    assert len(agent.buf) == len(customer.buf) == app.SAMPLE_RATE
+    assert np.allclose(agent.buf.view(), 0.25)
+    assert np.allclose(customer.buf.view(), -0.25)
+    assert pool.windows == []
+
+
+def test_each_channel_is_decoded_and_labelled(pool, writer):
+    session = stereo_session()
+    websocket = FakeWebSocket()
+    asyncio.run(app.process_audio(websocket, session, interleaved(app.BUFFER_SECONDS)))
+
+    assert len(pool.windows) == 2
+    assert sorted(writer.pushed) == [
+        ("Agent: left side", "standard", "agent"),
+        ("Customer: right side", "standard", "customer"),
+    ]
+    speakers = {e["speaker"]: e["transcript_chunk"] for e in websocket.events}
+    assert speakers == {"agent": "left side", "customer": "right side"}
+    assert all(len(channel.buf) == 0 for channel in session.channels)
+
+
+def test_mono_chunks_are_not_labelled(pool, writer):
+    session = Session("c1", "1", InboundQueue(AdmissionController()))
+    websocket = FakeWebSocket()
+    payload = np.full(app.BUFFER_SECONDS * app.SAMPLE_RATE, 8192, dtype="<i2").tobytes()
+    asyncio.run(app.process_audio(websocket, session, payload))
+    assert writer.pushed == [("left side", "standard", None)]
+    assert "speaker" not in websocket.events[0]
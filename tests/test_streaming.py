@@ -0,0 +1,75 @@
+from streaming import LocalAgreement, common_prefix_length
+
+
+def seg(*texts, length=1.0):
+    return [(i * length, (i + 1) * length, text) for i, text in enumerate(texts)]
+
+
+def test_prefix_ignores_case_and_punctuation():
+    assert common_prefix_length(["Hello,", "there"], ["hello", "there."]) == 2
+    assert common_prefix_length(["hello", "there"], ["hello", "where"]) == 1
+
+
+def test_only_the_agreed_prefix_is_committed():
+    agreement = LocalAgreement()
+    committed, interim, _ = agreement.update(seg("I want to"))
+    assert committed == [] and interim == ["I", "want", "to"]
+
+    committed, interim, _ = agreement.update(seg("I want two cards"))
+    assert committed == ["I", "want"]
+    assert interim == ["two", "cards"]
+
+    committed, interim, _ = agreement.update(seg("I want two cards please"))
+    assert committed == ["two", "cards"]
+    assert interim == ["please"]
+
+
+def test_committed_segments_are_trimmed_and_the_next_window_realigns():
+    agreement = LocalAgreement()
+    segments = seg("hello there", "how are", "you")
+    agreement.update(segments)
+    committed, interim, trim = agreement.update(segments)
+    assert committed == ["hello", "there", "how", "are", "you"]
+    # The last segment stays as left context
+    assert trim == 2.0
+
+    # The caller drops two seconds; the next window starts at "you"
+    committed, interim, trim = agreement.update(seg("you", "doing today"))
+    assert committed == []
+    assert interim == ["doing", "today"]
+    # "you" is committed and no longer the last segment
+    assert trim == 1.0
+    committed, _, trim = agreement.update(seg("doing today"))
+    assert committed == ["doing", "today"]
+    assert trim == 0.0
+
+
+def test_final_flushes_pending_words_and_resets():
+    agreement = LocalAgreement()
+    agreement.update(seg("thanks for"))
+    committed, interim, trim = agreement.update(seg("thanks for calling"), final=True)
+    assert committed == ["thanks", "for", "calling"]
+    assert interim == [] and trim is None
+    assert agreement.committed == [] and agreement.previous == []
+
+    # A new window starts from nothing
+    committed, _, _ = agreement.update(seg("hello"))
+    assert committed == []
+
+
+def test_regressed_hypothesis_does_not_re_emit_words():
+    agreement = LocalAgreement()
+    agreement.update(seg("my card was declined"))
+    committed, _, _ = agreement.update(seg("my card was declined"))
+    assert committed == ["my", "card", "was", "declined"]
+
+    # The next decode drops the last words it had agreed on
+    committed, interim, _ = agreement.update(seg("my card"))
+    assert committed == [] and interim == []
+    committed, _, _ = agreement.update(seg("my card was declined today"))
+    assert committed == []
+    committed, _, _ = agreement.update(seg("my card was declined today"))
+    assert committed == ["today"]
+
+    committed, _, _ = agreement.update(seg("my card"), final=True)
+    assert committed == []
@@ -0,0 +1,99 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from telephony import TABLES, PcmConverter, PolyphaseResampler
+
+
+def pcm16(table, codes):
+    return [int(v) for v in np.round(table[codes] * 32768)]
+
+
+def test_mulaw_code_points():
+    table = TABLES["mulaw"]
+    # 0xFF and 0x7F are the positive and negative zero
+    assert pcm16(table, [0xFF, 0x7F]) == [0, 0]
+    assert pcm16(table, [0x80, 0x00]) == [32124, -32124]
+    assert pcm16(table, [0xFE, 0x7E]) == [8, -8]
+
+
+def test_alaw_code_points():
+    table = TABLES["alaw"]
+    # 0xD5 and 0x55 are the smallest positive and negative steps
+    assert pcm16(table, [0xD5, 0x55]) == [8, -8]
+    assert pcm16(table, [0xAA, 0x2A]) == [32256, -32256]
+
+
+def test_tables_match_audioop():
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        audioop = pytest.importorskip("audioop")  # removed in Python 3.13
+    codes = bytes(range(256))
+    for name, decode in (("mulaw", audioop.ulaw2lin), ("alaw", audioop.alaw2lin)):
+        expected = np.frombuffer(decode(codes, 2), dtype="<i2").tolist()
+        assert pcm16(TABLES[name], list(range(256))) == expected
+
+
+def tone(rate, seconds=0.5, freq=440.0):
+    t = np.arange(int(rate * seconds)) / rate
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def test_upsampling_doubles_the_length():
+    resampler = PolyphaseResampler(8000, 16000)
+    assert len(resampler.process(tone(8000))) == 8000
+    assert len(resampler.process(np.zeros(160, dtype=np.float32))) == 320
+
+
+@pytest.mark.parametrize("rate", [8000, 11025, 22050, 44100, 48000])
+def test_blocks_resample_like_one_call(rate):
+    signal = tone(rate)
+    whole = PolyphaseResampler(rate, 16000).process(signal)
+
+    resampler = PolyphaseResampler(rate, 16000)
+    parts = []
+    pos = 0
+    sizes = [1, 7, 160, 333, 1000]
+    i = 0
+    while pos < len(signal):
+        block = signal[pos:pos + sizes[i % len(sizes)]]
+        expected = resampler.output_samples(len(block))
+        parts.append(resampler.process(block))
+        assert len(parts[-1]) == expected
+        pos += len(block)
+        i += 1
+    blockwise = np.concatenate(parts)
+    assert len(blockwise) == len(whole)
+    np.testing.assert_allclose(blockwise, whole, atol=1e-5)
+    # About 0.5 s at 16 kHz
+    assert abs(len(whole) - 8000) <= 1
+
+
+def test_resampled_tone_keeps_its_frequency():
+    out = PolyphaseResampler(8000, 16000).process(tone(8000, seconds=1.0))
+    spectrum = np.abs(np.fft.rfft(out[1000:]))
+    peak = np.argmax(spectrum) * 16000 / len(out[1000:])
+    assert abs(peak - 440) < 2
+    assert abs(np.abs(out[1000:]).max() - 0.5) < 0.02
+
+
+def test_converter_splits_channels_and_resamples():
+    converter = PcmConverter("mulaw", 8000, channels=2)
+    assert converter.frame_bytes == 2
+    payload = bytes([0x80, 0x00]) * 160
+    left, right = converter.convert(payload)
+    assert len(left) == len(right) == 320
+    assert left[-1] > 0.9 and right[-1] < -0.9
+
+
+def test_converter_passes_16k_pcm_through():
+    converter = PcmConverter("pcm16", 16000)
+    (samples,) = converter.convert(np.array([16384, -16384], dtype="<i2").tobytes())
+    assert samples.tolist() == [0.5, -0.5]
+
+
+@pytest.mark.parametrize("encoding, rate", [("opus", 8000), ("ulaw", 8000), ("mulaw", 4000), ("pcm16", 96000)])
+def test_unsupported_formats_are_rejected(encoding, rate):
+    with pytest.raises(ValueError):
+        PcmConverter(encoding, rate)
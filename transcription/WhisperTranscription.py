@@ -2,87 +2,191 @@
 # brew install pkg-config
 # pip install faster-whisper
 # pip install sounddevice numpy
+#
+# Microphone:  python WhisperTranscription.py
+# Audio file:  python WhisperTranscription.py --file audio.mp3
 
-import sounddevice as sd
-import numpy as np
+import argparse
 import queue
 import threading
+import time
+
+import numpy as np
 from faster_whisper import WhisperModel
 
 # Settings
-samplerate = 16000
-block_duration = 0.5  # seconds
-chunk_duration = 5    # seconds 
-channels = 1
-
-frames_per_block = int(samplerate * block_duration)
-frames_per_chunk = int(samplerate * chunk_duration)
-
-audio_queue = queue.Queue()
-audio_buffer = []
-
-# Model setup: medium.en + float16 (optimized for 3080)
-# NOTE: Changed device to "cpu" for Mac compatibility
-model = WhisperModel("small.en", device="cpu", compute_type="int8")
-
-def audio_callback(indata, frames, time, status):
-    if status:
-        print(status)
-    audio_queue.put(indata.copy())
-
-def recorder():
-    with sd.InputStream(samplerate=samplerate, channels=channels, 
-                        callback=audio_callback, blocksize=frames_per_block):
-        print("🎤 Listening... Press Ctrl+C to stop.")
+SAMPLE_RATE = 16000
+BLOCK_DURATION = 0.5  # seconds per audio callback
+CHUNK_DURATION = 5    # seconds per transcription
+# Audio the callback may queue while the model is busy before the oldest
+# blocks are dropped; the callback itself never waits.
+QUEUE_SECONDS = 30
+
+# Model setup: small.en + int8 runs on laptop CPUs (medium.en + float16 on a 3080)
+MODEL_SIZE = "small.en"
+DEVICE = "cpu"
+COMPUTE_TYPE = "int8"
+
+
+class ChunkBuffer:
+    """
+    Preallocated float32 buffer that collects blocks into fixed-size chunks.
+
+    `write` copies a block in and yields a view of every chunk it completes;
+    samples past the end of a chunk are carried over to the next one rather
+    than dropped. A yielded view is only valid until the next write, so it
+    must be transcribed (segments consumed) before then.
+    """
+
+    def __init__(self, chunk_samples: int):
+        self._data = np.zeros(chunk_samples, dtype=np.float32)
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return self._pos
+
+    def write(self, block: np.ndarray):
+        size = len(self._data)
+        while len(block):
+            n = min(size - self._pos, len(block))
+            self._data[self._pos:self._pos + n] = block[:n]
+            self._pos += n
+            block = block[n:]
+            if self._pos == size:
+                self._pos = 0
+                yield self._data
+
+    def flush(self) -> np.ndarray:
+        """The partial chunk left over, as a view."""
+        tail = self._data[:self._pos]
+        self._pos = 0
+        return tail
+
+
+class Transcriber(threading.Thread):
+    """
+    Consumer thread: drains the block queue into a ChunkBuffer and
+    transcribes every completed chunk.
+    """
+
+    def __init__(self, model: WhisperModel, chunk_samples: int, beam_size: int = 1, queue_blocks: int = 0):
+        super().__init__(daemon=True)
+        self.model = model
+        self.beam_size = beam_size
+        self.buffer = ChunkBuffer(chunk_samples)
+        self.blocks = queue.Queue(maxsize=queue_blocks)
+        self.blocks_dropped = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    def offer(self, block: np.ndarray):
+        """Queue a block without blocking; drops the oldest one when full."""
         while True:
-            sd.sleep(100)
-
-def transcriber():
-    global audio_buffer
-    while True:
-        block = audio_queue.get()
-        audio_buffer.append(block)
-
-        total_frames = sum(len(b) for b in audio_buffer)
-        if total_frames >= frames_per_chunk:
-            audio_data = np.concatenate(audio_buffer)[:frames_per_chunk]
-            audio_buffer = [] # Clear buffer
-
-            audio_data = audio_data.flatten().astype(np.float32)
-
-            # Transcription without timestamps
-            segments, _ = model.transcribe(
-                audio_data,
-                language="en",
-                beam_size=1 # Max speed
-            )
-
-            for segment in segments:
-                print(f"{segment.text}") # Just print text, no timestamps
-
-# Start threads
-threading.Thread(target=recorder, daemon=True).start()
-transcriber()
-
-
-############################################### if converting from audio file (not microphone) #####################
-# # pip install faster-whisper
-
-# from faster_whisper import WhisperModel
-
-# model_size = "small.en" #"large-v3" # "medium.en"
-
-# # Run on GPU with FP16
-# model = WhisperModel(model_size, device="cpu", compute_type="float16") #device="cuda"
-
-# # or run on GPU with INT8
-# # model = WhisperModel(model_size, device="cuda", compute_type="int8_float16")
-# # or run on CPU with INT8
-# # model = WhisperModel(model_size, device="cpu", compute_type="int8")
-
-# segments, info = model.transcribe("audio.mp3", beam_size=5) #language = "en"
-
-# # print("Detected language '%s' with probability %f" % (info.language, info.language_probability))
-
-# for segment in segments:
-#     print("[%.2fs -> %.2fs] %s" % (segment.start, segment.end, segment.text))
+            try:
+                self.blocks.put_nowait(block)
+                return
+            except queue.Full:
+                try:
+                    self.blocks.get_nowait()
+                    self.blocks_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def close(self):
+        """Transcribe what is queued and buffered, then stop."""
+        self.blocks.put(None)
+
+    def run(self):
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            for chunk in self.buffer.write(block):
+                self.transcribe(chunk)
+        if len(self.buffer):
+            self.transcribe(self.buffer.flush())
+
+    def transcribe(self, audio: np.ndarray):
+        start = time.perf_counter()
+        # Transcription without timestamps
+        segments, _ = self.model.transcribe(
+            audio,
+            language="en",
+            beam_size=self.beam_size,
+        )
+        for segment in segments:
+            print(f"{segment.text}", flush=True)  # Just print text, no timestamps
+        self.busy_seconds += time.perf_counter() - start
+        self.audio_seconds += len(audio) / SAMPLE_RATE
+
+
+def transcribe_microphone(transcriber: Transcriber, block_samples: int):
+    import sounddevice as sd
+
+    def audio_callback(indata, frames, time_, status):
+        if status:
+            print(status)
+        # The copy is required: sounddevice reuses indata after returning
+        transcriber.offer(indata[:, 0].copy())
+
+    transcriber.start()
+    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype="float32",
+                        callback=audio_callback, blocksize=block_samples):
+        print("🎤 Listening... Press Ctrl+C to stop.")
+        try:
+            while True:
+                sd.sleep(100)
+        except KeyboardInterrupt:
+            pass
+    transcriber.close()
+    transcriber.join()
+    if transcriber.blocks_dropped:
+        print(f"Dropped {transcriber.blocks_dropped} blocks while the model was busy")
+
+
+def transcribe_file(transcriber: Transcriber, path: str, block_samples: int):
+    """Feed a file through the same pipeline as fast as the model allows and report its real-time factor."""
+    from faster_whisper import decode_audio
+
+    audio = decode_audio(path, sampling_rate=SAMPLE_RATE)
+    start = time.perf_counter()
+    transcriber.start()
+    for i in range(0, len(audio), block_samples):
+        transcriber.blocks.put(audio[i:i + block_samples])  # waits rather than drops
+    transcriber.close()
+    transcriber.join()
+    elapsed = time.perf_counter() - start
+
+    duration = len(audio) / SAMPLE_RATE
+    print(
+        f"\n{duration:.1f}s of audio in {elapsed:.1f}s: real-time factor {elapsed / max(duration, 1e-9):.3f}"
+        f" (model {transcriber.busy_seconds / max(transcriber.audio_seconds, 1e-9):.3f})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe the microphone, or an audio file, with faster-whisper")
+    parser.add_argument("--file", help="Transcribe this audio file instead of the microphone")
+    parser.add_argument("--model", default=MODEL_SIZE, help="Whisper model size, e.g. small.en, medium.en, large-v3")
+    parser.add_argument("--device", default=DEVICE, help="cpu or cuda")
+    parser.add_argument("--compute-type", default=COMPUTE_TYPE, help="int8, int8_float16, float16, ...")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_DURATION, help="Audio per transcription")
+    parser.add_argument("--beam-size", type=int, default=1, help="1 = greedy, fastest")
+    args = parser.parse_args()
+
+    model = WhisperModel(args.model, device=args.device, compute_type=args.compute_type)
+    block_samples = int(SAMPLE_RATE * BLOCK_DURATION)
+    transcriber = Transcriber(
+        model,
+        chunk_samples=int(SAMPLE_RATE * args.chunk_seconds),
+        beam_size=args.beam_size,
+        queue_blocks=int(QUEUE_SECONDS / BLOCK_DURATION),
+    )
+    if args.file:
+        transcribe_file(transcriber, args.file, block_samples)
+    else:
+        transcribe_microphone(transcriber, block_samples)
+
+
+if __name__ == "__main__":
+    main()
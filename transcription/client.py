@@ -1,14 +1,30 @@
 import asyncio
 import json
+import os
+import sys
 import sounddevice as sd
 import numpy as np
 import websockets
 
+# The Opus/FLAC encoder is shared with whisper_client
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "whisper_client"))
+from encoders import PacketEncoder
+
 SAMPLE_RATE = 16000
 CHUNK_DURATION = 0.5  # seconds
 CHUNK_SAMPLES = int(SAMPLE_RATE * CHUNK_DURATION)
 
 CALL_ID = "demo-call-001"
+CUSTOMER_ID = "1"
+
+# True: send a start handshake then raw int16 PCM binary frames
+# (understood by services/transcriber /ws/transcribe).
+# False: legacy JSON frames with hex-encoded audio.
+USE_BINARY_FRAMES = False
+
+# With binary frames: "opus" (~24 kbps, a tenth of raw PCM), "flac"
+# (lossless, about half) or "pcm16". Compression needs PyAV (`pip install av`).
+CODEC = "opus"
 
 # >>>>>>> REPLACE THIS with ngrok websocket URL <<<<<<<
 WS_URL = "wss://unepic-unmerchandised-katie.ngrok-free.dev/ws"  # example
@@ -18,6 +34,24 @@ async def stream_microphone():
     async with websockets.connect(WS_URL) as websocket:
         print("Connected to server:", WS_URL)
 
+        encoder = None
+        if USE_BINARY_FRAMES:
+            start = {
+                "type": "start",
+                "call_id": CALL_ID,
+                "customer_id": CUSTOMER_ID,
+            }
+            if CODEC != "pcm16":
+                encoder = PacketEncoder(CODEC)
+                start.update(encoder.start_fields())
+            await websocket.send(json.dumps(start))
+            if encoder is not None:
+                # The server answers with the codec it will decode
+                started = json.loads(await websocket.recv())
+                if started.get("codec") != CODEC:
+                    print(f"Server does not accept {CODEC}, sending raw PCM")
+                    encoder = None
+
         loop = asyncio.get_event_loop()
 
         # Queue to pass incoming transcripts from network to main loop
@@ -27,8 +61,9 @@ async def stream_microphone():
             # receive messages (transcripts) from server
             async for message in websocket:
                 data = json.loads(message)
-                text = data.get("partial_transcript", "")
-                await transcripts.put(text)
+                text = data.get("partial_transcript", data.get("transcript_chunk"))
+                if text is not None:
+                    await transcripts.put(text)
 
         # Start receiver task
         recv_task = asyncio.create_task(receiver())
@@ -38,15 +73,20 @@ async def stream_microphone():
                 print("Audio status:", status, flush=True)
             audio_float32 = indata[:, 0]  # mono
             audio_int16 = (audio_float32 * 32767).astype(np.int16)
-            audio_hex = audio_int16.tobytes().hex()
 
-            msg = {
-                "call_id": CALL_ID,
-                "audio_hex": audio_hex
-            }
+            if encoder is not None:
+                msg = encoder.encode(audio_int16)
+            elif USE_BINARY_FRAMES:
+                # Raw little-endian PCM, no hex/JSON overhead
+                msg = audio_int16.astype("<i2", copy=False).tobytes()
+            else:
+                msg = json.dumps({
+                    "call_id": CALL_ID,
+                    "audio_hex": audio_int16.tobytes().hex()
+                })
             # Schedule send on the event loop
             asyncio.run_coroutine_threadsafe(
-                websocket.send(json.dumps(msg)),
+                websocket.send(msg),
                 loop
             )
 
@@ -1,62 +1,423 @@
 import asyncio
 import argparse
 import json
-import sounddevice as sd
+import struct
+import time
+from collections import deque
 import numpy as np
 import websockets
 
+from encoders import PacketEncoder
+
 SAMPLE_RATE = 16000
 CHUNK_DURATION = 0.5
 CHUNK_SAMPLES = int(SAMPLE_RATE * CHUNK_DURATION)
 
+# Sequenced binary messages start with their first frame's sequence number
+# and their frame count (see the transcriber's sessions.SEQ_HEADER)
+SEQ_HEADER = struct.Struct(">IH")
+SEND_QUEUE_SECONDS = 10.0
+REPLAY_SECONDS = 10.0
+MAX_BATCH_SECONDS = 2.0
+RECONNECT_MIN_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 10.0
+# Silence gate: blocks whose loudest 30 ms frame is under SILENCE_GATE_DB
+# are sent as markers once the pause has lasted SILENCE_HANGOVER_SECONDS.
+# The hangover keeps the natural pause after speech in the audio.
+SILENCE_GATE_DB = -45.0
+SILENCE_HANGOVER_SECONDS = 1.0
+GATE_FRAME_SAMPLES = int(SAMPLE_RATE * 0.03)
+
+
+def encode_json_frame(call_id: str, customer_id: str, audio_int16: np.ndarray, mode: str = "window") -> str:
+    """Legacy framing: hex-encoded PCM wrapped in a JSON text frame."""
+    return json.dumps({
+        "call_id": call_id,
+        "customer_id": customer_id,
+        "mode": mode,
+        "audio_hex": audio_int16.tobytes().hex(),
+    })
+
+
+def encode_binary_frame(audio_int16: np.ndarray) -> bytes:
+    """Binary framing: raw little-endian int16 PCM, sent after the start handshake."""
+    return audio_int16.astype("<i2", copy=False).tobytes()
+
+
+def encode_silence(samples: int, **fields) -> str:
+    """A silence marker standing for `samples` of audio that is not sent."""
+    return json.dumps({"type": "silence", "ms": round(samples * 1000 / SAMPLE_RATE), **fields})
+
+
+def peak_level_db(audio_int16: np.ndarray, frame_samples: int = GATE_FRAME_SAMPLES) -> float:
+    """Level in dBFS of the loudest frame (and channel) of a block."""
+    if len(audio_int16) == 0:
+        return -np.inf
+    x = audio_int16.reshape(len(audio_int16), -1).astype(np.float32) * (1.0 / 32768)
+    frame_samples = min(frame_samples, len(x))
+    usable = len(x) - len(x) % frame_samples
+    mean_square = np.square(x[:usable].reshape(-1, frame_samples, x.shape[1])).mean(axis=1).max()
+    return 10.0 * np.log10(max(float(mean_square), 1e-10))
+
+
+class SilenceGate:
+    """
+    Decides which captured blocks can be replaced by a silence marker.
+    Scoring the loudest short frame rather than the whole block keeps a
+    block that only starts a word.
+    """
+
+    def __init__(self, threshold_db: float = SILENCE_GATE_DB, hangover_seconds: float = SILENCE_HANGOVER_SECONDS):
+        self.threshold_db = threshold_db
+        self.hangover_samples = int(hangover_seconds * SAMPLE_RATE)
+        self._quiet = 0
+
+    def silent(self, audio_int16: np.ndarray) -> bool:
+        if peak_level_db(audio_int16) > self.threshold_db:
+            self._quiet = 0
+            return False
+        self._quiet += len(audio_int16)
+        return self._quiet > self.hangover_samples
+
+
+class Silence:
+    """A gated block in the send queue: only its length is sent."""
+
+    __slots__ = ("samples",)
+
+    def __init__(self, samples: int):
+        self.samples = samples
+
+    def __len__(self) -> int:
+        return self.samples
+
+
+async def start_session(
+    websocket,
+    call_id: str,
+    customer_id: str,
+    mode: str = "window",
+    codec: str = "pcm16",
+    encoder: PacketEncoder = None,
+    seq: bool = False,
+    channels: int = 1,
+):
+    """
+    Send the binary protocol's start handshake. Returns (encoder, started):
+    the PacketEncoder to use, or None for raw PCM (also when the server
+    does not accept `codec`), and the server's session_started event, which
+    is only waited for when a codec or sequence numbers are requested.
+
+    With `channels=2` the frames that follow are interleaved stereo pcm16,
+    agent left and customer right; stereo is never compressed.
+    """
+    if encoder is None and codec != "pcm16" and channels == 1:
+        encoder = PacketEncoder(codec)
+    start = {"type": "start", "call_id": call_id, "customer_id": customer_id, "mode": mode}
+    if encoder is not None:
+        start.update(encoder.start_fields())
+    if seq:
+        start["seq"] = True
+    if channels != 1:
+        start["channels"] = channels
+    await websocket.send(json.dumps(start))
+    if encoder is None and not seq:
+        return None, {}
+
+    while True:
+        started = json.loads(await websocket.recv())
+        if started.get("type") == "session_started":
+            break
+    if encoder is not None and started.get("codec") != encoder.codec:
+        print(f"Server does not accept {encoder.codec}, sending raw PCM")
+        encoder = None
+    return encoder, started
+
+
+class AudioSender:
+    """
+    Sends captured audio over a WebSocket that may drop and come back.
 
-async def stream_microphone(ws_url: str, call_id: str, customer_id: str):
-    async with websockets.connect(ws_url) as websocket:
-        print(f"Connected to {ws_url}")
-        print(f"Call ID: {call_id} | Customer ID: {customer_id}")
+    The audio callback hands frames to `offer()`, which only appends to a
+    bounded queue: once `queue_seconds` of audio is waiting the oldest
+    frames are dropped and counted, instead of piling up send coroutines.
+    One task drains the queue, sending everything waiting (up to
+    `max_batch_seconds`) as one message, and reconnects with exponential
+    backoff when the connection fails.
 
-        loop = asyncio.get_event_loop()
-        transcripts = asyncio.Queue()
+    With the binary protocol every message starts with the sequence number
+    of its first frame and its frame count. Sent messages are kept for
+    `replay_seconds`; after a reconnect the server reports the next frame
+    it expects and the sender resends from there, so a short outage loses
+    no audio and the server drops anything it already had.
 
-        async def receiver():
+    With `channels=2` frames are (samples, 2) int16 arrays, sent
+    interleaved; the queue and replay limits count sample frames.
+
+    With a SilenceGate, blocks it rejects are queued as Silence and sent as
+    `{"type": "silence", "ms": ...}` markers; consecutive ones go out as
+    one marker. Markers take sequence numbers like audio, so they are
+    replayed after a reconnect too.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        call_id: str,
+        customer_id: str,
+        protocol: str = "binary",
+        mode: str = "window",
+        codec: str = "pcm16",
+        channels: int = 1,
+        silence_gate: SilenceGate = None,
+        queue_seconds: float = SEND_QUEUE_SECONDS,
+        replay_seconds: float = REPLAY_SECONDS,
+        max_batch_seconds: float = MAX_BATCH_SECONDS,
+    ):
+        self.url = url
+        self.call_id = call_id
+        self.customer_id = customer_id
+        self.protocol = protocol
+        self.mode = mode
+        self.channels = channels
+        self.gate = silence_gate
+        self.queue_samples = int(queue_seconds * SAMPLE_RATE)
+        self.replay_samples = int(replay_seconds * SAMPLE_RATE)
+        self.batch_samples = int(max_batch_seconds * SAMPLE_RATE)
+
+        self._encoder = PacketEncoder(codec) if protocol == "binary" and codec != "pcm16" and channels == 1 else None
+        self._use_encoder = False
+        self._queue = deque()  # (captured_at, int16 samples)
+        self._queued = 0
+        self._replay = deque()  # (seq, count, samples, message, encoded)
+        self._replayable = 0
+        self._ready = asyncio.Event()
+        self._lags = deque(maxlen=200)
+        self.next_seq = 0
+        self.closed = False
+
+        self.frames_sent = 0
+        self.frames_resent = 0
+        self.frames_dropped = 0  # queue full
+        self.frames_lost = 0  # gone before the server confirmed them
+        self.bytes_sent = 0
+        self.reconnects = 0
+        self.silent_samples = 0
+
+    def offer(self, audio_int16: np.ndarray):
+        """Queue one captured frame. Call on the event loop's thread."""
+        if self.gate is not None and self.gate.silent(audio_int16):
+            audio_int16 = Silence(len(audio_int16))
+            self.silent_samples += audio_int16.samples
+        self._queue.append((time.perf_counter(), audio_int16))
+        self._queued += len(audio_int16)
+        while len(self._queue) > 1 and self._queued > self.queue_samples:
+            _, old = self._queue.popleft()
+            self._queued -= len(old)
+            self.frames_dropped += 1
+        self._ready.set()
+
+    def close(self):
+        """Stop after sending what is queued."""
+        self.closed = True
+        self._ready.set()
+
+    async def run(self, on_event):
+        """Send until closed, calling `on_event(dict)` for every server message."""
+        backoff = RECONNECT_MIN_SECONDS
+        while not self.closed:
+            try:
+                async with websockets.connect(self.url, max_size=None) as websocket:
+                    await self._start(websocket)
+                    backoff = RECONNECT_MIN_SECONDS
+                    receiver = asyncio.create_task(self._receive(websocket, on_event))
+                    try:
+                        await self._send_loop(websocket)
+                    finally:
+                        receiver.cancel()
+            except (OSError, websockets.WebSocketException) as e:
+                if self.closed:
+                    break
+                self.reconnects += 1
+                print(f"\n[Client] Connection lost ({e}), reconnecting in {backoff:.1f}s", flush=True)
+                await asyncio.sleep(backoff)
+                backoff = min(2 * backoff, RECONNECT_MAX_SECONDS)
+
+    async def _start(self, websocket):
+        if self.protocol != "binary":
+            return  # the first JSON frame opens the session
+        encoder, started = await start_session(
+            websocket, self.call_id, self.customer_id, self.mode, encoder=self._encoder, seq=True,
+            channels=self.channels,
+        )
+        self._use_encoder = encoder is not None
+        server_next = started.get("next_seq", 0)
+
+        resend = [m for m in self._replay if m[0] + m[1] > server_next]
+        oldest = resend[0][0] if resend else self.next_seq
+        self.frames_lost += max(0, oldest - server_next)
+        for seq, count, samples, message, encoded in resend:
+            if encoded != self._use_encoder:
+                message = self._frame(seq, count, samples)
+            await websocket.send(message)
+            self.frames_resent += count
+            self.bytes_sent += len(message)
+        # A server that remembers a longer call (e.g. a restarted client
+        # reusing the call ID) must not mistake new frames for resends
+        self.next_seq = max(self.next_seq, server_next)
+
+    async def _receive(self, websocket, on_event):
+        try:
             async for message in websocket:
-                data = json.loads(message)
-                text = data.get("transcript_chunk", "")
-                await transcripts.put(text)
-
-        recv_task = asyncio.create_task(receiver())
-
-        def audio_callback(indata, frames, time_, status):
-            if status:
-                print("Audio status:", status, flush=True)
-            audio_float32 = indata[:, 0]
-            audio_int16 = (audio_float32 * 32767).astype(np.int16)
-            audio_hex = audio_int16.tobytes().hex()
-            msg = {
-                "call_id": call_id,
-                "customer_id": customer_id,
-                "audio_hex": audio_hex,
-            }
-            asyncio.run_coroutine_threadsafe(
-                websocket.send(json.dumps(msg)), loop
-            )
-
-        with sd.InputStream(
-            samplerate=SAMPLE_RATE,
-            channels=1,
-            dtype="float32",
-            blocksize=CHUNK_SAMPLES,
-            callback=audio_callback,
-        ):
-            print("Streaming from microphone. Speak now (Ctrl+C to stop).")
+                on_event(json.loads(message))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _send_loop(self, websocket):
+        while True:
+            if not self._queue:
+                if self.closed:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            captured_at = self._queue[0][0]
+            silent = isinstance(self._queue[0][1], Silence)
+            frames = []
+            n = 0
+            while self._queue and (
+                not frames
+                or isinstance(self._queue[0][1], Silence) == silent
+                and (silent or n + len(self._queue[0][1]) <= self.batch_samples)
+            ):
+                _, audio = self._queue.popleft()
+                frames.append(audio)
+                n += len(audio)
+            self._queued -= n
+            if silent:
+                audio = Silence(n)
+            else:
+                audio = frames[0] if len(frames) == 1 else np.concatenate(frames)
+
+            seq = self.next_seq
+            message = self._frame(seq, len(frames), audio)
+            self.next_seq += len(frames)
+            if self.protocol == "binary":
+                self._remember(seq, len(frames), audio, message)
             try:
-                while True:
-                    text = await transcripts.get()
-                    print(f"[Transcript] {text}")
-            except KeyboardInterrupt:
-                print("\nStopped by user.")
+                await websocket.send(message)
+            except websockets.ConnectionClosed:
+                if self.protocol != "binary":
+                    self.frames_lost += len(frames)
+                raise
+            self.frames_sent += len(frames)
+            self.bytes_sent += len(message)
+            self._lags.append(time.perf_counter() - captured_at)
+
+    def _frame(self, seq: int, count: int, audio: np.ndarray):
+        if isinstance(audio, Silence):
+            if self.protocol != "binary":
+                return encode_silence(
+                    len(audio), call_id=self.call_id, customer_id=self.customer_id, mode=self.mode
+                )
+            return encode_silence(len(audio), seq=seq, count=count)
+        if self.protocol != "binary":
+            return encode_json_frame(self.call_id, self.customer_id, audio, self.mode)
+        payload = self._encoder.encode(audio) if self._use_encoder else encode_binary_frame(audio)
+        return SEQ_HEADER.pack(seq, count) + payload
+
+    def _remember(self, seq: int, count: int, audio: np.ndarray, message: bytes):
+        self._replay.append((seq, count, audio, message, self._use_encoder))
+        self._replayable += len(audio)
+        while len(self._replay) > 1 and self._replayable > self.replay_samples:
+            self._replayable -= len(self._replay.popleft()[2])
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+        return {
+            "frames_sent": self.frames_sent,
+            "frames_resent": self.frames_resent,
+            "frames_dropped": self.frames_dropped,
+            "frames_lost": self.frames_lost,
+            "reconnects": self.reconnects,
+            "bytes_sent": self.bytes_sent,
+            "silence_seconds": round(self.silent_samples / SAMPLE_RATE, 1),
+            "queued_seconds": round(self._queued / SAMPLE_RATE, 2),
+            "send_lag_p50_ms": round(lags[len(lags) // 2] * 1000, 1) if lags else None,
+            "send_lag_max_ms": round(lags[-1] * 1000, 1) if lags else None,
+        }
+
 
-        recv_task.cancel()
+async def stream_microphone(
+    ws_url: str,
+    call_id: str,
+    customer_id: str,
+    protocol: str = "binary",
+    mode: str = "window",
+    codec: str = "pcm16",
+    stats_interval: float = 30.0,
+    channels: int = 1,
+    silence_gate_db: float = SILENCE_GATE_DB,
+):
+    # Imported here so the encoders above can be used without PortAudio
+    import sounddevice as sd
+
+    print(f"Connecting to {ws_url}")
+    print(f"Call ID: {call_id} | Customer ID: {customer_id} | Protocol: {protocol}")
+
+    gate = SilenceGate(silence_gate_db) if silence_gate_db is not None else None
+    sender = AudioSender(ws_url, call_id, customer_id, protocol, mode, codec, channels, gate)
+    loop = asyncio.get_running_loop()
+    transcripts = asyncio.Queue()
+
+    def on_event(data):
+        if "transcript_chunk" in data:
+            speaker = data.get("speaker")
+            text = data["transcript_chunk"]
+            transcripts.put_nowait(f"{speaker.capitalize()}: {text}" if speaker else text)
+        elif data.get("type") == "interim" and data.get("text"):
+            print(f"\r[Interim] {data['text'][:120]}", end="", flush=True)
+        elif data.get("type") == "overload":
+            print(f"\n[Client] Server dropped {data.get('dropped_bytes', 0)} bytes of audio (overloaded)")
+
+    def audio_callback(indata, frames, time_, status):
+        if status:
+            print("Audio status:", status, flush=True)
+        audio = indata[:, 0] if channels == 1 else indata[:, :channels]
+        audio_int16 = (audio * 32767).astype(np.int16)
+        # Never touches the socket from the audio thread; the sender owns it
+        loop.call_soon_threadsafe(sender.offer, audio_int16)
+
+    send_task = asyncio.create_task(sender.run(on_event))
+    with sd.InputStream(
+        samplerate=SAMPLE_RATE,
+        channels=channels,
+        dtype="float32",
+        blocksize=CHUNK_SAMPLES,
+        callback=audio_callback,
+    ):
+        print("Streaming from microphone. Speak now (Ctrl+C to stop).")
+        try:
+            next_report = time.monotonic() + stats_interval
+            while True:
+                try:
+                    text = await asyncio.wait_for(transcripts.get(), timeout=max(0.1, next_report - time.monotonic()))
+                    print(f"\n[Transcript] {text}")
+                except asyncio.TimeoutError:
+                    pass
+                if time.monotonic() >= next_report:
+                    print(f"\n[Client] {sender.stats()}")
+                    next_report += stats_interval
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            print("\nStopped by user.")
+        finally:
+            sender.close()
+            try:
+                await asyncio.wait_for(send_task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                send_task.cancel()
+            print(f"[Client] {sender.stats()}")
 
 
 def main():
@@ -64,8 +425,27 @@ def main():
     parser.add_argument("--url", default="ws://localhost:8001/ws/transcribe", help="WebSocket URL of the transcriber")
     parser.add_argument("--call-id", default="demo-call-001", help="Call ID for this session")
     parser.add_argument("--customer-id", default="1", help="Customer ID for this session")
+    parser.add_argument("--protocol", choices=["binary", "json"], default="binary",
+                        help="Audio framing: raw binary PCM (default) or legacy JSON with hex audio")
+    parser.add_argument("--mode", choices=["window", "streaming"], default="window",
+                        help="Fixed 3 s windows (default) or streaming with interim hypotheses")
+    parser.add_argument("--codec", choices=["pcm16", "opus", "flac"], default="pcm16",
+                        help="Compress binary audio: opus (~10x smaller, lossy) or flac (lossless)")
+    parser.add_argument("--channels", type=int, choices=[1, 2], default=1,
+                        help="2 = stereo call recording, agent on the left channel and customer on the right "
+                             "(binary pcm16 only)")
+    parser.add_argument("--silence-gate-db", type=float, default=SILENCE_GATE_DB,
+                        help="Send silence under this level (dBFS) as compact markers instead of audio")
+    parser.add_argument("--no-silence-gate", action="store_true", help="Send every block as audio")
+    parser.add_argument("--stats-interval", type=float, default=30.0,
+                        help="Seconds between send statistics (lag, drops, reconnects)")
     args = parser.parse_args()
-    asyncio.run(stream_microphone(args.url, args.call_id, args.customer_id))
+    if args.channels == 2 and args.protocol != "binary":
+        parser.error("--channels 2 needs --protocol binary")
+    asyncio.run(stream_microphone(
+        args.url, args.call_id, args.customer_id, args.protocol, args.mode, args.codec, args.stats_interval,
+        args.channels, None if args.no_silence_gate else args.silence_gate_db,
+    ))
 
 
 if __name__ == "__main__":
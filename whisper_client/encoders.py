@@ -0,0 +1,69 @@
+"""
+Opus and FLAC encoding for the transcriber's binary protocol, shared by
+client.py, loadtest.py and transcription/client.py. The framing is
+described in services/transcriber/audio_codecs.py.
+"""
+
+import base64
+import struct
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Codec name on the wire -> FFmpeg encoder
+ENCODERS = {
+    "opus": "libopus",
+    "flac": "flac",
+}
+OPUS_BIT_RATE = 24000
+
+
+class PacketEncoder:
+    """
+    Opus or FLAC encoder for the binary protocol (needs PyAV).
+
+    `encode()` returns one binary frame: the packets for the audio given,
+    each prefixed with its 2-byte big-endian length. Samples that do not
+    fill a whole codec frame are held until the next call.
+    """
+
+    def __init__(self, codec: str = "opus", sample_rate: int = SAMPLE_RATE, bit_rate: int = OPUS_BIT_RATE):
+        import av
+
+        self._av = av
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self._ctx = av.CodecContext.create(ENCODERS[codec], "w")
+        self._ctx.sample_rate = sample_rate
+        self._ctx.format = "s16"
+        self._ctx.layout = "mono"
+        if codec == "opus":
+            self._ctx.bit_rate = bit_rate
+        self._ctx.open()
+        self.frame_size = self._ctx.frame_size
+        self.extradata = self._ctx.extradata or b""
+        self._pending = np.zeros(0, dtype=np.int16)
+        self._pts = 0
+
+    def start_fields(self) -> dict:
+        """Codec offer for the start handshake, falling back to raw PCM."""
+        return {
+            "codecs": [self.codec, "pcm16"],
+            "codec_config": base64.b64encode(self.extradata).decode("ascii"),
+        }
+
+    def encode(self, audio_int16: np.ndarray) -> bytes:
+        pcm = np.concatenate([self._pending, audio_int16.astype(np.int16, copy=False)])
+        usable = len(pcm) - len(pcm) % self.frame_size
+        packets = []
+        for i in range(0, usable, self.frame_size):
+            frame = self._av.AudioFrame.from_ndarray(
+                pcm[i:i + self.frame_size].reshape(1, -1), format="s16", layout="mono"
+            )
+            frame.sample_rate = self.sample_rate
+            frame.pts = self._pts
+            self._pts += self.frame_size
+            packets.extend(self._ctx.encode(frame))
+        self._pending = pcm[usable:]
+        return b"".join(struct.pack(">H", p.size) + bytes(p) for p in packets)
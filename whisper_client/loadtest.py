@@ -0,0 +1,379 @@
+"""
+Concurrent-call load generator for the transcriber service.
+
+Opens N simultaneous /ws/transcribe sessions and streams WAV files (or
+synthesized speech-like audio) at real time or faster, then reports
+per-chunk end-to-end latency, the server's model real-time factor, dropped
+and late audio, and server CPU / RSS scraped from /metrics. Results are
+written as JSON so runs can be compared between builds.
+
+Latency is measured from the moment the last audio sample a transcript
+chunk covers was sent (the server reports it as `audio_end`) to the moment
+the chunk arrived. Synthesized audio exercises the whole pipeline but may
+decode to no text, so use real recordings for latency numbers.
+
+    python loadtest.py --sessions 20 --wav call1.wav call2.wav --duration 120
+    python loadtest.py --sessions 50 --speed 2 --output bench.json
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import time
+import urllib.request
+import wave
+from urllib.parse import urlparse
+
+import numpy as np
+import websockets
+
+from client import (
+    SAMPLE_RATE,
+    SILENCE_GATE_DB,
+    SilenceGate,
+    encode_binary_frame,
+    encode_json_frame,
+    encode_silence,
+    start_session,
+)
+
+CLOSE_OVERLOADED = 1013
+
+
+def load_wav(path: str) -> np.ndarray:
+    """int16 mono at SAMPLE_RATE, downmixed and linearly resampled if needed."""
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        channels, rate = w.getnchannels(), w.getframerate()
+        audio = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        n = int(len(audio) * SAMPLE_RATE / rate)
+        audio = np.interp(np.arange(n) * rate / SAMPLE_RATE, np.arange(len(audio)), audio)
+    return audio.astype("<i2")
+
+
+def synth_speech(seconds: float, seed: int = 0) -> np.ndarray:
+    """
+    Speech-like audio: voiced syllables (harmonic stacks with a pitch
+    contour and a 4-5 Hz envelope) grouped into phrases separated by
+    pauses, over a low noise floor. Enough to drive VAD, endpointing and
+    the model at realistic duty cycles.
+    """
+    rng = np.random.default_rng(seed)
+    out = []
+    total = 0
+    target = int(seconds * SAMPLE_RATE)
+    while total < target:
+        phrase = []
+        for _ in range(rng.integers(4, 14)):
+            n = int(rng.uniform(0.12, 0.28) * SAMPLE_RATE)
+            t = np.arange(n) / SAMPLE_RATE
+            f0 = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(1, 3) * t))
+            phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+            voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+            phrase.append(voiced * np.hanning(n))
+            phrase.append(np.zeros(int(rng.uniform(0.02, 0.08) * SAMPLE_RATE)))
+        phrase.append(np.zeros(int(rng.uniform(0.4, 1.2) * SAMPLE_RATE)))
+        chunk = np.concatenate(phrase)
+        out.append(chunk)
+        total += len(chunk)
+    audio = np.concatenate(out)[:target]
+    audio = 0.3 * audio / max(1e-9, np.abs(audio).max()) + 0.003 * rng.standard_normal(len(audio))
+    return (np.clip(audio, -1, 1) * 32767).astype("<i2")
+
+
+def parse_metrics(text: str) -> dict:
+    """Prometheus text -> {metric name: value summed over labels}."""
+    totals = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name_labels, _, value = line.rpartition(" ")
+        name = name_labels.split("{", 1)[0]
+        try:
+            totals[name] = totals.get(name, 0.0) + float(value)
+        except ValueError:
+            continue
+    return totals
+
+
+async def scrape(url: str) -> dict:
+    def fetch():
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            return resp.read().decode()
+    try:
+        return parse_metrics(await asyncio.to_thread(fetch))
+    except OSError:
+        return {}
+
+
+class SessionResult:
+    def __init__(self, call_id: str):
+        self.call_id = call_id
+        self.status = "ok"
+        self.audio_seconds = 0.0
+        self.bytes_sent = 0
+        self.chunks = 0
+        self.latencies = []
+        self.dropped_events = 0
+        self.dropped_ms = 0
+        self.max_send_lag = 0.0
+        # (cumulative samples sent, send time) per frame
+        self._sent_ends = []
+        self._sent_times = []
+
+    def sent(self, samples_end: int, at: float):
+        self._sent_ends.append(samples_end)
+        self._sent_times.append(at)
+
+    def latency_for(self, audio_end: float, now: float):
+        """Time since the frame holding sample `audio_end` was sent."""
+        i = bisect.bisect_left(self._sent_ends, int(audio_end * SAMPLE_RATE))
+        if i >= len(self._sent_times):
+            i = len(self._sent_times) - 1
+        return now - self._sent_times[i] if i >= 0 else None
+
+    def summary(self) -> dict:
+        return {
+            "call_id": self.call_id,
+            "status": self.status,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "bytes_sent": self.bytes_sent,
+            "chunks": self.chunks,
+            "latency_p50_ms": percentile_ms(self.latencies, 50),
+            "dropped_events": self.dropped_events,
+            "dropped_ms": self.dropped_ms,
+            "max_send_lag_ms": round(self.max_send_lag * 1000, 1),
+        }
+
+
+def percentile_ms(values: list, q: float):
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+async def run_session(args, call_id: str, audio: np.ndarray, start_delay: float) -> SessionResult:
+    result = SessionResult(call_id)
+    await asyncio.sleep(start_delay)
+    frame = int(SAMPLE_RATE * args.frame_ms / 1000)
+    frame_seconds = frame / SAMPLE_RATE / args.speed
+    gate = SilenceGate(args.silence_gate_db) if args.silence_gate else None
+
+    try:
+        async with websockets.connect(args.url, max_size=None) as ws:
+            encoder = None
+            if args.protocol == "binary":
+                encoder, _ = await start_session(ws, call_id, "1", args.mode, args.codec)
+
+            async def receiver():
+                try:
+                    async for message in ws:
+                        now = time.perf_counter()
+                        data = json.loads(message)
+                        if "transcript_chunk" in data:
+                            result.chunks += 1
+                            if "audio_end" in data:
+                                latency = result.latency_for(data["audio_end"], now)
+                                if latency is not None:
+                                    result.latencies.append(latency)
+                        elif data.get("type") == "overload":
+                            result.dropped_events += 1
+                            result.dropped_ms += data.get("dropped_ms", 0)
+                except websockets.ConnectionClosed:
+                    pass
+
+            recv_task = asyncio.create_task(receiver())
+
+            start = time.perf_counter()
+            for i, offset in enumerate(range(0, len(audio), frame)):
+                due = start + i * frame_seconds
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    result.max_send_lag = max(result.max_send_lag, -delay)
+                pcm = audio[offset:offset + frame]
+                if gate is not None and gate.silent(pcm):
+                    if args.protocol == "binary":
+                        message = encode_silence(len(pcm))
+                    else:
+                        message = encode_silence(len(pcm), call_id=call_id, customer_id="1", mode=args.mode)
+                elif encoder is not None:
+                    message = encoder.encode(pcm)
+                elif args.protocol == "binary":
+                    message = encode_binary_frame(pcm)
+                else:
+                    message = encode_json_frame(call_id, "1", pcm, args.mode)
+                await ws.send(message)
+                result.bytes_sent += len(message)
+                result.sent(offset + len(pcm), time.perf_counter())
+                result.audio_seconds += len(pcm) / SAMPLE_RATE
+
+            # Let the last window be endpointed and decoded before hanging up
+            await asyncio.sleep(args.drain)
+            recv_task.cancel()
+    except websockets.ConnectionClosed as e:
+        code = e.rcvd.code if e.rcvd else None
+        result.status = "rejected" if code == CLOSE_OVERLOADED else f"closed ({code})"
+    except OSError as e:
+        result.status = f"error ({e})"
+    return result
+
+
+async def sample_server(url: str, stop: asyncio.Event, interval: float = 1.0) -> list:
+    samples = []
+    while not stop.is_set():
+        m = await scrape(url)
+        if m:
+            samples.append((time.perf_counter(), m))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+    return samples
+
+
+def server_report(before: dict, after: dict, samples: list) -> dict:
+    def delta(name):
+        return after.get(name, 0.0) - before.get(name, 0.0)
+
+    audio = delta("transcriber_decoded_audio_seconds_total")
+    busy = delta("transcriber_decode_busy_seconds_total")
+    report = {
+        "rtf": round(busy / audio, 4) if audio else None,
+        "decoded_audio_seconds": round(audio, 1),
+        "frames_dropped": int(delta("transcriber_frames_dropped_total")),
+        "sessions_rejected": int(delta("transcriber_sessions_rejected_total")),
+        "windows_decoded": int(delta("transcriber_windows_decoded_total")),
+        "windows_empty": int(delta("transcriber_windows_empty_total")),
+        "windows_silent": int(delta("transcriber_windows_silent_total")),
+        "cpu_percent": None,
+        "rss_peak_bytes": None,
+        "rss_mean_bytes": None,
+    }
+    if len(samples) >= 2:
+        (t0, m0), (t1, m1) = samples[0], samples[-1]
+        cpu = m1.get("process_cpu_seconds_total", 0.0) - m0.get("process_cpu_seconds_total", 0.0)
+        report["cpu_percent"] = round(100 * cpu / (t1 - t0), 1) if t1 > t0 else None
+    rss = [m["process_resident_memory_bytes"] for _, m in samples if "process_resident_memory_bytes" in m]
+    if rss:
+        report["rss_peak_bytes"] = int(max(rss))
+        report["rss_mean_bytes"] = int(sum(rss) / len(rss))
+    return report
+
+
+async def main(args):
+    if args.wav:
+        sources = [load_wav(p) for p in args.wav]
+    else:
+        sources = [synth_speech(args.duration or 60.0, seed=i) for i in range(min(args.sessions, 8))]
+    if args.duration:
+        # Loop or cut every source to the requested length
+        n = int(args.duration * SAMPLE_RATE)
+        sources = [np.resize(s, n) for s in sources]
+
+    metrics_url = args.metrics_url
+    if not metrics_url:
+        u = urlparse(args.url)
+        metrics_url = f"{'https' if u.scheme == 'wss' else 'http'}://{u.netloc}/metrics"
+
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    before = await scrape(metrics_url)
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(metrics_url, stop))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_session(
+            args,
+            f"bench-{run_id}-{i}",
+            sources[i % len(sources)],
+            args.ramp * i / max(1, args.sessions),
+        )
+        for i in range(args.sessions)
+    ))
+    wall = time.perf_counter() - started
+
+    stop.set()
+    samples = await sampler
+    after = await scrape(metrics_url)
+
+    latencies = [l for r in results for l in r.latencies]
+    late = sum(1 for l in latencies if l * 1000 > args.late_ms)
+    report = {
+        "run_id": run_id,
+        "config": {
+            "url": args.url,
+            "sessions": args.sessions,
+            "protocol": args.protocol,
+            "codec": args.codec,
+            "mode": args.mode,
+            "speed": args.speed,
+            "frame_ms": args.frame_ms,
+            "ramp_seconds": args.ramp,
+            "audio": args.wav or f"synthetic {args.duration}s",
+            "late_ms": args.late_ms,
+        },
+        "wall_seconds": round(wall, 2),
+        "audio_seconds_sent": round(sum(r.audio_seconds for r in results), 1),
+        "kbps_per_session": round(
+            sum(r.bytes_sent for r in results) * 8 / 1000 / max(1e-9, sum(r.audio_seconds for r in results)), 1
+        ),
+        "sessions_ok": sum(1 for r in results if r.status == "ok"),
+        "sessions_rejected": sum(1 for r in results if r.status == "rejected"),
+        "chunks": sum(r.chunks for r in results),
+        "chunks_timed": len(latencies),
+        "latency_ms": {
+            "p50": percentile_ms(latencies, 50),
+            "p95": percentile_ms(latencies, 95),
+            "p99": percentile_ms(latencies, 99),
+            "max": percentile_ms(latencies, 100),
+        },
+        "late_chunks": late,
+        "dropped_events": sum(r.dropped_events for r in results),
+        "dropped_audio_ms": sum(r.dropped_ms for r in results),
+        "max_client_send_lag_ms": round(max((r.max_send_lag for r in results), default=0) * 1000, 1),
+        "server": server_report(before, after, samples) if before else None,
+        "per_session": [r.summary() for r in results],
+    }
+
+    output = args.output or f"loadtest-{run_id}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    lat = report["latency_ms"]
+    print(
+        f"{args.sessions} sessions, {report['sessions_ok']} ok, {report['sessions_rejected']} rejected | "
+        f"{report['chunks']} chunks, latency p50/p95/p99 = {lat['p50']}/{lat['p95']}/{lat['p99']} ms, "
+        f"{late} late | dropped {report['dropped_audio_ms']} ms"
+    )
+    if report["server"]:
+        s = report["server"]
+        rss = f"{s['rss_peak_bytes'] / 2**20:.0f} MiB" if s["rss_peak_bytes"] else "n/a"
+        print(f"server: RTF {s['rtf']}, CPU {s['cpu_percent']}%, peak RSS {rss}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the transcriber with concurrent calls")
+    parser.add_argument("--url", default="ws://localhost:8001/ws/transcribe")
+    parser.add_argument("--metrics-url", default=None, help="Default: /metrics on the WebSocket host")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent calls")
+    parser.add_argument("--wav", nargs="*", help="16-bit WAV files, assigned to sessions round-robin")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of audio per session (0 = whole WAV)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed; 1 = real time")
+    parser.add_argument("--frame-ms", type=int, default=500, help="Audio per WebSocket frame")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Spread session starts over this many seconds")
+    parser.add_argument("--protocol", choices=["binary", "json"], default="binary")
+    parser.add_argument("--codec", choices=["pcm16", "opus", "flac"], default="pcm16", help="Binary audio codec")
+    parser.add_argument("--mode", choices=["window", "streaming"], default="window")
+    parser.add_argument("--silence-gate", action="store_true",
+                        help="Send silent frames as markers, like the microphone client")
+    parser.add_argument("--silence-gate-db", type=float, default=SILENCE_GATE_DB)
+    parser.add_argument("--late-ms", type=float, default=2000, help="Chunks slower than this count as late")
+    parser.add_argument("--drain", type=float, default=3.0, help="Seconds to wait for final chunks")
+    parser.add_argument("--output", default=None, help="JSON results file")
+    asyncio.run(main(parser.parse_args()))